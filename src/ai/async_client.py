@@ -0,0 +1,174 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional
+
+try:
+    import httpx
+except ImportError:  # 未安装 httpx 时使用 requests 客户端 (src.ai.http_client)
+    httpx = None
+
+from src.ai.http_client import (
+    LLM_CONNECT_TIMEOUT_SECONDS, LLM_READ_TIMEOUT_SECONDS, LLM_POOL_MAXSIZE, LLM_MAX_RETRIES, LLM_RETRY_BACKOFF_SECONDS,
+    RETRY_STATUS_CODES, LLMRequestError, LLMRequestStats, record_usage,
+)
+
+# 设置为 0 时不使用异步客户端
+LLM_ASYNC_ENABLED = os.environ.get("AUTOVIS_LLM_ASYNC", "1") != "0"
+
+_STREAM_END = object()
+
+def _retry_delay(response, attempt: int) -> float:
+    """重试前的等待时间：服务端给出 Retry-After (秒) 时按其等待，否则指数退避"""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        return LLM_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+
+class LLMStream:
+    """后台事件循环中一次流式请求的同步视图
+
+    创建时请求已经发出，在脚本线程中迭代得到响应的文本行。可以先启动多个流再依次读取，互相独立的调用因此并发进行。
+    迭代提前结束或调用 close 时取消请求。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, pump: Callable[[Callable[[Any], None]], Any]):
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._future = asyncio.run_coroutine_threadsafe(pump(self._queue.put_nowait), loop)
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if not self._future.done():
+            self._future.cancel()
+
+class AsyncLLMClient:
+    """基于 asyncio + httpx 的 LLM 客户端，在一个后台事件循环中复用连接并处理所有会话的请求
+
+    每个流式回复只是事件循环中的一个任务，不占用线程；Streamlit 脚本线程通过同步接口
+    (stream_lines/post_json) 使用，接口与 LLMHttpClient 相同。
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._client = None  # 在事件循环中创建
+        self._stats = LLMRequestStats()
+        self.active_streams = 0
+        self._thread = threading.Thread(target=self._run_loop, name="autovis-llm-loop", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(LLM_READ_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+                limits=httpx.Limits(max_connections=LLM_POOL_MAXSIZE, max_keepalive_connections=LLM_POOL_MAXSIZE),
+            )
+        return self._client
+
+    async def _send(self, url: str, headers: Dict[str, str], payload: Dict[str, Any], stream: bool):
+        """发送请求，429/5xx 和连接错误按退避重试 (与 LLMHttpClient 的重试策略一致)"""
+        client = self._get_client()
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            response = None
+            try:
+                response = await client.send(client.build_request("POST", url, headers=headers, json=payload), stream=stream)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if attempt >= LLM_MAX_RETRIES:
+                    self._stats.record_error(attempt)
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= LLM_MAX_RETRIES:
+                    self._stats.record_response(response.status_code, attempt, time.perf_counter() - started)
+                    if attempt:
+                        print(f"[LLM Async] 请求重试 {attempt} 次后返回 {response.status_code}")
+                    return response
+                await response.aclose()
+            await asyncio.sleep(_retry_delay(response, attempt))
+            attempt += 1
+
+    async def _pump_lines(self, url: str, headers: Dict[str, str], payload: Dict[str, Any], sink: Callable[[Any], None]) -> None:
+        self.active_streams += 1
+        try:
+            response = await self._send(url, headers, payload, stream=True)
+            try:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise LLMRequestError(response.status_code, response.text)
+                # 读完整个响应体 (包括 [DONE] 之后的部分)，连接才能回到连接池
+                async for line in response.aiter_lines():
+                    if line:
+                        sink(line)
+            finally:
+                await response.aclose()
+            sink(_STREAM_END)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            sink(e)
+        finally:
+            self.active_streams -= 1
+
+    async def _post_json(self, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self._send(url, headers, payload, stream=False)
+        if response.status_code != 200:
+            raise LLMRequestError(response.status_code, response.text)
+        return response.json()
+
+    def stream_lines(self, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> LLMStream:
+        """立即发出流式请求，返回响应文本行的同步迭代器 (请求失败时在迭代时抛出异常)"""
+        return LLMStream(self._loop, lambda sink: self._pump_lines(url, headers, payload, sink))
+
+    def post_json(self, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """发送非流式请求并等待解析后的JSON"""
+        return asyncio.run_coroutine_threadsafe(self._post_json(url, headers, payload), self._loop).result()
+
+    def record_first_token(self, seconds: float) -> None:
+        """记录从发出请求到收到第一个内容片段的时间"""
+        self._stats.record_first_token(seconds)
+
+    def record_usage(self, usage: Dict[str, Any]) -> None:
+        """记录接口返回的 usage (提示 token 数和命中提供方前缀缓存的 token 数)"""
+        record_usage(self._stats, usage)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回请求数、重试、延迟统计和正在进行的流数"""
+        stats = self._stats.snapshot()
+        stats["active_streams"] = self.active_streams
+        return stats
+
+_client: Optional[AsyncLLMClient] = None
+_client_lock = threading.Lock()
+
+def get_async_llm_client() -> Optional[AsyncLLMClient]:
+    """获取进程内唯一的异步 LLM 客户端 (所有 Streamlit 会话共享)
+
+    Returns:
+        AsyncLLMClient | None: 未安装 httpx 或通过 AUTOVIS_LLM_ASYNC=0 关闭时返回 None
+    """
+    global _client
+    if httpx is None or not LLM_ASYNC_ENABLED:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = AsyncLLMClient()
+            print(f"[LLM Async] 事件循环已启动，连接池大小: {LLM_POOL_MAXSIZE}")
+        return _client
@@ -0,0 +1,244 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # 未安装 tiktoken 时按字符数估算 token
+    tiktoken = None
+
+from src.database.chat_history_db import get_session_details, update_session_summary
+
+# 每轮提示中历史部分 (摘要 + 最近消息) 的 token 预算
+HISTORY_TOKEN_BUDGET = int(os.environ.get("AUTOVIS_HISTORY_TOKENS", 6000))
+# 单条历史消息的 token 上限，超过时保留开头和结尾 (长代码回复不会独占预算)
+MESSAGE_MAX_TOKENS = int(os.environ.get("AUTOVIS_HISTORY_MESSAGE_TOKENS", 1500))
+# 摘要的 token 上限
+SUMMARY_MAX_TOKENS = int(os.environ.get("AUTOVIS_SUMMARY_TOKENS", 600))
+# 未摘要的历史超过预算的这个比例时，在后台把较早的轮次压缩进摘要
+SUMMARIZE_TRIGGER_RATIO = 0.75
+# 压缩时保留原文的最近消息数
+RECENT_MESSAGES_KEPT = 6
+# 一次摘要请求中新对话内容的 token 上限，更长的历史分多次合并进摘要
+SUMMARY_INPUT_TOKENS = 4000
+# 每条消息的角色、分隔符等额外开销
+MESSAGE_OVERHEAD_TOKENS = 4
+# 进程内记录摘要状态的会话数上限
+MAX_TRACKED_SESSIONS = 1024
+
+TRUNCATION_MARKER = "\n...[truncated]...\n"
+
+SUMMARY_SYSTEM_PROMPT = """You maintain a running summary of a data analysis conversation between a user and an assistant.
+Merge the previous summary and the new conversation turns into one updated summary of at most {max_words} words.
+Keep: the user's goals and questions, facts learned about the data, decisions and preferences, charts and analyses produced (describe them; do not copy code), and open questions.
+Output the summary only."""
+
+_CJK_PATTERN = re.compile("[\u3000-\u303f\u3400-\u9fff\uac00-\ud7af\uff00-\uffef]")
+_encoding = None
+_encoding_failed = False
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if tiktoken is None or _encoding_failed:
+        return None
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:  # 编码表需要联网下载
+            print(f"[Memory] 无法加载 tiktoken 编码，改为按字符数估算: {e}")
+            _encoding_failed = True
+            return None
+    return _encoding
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数 (有 tiktoken 时精确计数，否则中日韩字符按 1 个、其他字符按 4 个一组估算)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """一条消息在提示中占用的 token 数"""
+    return MESSAGE_OVERHEAD_TOKENS + estimate_tokens(str(message.get("content") or ""))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """把文本截断到 token 上限以内，保留开头和结尾
+
+    Args:
+        text: 原文本
+        max_tokens: token 上限
+
+    Returns:
+        str: 未超过上限时为原文本，否则为 开头 + 截断标记 + 结尾
+    """
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = int(len(text) * max_tokens / tokens)
+    while True:
+        head = keep * 2 // 3
+        tail = keep - head
+        truncated = text[:head] + TRUNCATION_MARKER + (text[-tail:] if tail else "")
+        if keep <= 0 or estimate_tokens(truncated) <= max_tokens:
+            return truncated
+        keep = int(keep * 0.9)
+
+def pack_history(history: List[Dict[str, Any]], budget: int) -> List[Dict[str, str]]:
+    """从最新的消息往前，把历史消息装入 token 预算
+
+    Args:
+        history: 按时间顺序的 {"role", "content"} 消息
+        budget: token 预算
+
+    Returns:
+        List[Dict[str, str]]: 预算内最近的连续若干条消息 (按时间顺序，过长的单条消息已截断)
+    """
+    packed = []
+    used = 0
+    for message in reversed(history):
+        content = truncate_to_tokens(str(message.get("content") or ""), MESSAGE_MAX_TOKENS)
+        cost = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(content)
+        if used + cost > budget:
+            break
+        packed.append({"role": message["role"], "content": content})
+        used += cost
+    packed.reverse()
+    return packed
+
+def _summary_chunks(turns: List[Dict[str, Any]]) -> List[str]:
+    """把待摘要的对话按 SUMMARY_INPUT_TOKENS 切成若干段文本"""
+    chunks, lines, used = [], [], 0
+    for message in turns:
+        line = f"{message['role']}: {truncate_to_tokens(str(message.get('content') or ''), MESSAGE_MAX_TOKENS)}"
+        cost = estimate_tokens(line)
+        if lines and used + cost > SUMMARY_INPUT_TOKENS:
+            chunks.append("\n\n".join(lines))
+            lines, used = [], 0
+        lines.append(line)
+        used += cost
+    if lines:
+        chunks.append("\n\n".join(lines))
+    return chunks
+
+def summarize_turns(previous_summary: Optional[str], turns: List[Dict[str, Any]]) -> Optional[str]:
+    """调用 LLM 把新的对话轮次合并进已有摘要
+
+    Args:
+        previous_summary: 已有摘要，没有时为 None
+        turns: 需要合并的消息
+
+    Returns:
+        str | None: 新摘要，请求失败时返回 None
+    """
+    from src.ai.streaming import StreamingLLM  # streaming 依赖本模块，延迟导入
+
+    llm = StreamingLLM()
+    summary = previous_summary
+    system_prompt = SUMMARY_SYSTEM_PROMPT.format(max_words=SUMMARY_MAX_TOKENS // 2)
+    for chunk in _summary_chunks(turns):
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Previous summary:\n{summary or '(none)'}\n\nNew conversation turns:\n{chunk}"},
+        ]
+        reply = llm.generate_response(messages, stream=False)
+        if not reply or not reply.strip():
+            return None
+        summary = truncate_to_tokens(reply.strip(), SUMMARY_MAX_TOKENS)
+    return summary
+
+class ConversationMemory:
+    """会话的滚动摘要和按 token 预算装入的历史
+
+    较早的轮次在后台线程中压缩进 chat_sessions 文档的 summary 字段，每轮提示只包含摘要和预算内的最近消息，
+    因此无论会话多长，提示中历史部分的大小都有上限。摘要滞后时超出预算的最早消息直接不放入提示。
+    """
+
+    def __init__(self, budget: int = HISTORY_TOKEN_BUDGET):
+        self.budget = budget
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="autovis-summary")
+        self._lock = threading.Lock()
+        self._states: "OrderedDict[str, Tuple[Optional[str], int]]" = OrderedDict()
+        self._pending = set()
+
+    def _get_state(self, session_id: str) -> Tuple[Optional[str], int]:
+        """会话当前的 (摘要, 摘要覆盖的消息数)，首次访问时从数据库读取"""
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is not None:
+                self._states.move_to_end(session_id)
+                return state
+        details = get_session_details(session_id) or {}
+        state = (details.get("summary") or None, int(details.get("summary_covered_messages") or 0))
+        with self._lock:
+            self._states.setdefault(session_id, state)
+            self._states.move_to_end(session_id)
+            while len(self._states) > MAX_TRACKED_SESSIONS:
+                self._states.popitem(last=False)
+            return self._states[session_id]
+
+    def build_history(self, session_id: Optional[str], history: List[Dict[str, Any]]) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        """取得放入提示的历史，需要时在后台更新摘要
+
+        Args:
+            session_id: 会话 ID (为 None 时不使用摘要)
+            history: 会话的全部历史消息 (按时间顺序)
+
+        Returns:
+            tuple: (摘要或 None, 预算内的最近消息)
+        """
+        if not history:
+            return None, []
+        summary, covered = self._get_state(session_id) if session_id else (None, 0)
+        if covered > len(history):
+            # 历史比摘要覆盖的还短 (消息被删除)，摘要作废
+            summary, covered = None, 0
+        remaining = self.budget - (estimate_tokens(summary) + MESSAGE_OVERHEAD_TOKENS if summary else 0)
+        recent = pack_history(history[covered:], remaining)
+        if session_id:
+            self._maybe_summarize(session_id, history, summary, covered)
+        return summary, recent
+
+    def _maybe_summarize(self, session_id: str, history: List[Dict[str, Any]], summary: Optional[str], covered: int) -> None:
+        end = len(history) - RECENT_MESSAGES_KEPT
+        if end <= covered:
+            return
+        if sum(message_tokens(message) for message in history[covered:]) < self.budget * SUMMARIZE_TRIGGER_RATIO:
+            return
+        with self._lock:
+            if session_id in self._pending:
+                return
+            self._pending.add(session_id)
+        self._executor.submit(self._summarize, session_id, summary, list(history[covered:end]), end)
+
+    def _summarize(self, session_id: str, previous_summary: Optional[str], turns: List[Dict[str, Any]], covered: int) -> None:
+        try:
+            summary = summarize_turns(previous_summary, turns)
+            if not summary:
+                return
+            with self._lock:
+                self._states[session_id] = (summary, covered)
+            update_session_summary(session_id, summary, covered)
+            print(f"[Memory] 会话 {session_id} 的摘要已更新，覆盖前 {covered} 条消息，约 {estimate_tokens(summary)} tokens")
+        except Exception as e:
+            print(f"[Memory] 更新会话 {session_id} 的摘要失败: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(session_id)
+
+_memory: Optional[ConversationMemory] = None
+_memory_lock = threading.Lock()
+
+def get_conversation_memory() -> ConversationMemory:
+    """获取进程内唯一的会话记忆 (所有 Streamlit 会话共享摘要线程)"""
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = ConversationMemory()
+            print(f"[Memory] 历史 token 预算: {HISTORY_TOKEN_BUDGET}，摘要上限: {SUMMARY_MAX_TOKENS}")
+        return _memory
@@ -0,0 +1,201 @@
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 连接超时和读取超时 (秒)；流式响应中读取超时是两个数据块之间的最长间隔
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("AUTOVIS_LLM_CONNECT_TIMEOUT", 5))
+LLM_READ_TIMEOUT_SECONDS = float(os.environ.get("AUTOVIS_LLM_READ_TIMEOUT", 120))
+# 连接池：按主机缓存的连接池数，以及每个主机保持的长连接数 (同时进行的请求超过时临时新建连接)
+LLM_POOL_CONNECTIONS = int(os.environ.get("AUTOVIS_LLM_POOL_CONNECTIONS", 4))
+LLM_POOL_MAXSIZE = int(os.environ.get("AUTOVIS_LLM_POOL_MAXSIZE", 32))
+# 遇到 429/5xx 或连接错误时的重试次数和退避系数 (第 n 次重试前等待 backoff * 2^(n-1) 秒，服务端给出 Retry-After 时按其等待)
+LLM_MAX_RETRIES = int(os.environ.get("AUTOVIS_LLM_MAX_RETRIES", 3))
+LLM_RETRY_BACKOFF_SECONDS = float(os.environ.get("AUTOVIS_LLM_RETRY_BACKOFF", 0.5))
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# 统计延迟使用的最近请求数
+LATENCY_WINDOW = 200
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[int(fraction * (len(ordered) - 1))], 3) if ordered else 0.0
+
+class LLMRequestError(Exception):
+    """LLM 接口返回了非 200 状态 (重试之后)"""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"API request failed: {status_code} - {text}")
+        self.status_code = status_code
+
+class LLMRequestStats:
+    """LLM 请求的计数和延迟统计 (同步和异步客户端共用)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._header_latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._first_token_latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+
+    def record_response(self, status_code: int, retries: int, header_seconds: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.retries += retries
+            if status_code != 200:
+                self.errors += 1
+            self._header_latencies.append(header_seconds)
+
+    def record_error(self, retries: int = 0) -> None:
+        with self._lock:
+            self.requests += 1
+            self.errors += 1
+            self.retries += retries
+
+    def record_first_token(self, seconds: float) -> None:
+        with self._lock:
+            self._first_token_latencies.append(seconds)
+
+    def record_usage(self, prompt_tokens: int, cached_tokens: int) -> None:
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.cached_prompt_tokens += cached_tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "retries": self.retries,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_token_ratio": round(self.cached_prompt_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+                "avg_header_seconds": round(sum(self._header_latencies) / len(self._header_latencies), 3) if self._header_latencies else 0.0,
+                "avg_ttft_seconds": round(sum(self._first_token_latencies) / len(self._first_token_latencies), 3) if self._first_token_latencies else 0.0,
+                "p95_ttft_seconds": _percentile(self._first_token_latencies, 0.95),
+            }
+
+def record_usage(stats: LLMRequestStats, usage: Optional[Dict[str, Any]]) -> None:
+    """从 OpenAI 兼容的 usage 中取出提示 token 数和缓存命中的 token 数 (接口未报告时不计入)"""
+    if not usage or not usage.get("prompt_tokens"):
+        return
+    details = usage.get("prompt_tokens_details") or {}
+    stats.record_usage(int(usage["prompt_tokens"]), int(details.get("cached_tokens") or 0))
+
+class LLMHttpClient:
+    """访问 LLM 接口的共享HTTP客户端：连接池 + 长连接 + 超时 + 429/5xx 退避重试
+
+    所有会话和线程共享一个 requests.Session，同一主机的请求复用已建立的 TCP/TLS 连接。
+    同时记录连接复用、重试、响应头延迟和首个 token 延迟 (TTFT)。
+    """
+
+    def __init__(self):
+        self.timeout = (LLM_CONNECT_TIMEOUT_SECONDS, LLM_READ_TIMEOUT_SECONDS)
+        retry = Retry(
+            total=LLM_MAX_RETRIES,
+            connect=LLM_MAX_RETRIES,
+            read=0,  # 已开始接收的响应不重试
+            status=LLM_MAX_RETRIES,
+            backoff_factor=LLM_RETRY_BACKOFF_SECONDS,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(pool_connections=LLM_POOL_CONNECTIONS, pool_maxsize=LLM_POOL_MAXSIZE, max_retries=retry)
+        self._session = requests.Session()
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+        self._stats = LLMRequestStats()
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """发送 POST 请求 (未指定 timeout 时使用默认的连接/读取超时)
+
+        Returns:
+            requests.Response: 响应；流式读取时调用方需要读完或关闭响应，连接才会回到连接池
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            response = self._session.post(url, **kwargs)
+        except requests.RequestException:
+            self._stats.record_error()
+            raise
+        retry_state = getattr(response.raw, "retries", None)
+        retries = len(retry_state.history) if retry_state is not None else 0
+        self._stats.record_response(response.status_code, retries, response.elapsed.total_seconds())
+        if retries:
+            print(f"[LLM HTTP] 请求重试 {retries} 次后返回 {response.status_code}")
+        return response
+
+    def stream_lines(self, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> Iterator[str]:
+        """发送流式请求，返回响应的文本行 (读完或关闭迭代器后连接回到连接池)
+
+        Raises:
+            Exception: 响应状态不是 200 (在返回迭代器之前抛出)
+        """
+        response = self.post(url, headers=headers, json=payload, stream=True)
+        if response.status_code != 200:
+            try:
+                raise LLMRequestError(response.status_code, response.text)
+            finally:
+                response.close()
+        return self._iter_lines(response)
+
+    @staticmethod
+    def _iter_lines(response: requests.Response) -> Iterator[str]:
+        try:
+            for line in response.iter_lines():
+                yield line.decode("utf-8")
+        finally:
+            response.close()
+
+    def post_json(self, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """发送非流式请求，返回解析后的JSON"""
+        response = self.post(url, headers=headers, json=payload)
+        if response.status_code != 200:
+            raise LLMRequestError(response.status_code, response.text)
+        return response.json()
+
+    def record_first_token(self, seconds: float) -> None:
+        """记录从发出请求到收到第一个内容片段的时间"""
+        self._stats.record_first_token(seconds)
+
+    def record_usage(self, usage: Dict[str, Any]) -> None:
+        """记录接口返回的 usage (提示 token 数和命中提供方前缀缓存的 token 数)"""
+        record_usage(self._stats, usage)
+
+    def _pool_counters(self):
+        """连接池中累计新建的连接数和发出的请求数"""
+        new_connections = pooled_requests = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            new_connections += pool.num_connections
+            pooled_requests += pool.num_requests
+        return new_connections, pooled_requests
+
+    def stats(self) -> Dict[str, Any]:
+        """返回请求数、连接复用、重试和延迟统计"""
+        new_connections, pooled_requests = self._pool_counters()
+        stats = self._stats.snapshot()
+        stats.update(new_connections=new_connections, reused_connections=max(0, pooled_requests - new_connections))
+        return stats
+
+_client: Optional[LLMHttpClient] = None
+_client_lock = threading.Lock()
+
+def get_llm_http_client() -> LLMHttpClient:
+    """获取进程内唯一的 LLM HTTP 客户端 (所有 Streamlit 会话共享)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMHttpClient()
+            print(f"[LLM HTTP] 连接池大小: {LLM_POOL_MAXSIZE}，超时: {_client.timeout}，最多重试 {LLM_MAX_RETRIES} 次")
+        return _client
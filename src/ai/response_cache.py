@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, List, Optional
+
+# LLM 回复缓存的条目数、字节数上限和有效期 (秒)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("AUTOVIS_RESPONSE_CACHE_ENTRIES", 1024))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("AUTOVIS_RESPONSE_CACHE_BYTES", 64 * 1024 ** 2))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("AUTOVIS_RESPONSE_CACHE_TTL", 6 * 3600))
+# 设置为 0 时关闭回复缓存
+RESPONSE_CACHE_ENABLED = os.environ.get("AUTOVIS_RESPONSE_CACHE", "1") != "0"
+# 回放缓存的回复时每次送出的字符数
+REPLAY_CHUNK_CHARS = 80
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[List[str]]:
+    """去掉消息中不影响回复的差异 (首尾空白、连续空白的宽度)
+
+    Args:
+        messages: OpenAI 格式的消息列表
+
+    Returns:
+        List[List[str]]: [角色, 规范化内容] 列表 (仅用于计算缓存键)
+    """
+    return [[str(message.get("role", "")), _WHITESPACE_PATTERN.sub(" ", str(message.get("content") or "")).strip()] for message in messages]
+
+def dataset_fingerprint(df_cache_key: Optional[tuple]) -> Optional[str]:
+    """由数据集缓存键得到数据集指纹 (文件缓存键只取决于内容，同一数据重复上传时相同)
+
+    Args:
+        df_cache_key: make_file_cache_key / make_mysql_cache_key 生成的键
+
+    Returns:
+        str | None: 指纹，没有加载数据集时返回 None
+    """
+    if not df_cache_key:
+        return None
+    return hashlib.sha1(repr(tuple(df_cache_key)).encode("utf-8")).hexdigest()
+
+def make_response_cache_key(model: str, messages: List[Dict[str, Any]], fingerprint: Optional[str] = None, params: Optional[Dict[str, Any]] = None) -> str:
+    """构造回复缓存键：模型、规范化后的消息、数据集指纹和生成参数"""
+    material = json.dumps([model, normalize_messages(messages), fingerprint, params or {}], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def replay_response(text: str) -> Iterator[str]:
+    """把缓存的回复按小段送出，和实时回复一样经过流式占位符渲染"""
+    for start in range(0, len(text), REPLAY_CHUNK_CHARS):
+        yield text[start:start + REPLAY_CHUNK_CHARS]
+
+class _CachedResponse:
+    def __init__(self, text: str, expires_at: float):
+        self.text = text
+        self.expires_at = expires_at
+        self.nbytes = len(text.encode("utf-8"))
+
+class LLMResponseCache:
+    """按 (模型, 规范化消息, 数据集指纹) 缓存完整的 LLM 回复
+
+    同一数据集的初始可视化提示、不同用户在相同表结构上提出的相同问题直接返回缓存的回复，不再请求模型。
+    条目超过有效期后视为未命中；超出条目数或字节数上限时按LRU顺序淘汰。
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, _CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """查找缓存的回复
+
+        Returns:
+            str | None: 回复文本，未命中或已过期时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at < time.time():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.text
+
+    def put(self, key: Hashable, text: str) -> None:
+        """保存完整的回复 (空回复不缓存)"""
+        if not text:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            entry = _CachedResponse(text, time.time() + self.ttl_seconds)
+            self._entries[key] = entry
+            self._total_bytes += entry.nbytes
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        # 调用方需持有 self._lock
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存命中率、占用等指标"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+_cache_instance: Optional[LLMResponseCache] = None
+_cache_instance_lock = threading.Lock()
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """获取进程内唯一的回复缓存 (通过 AUTOVIS_RESPONSE_CACHE=0 关闭时返回 None)"""
+    global _cache_instance
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    with _cache_instance_lock:
+        if _cache_instance is None:
+            _cache_instance = LLMResponseCache()
+        return _cache_instance
+
+def cached_generate_reply(agent, messages: List[Dict[str, Any]], fingerprint: Optional[str] = None, use_cache: bool = True):
+    """带缓存地调用 autogen ConversableAgent.generate_reply (非流式)
+
+    Args:
+        agent: ConversableAgent
+        messages: 发送给代理的消息
+        fingerprint: 数据集指纹 (见 dataset_fingerprint)
+        use_cache: False 时跳过缓存查询，但仍保存新的回复
+
+    Returns:
+        代理的回复
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return agent.generate_reply(messages=messages)
+    config_list = (agent.llm_config or {}).get("config_list") or [{}]
+    model = config_list[0].get("model", "")
+    key = make_response_cache_key(model, [{"role": "system", "content": agent.system_message}] + list(messages), fingerprint)
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            print(f"[Response Cache] 命中 {agent.name} 的回复 {cache.stats()}")
+            return cached
+    reply = agent.generate_reply(messages=messages)
+    if isinstance(reply, str):
+        cache.put(key, reply)
+    return reply
@@ -1,9 +1,87 @@
 import os
 import json
+import functools
 import uuid
-import requests
 import time
 import streamlit as st
+from src.ai.http_client import get_llm_http_client
+from src.ai.async_client import get_async_llm_client
+from src.ai.conversation_memory import get_conversation_memory, message_tokens
+from src.ai.response_cache import get_response_cache, make_response_cache_key, dataset_fingerprint, replay_response
+
+# 流式内容刷新占位符的最小间隔 (秒)：逐个 token 重绘会让 websocket 消息和前端重排成为瓶颈
+STREAM_RENDER_INTERVAL_SECONDS = float(os.environ.get("AUTOVIS_STREAM_RENDER_INTERVAL", 0.1))
+
+class ThrottledPlaceholder:
+    """合并高频更新的占位符渲染器，LLM token 和代码执行输出共用
+
+    每次更新只记录最新内容，距上次渲染超过 interval 时才真正刷新占位符；结束时调用 flush 渲染最终内容。
+    """
+
+    def __init__(self, placeholder, kind: str = "markdown", language: str = "text", interval: float = STREAM_RENDER_INTERVAL_SECONDS, max_chars: int = None):
+        """
+        Args:
+            placeholder: st.empty() 返回的占位符
+            kind: "markdown" 或 "code"
+            language: kind 为 code 时的语言
+            interval: 最小刷新间隔 (秒)
+            max_chars: 只显示内容末尾的字符数 (None 表示全部)
+        """
+        self.placeholder = placeholder
+        self.kind = kind
+        self.language = language
+        self.interval = interval
+        self.max_chars = max_chars
+        self.text = ""
+        self._rendered = None
+        self._last_render = 0.0
+        self.renders = 0
+
+    def append(self, chunk: str, suffix: str = "") -> None:
+        """追加内容 (suffix 仅用于显示，例如光标)"""
+        self.update(self.text + chunk, suffix)
+
+    def update(self, text: str, suffix: str = "") -> None:
+        """替换为新的完整内容"""
+        self.text = text
+        if time.monotonic() - self._last_render >= self.interval:
+            self._render(text + suffix)
+
+    def flush(self) -> None:
+        """渲染最终内容"""
+        self._render(self.text)
+
+    def _render(self, text: str) -> None:
+        if self.max_chars is not None and len(text) > self.max_chars:
+            text = "...\n" + text[-self.max_chars:]
+        self._last_render = time.monotonic()
+        if text == self._rendered:
+            return
+        if self.kind == "code":
+            self.placeholder.code(text, language=self.language)
+        else:
+            self.placeholder.markdown(text)
+        self._rendered = text
+        self.renders += 1
+
+def _stream_into_placeholder(chunks, message_placeholder) -> str:
+    """把流式响应合并渲染到占位符，返回完整回复"""
+    renderer = ThrottledPlaceholder(message_placeholder)
+    for chunk in chunks:
+        renderer.append(chunk, suffix="▌")
+    renderer.flush()
+    return renderer.text
+
+def _current_dataset_fingerprint():
+    """当前会话已加载数据集的指纹 (回复缓存键的一部分)"""
+    try:
+        return dataset_fingerprint(st.session_state.get("df_cache_key"))
+    except Exception:
+        return None
+
+def _get_llm_client():
+    """优先使用异步客户端 (所有会话的流在一个事件循环中复用连接)，未安装 httpx 时使用 requests 连接池"""
+    return get_async_llm_client() or get_llm_http_client()
 
 class StreamingLLM:
     """使用ModelScope API实现真正的流式输出"""
@@ -31,8 +109,8 @@ class StreamingLLM:
         }
     
     def _create_payload(self, messages, stream=True):
-        """创建请求数据"""
-        return {
+        """创建请求数据 (流式请求要求在最后一个数据块中返回 usage，用于统计提示缓存命中率)"""
+        payload = {
             "model": self.model,
             "messages": messages,
             "stream": stream,
@@ -42,124 +120,99 @@ class StreamingLLM:
                 "max_tokens": 1500
             }
         }
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
     
-    def generate_response(self, messages, stream=True):
-        """生成回复"""
+    def generate_response(self, messages, stream=True, use_cache=True):
+        """生成回复
+
+        相同模型、相同消息 (规范化后) 和相同数据集的回复从缓存返回，流式调用时按小段回放。
+        流式请求使用异步客户端时在返回之前就已经发出，调用方可以先启动多个互相独立的请求再依次读取。
+
+        Args:
+            messages (list): 消息列表
+            stream (bool): 是否流式返回
+            use_cache (bool): False 时不查询回复缓存 (新的回复仍会写入缓存)
+        """
         headers = self._create_headers()
         payload = self._create_payload(messages, stream)
         
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=payload,
-            stream=stream
-        )
+        cache = get_response_cache()
+        cache_key = None
+        if cache is not None:
+            cache_key = make_response_cache_key(self.model, messages, _current_dataset_fingerprint(), payload["parameters"])
+            cached = cache.get(cache_key) if use_cache else None
+            if cached is not None:
+                print(f"[Response Cache] 命中缓存的回复 {cache.stats()}")
+                return replay_response(cached) if stream else cached
         
-        if response.status_code != 200:
-            raise Exception(f"API request failed: {response.status_code} - {response.text}")
+        client = _get_llm_client()
+        started = time.perf_counter()
+        url = f"{self.base_url}/chat/completions"
         
         if stream:
-            return self._handle_streaming_response(response)
+            return self._handle_streaming_response(client, client.stream_lines(url, headers, payload), started, cache_key)
         else:
-            data = response.json()
-            return data["choices"][0]["message"]["content"]
+            data = client.post_json(url, headers, payload)
+            print(f"[LLM] 非流式回复耗时 {time.perf_counter() - started:.2f}s {client.stats()}")
+            client.record_usage(data.get("usage"))
+            content = data["choices"][0]["message"]["content"]
+            if cache_key is not None:
+                cache.put(cache_key, content)
+            return content
     
-    def _handle_streaming_response(self, response):
-        """处理DashScope流式响应"""
-        for line in response.iter_lines():
-            if line:
-                # 跳过空行
-                line = line.decode('utf-8')
+    def _handle_streaming_response(self, client, lines, started, cache_key=None):
+        """处理DashScope流式响应
+
+        收到 [DONE] 后继续读完响应体，连接才能回到连接池被下一个请求复用，完整的回复写入回复缓存。
+        """
+        first_token_at = None
+        done = False
+        parts = []
+        try:
+            for line in lines:
+                if done or not line:
+                    # 跳过空行
+                    continue
                 if line.startswith('data: '):
                     data = line[6:]  # 去掉'data: '前缀
                     if data == '[DONE]':
-                        break
+                        done = True
+                        continue
                     
                     try:
                         json_data = json.loads(data)
                         # 适配DashScope API响应格式
+                        content = ''
+                        if json_data.get('usage'):
+                            # include_usage 时最后一个数据块只有 usage，choices 为空
+                            client.record_usage(json_data['usage'])
                         if 'choices' in json_data:
-                            delta = json_data.get('choices', [{}])[0].get('delta', {})
-                            content = delta.get('content', '')
-                            if content:
-                                yield content
+                            delta = (json_data.get('choices') or [{}])[0].get('delta') or {}
+                            content = delta.get('content') or ''
                         elif 'output' in json_data:  # DashScope格式
                             content = json_data.get('output', {}).get('text', '')
-                            if content:
-                                yield content
+                        if content:
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                                client.record_first_token(first_token_at - started)
+                            parts.append(content)
+                            yield content
                     except json.JSONDecodeError:
                         continue
+            if cache_key is not None and done:
+                get_response_cache().put(cache_key, "".join(parts))
+        finally:
+            lines.close()
+            ttft = f"{first_token_at - started:.2f}s" if first_token_at is not None else "-"
+            print(f"[LLM] 流式回复 TTFT {ttft}，总耗时 {time.perf_counter() - started:.2f}s {client.stats()}")
 
-def get_streaming_response(user_message, data_context, history: list = None, message_placeholder=None, image_id=None):
-    """获取真正的流式输出响应
-    
-    Args:
-        user_message (str): 用户的当前输入消息
-        data_context (dict): 数据上下文，包含数据源类型/详情和列描述
-        history (list, optional): 之前的对话历史记录列表
-        message_placeholder (streamlit.empty, optional): 用于显示流式输出的占位符
-        image_id (str, optional): (目前未使用，因为路径在 code_execution 中处理)
-    
-    Returns:
-        str: AI助手的完整回复, 或 None 如果出错
-    """
-    # 如果没有提供图片ID，则生成一个
-    if image_id is None:
-        image_id = uuid.uuid4().hex
-    
-    # 构建系统消息
-    system_message = """You are a professional data analysis assistant. You help users analyze and understand data and provide expert insights.
+# 对话系统提示的固定部分，所有会话和轮次逐字节相同
+CHAT_SYSTEM_PREFIX = """You are a professional data analysis assistant. You help users analyze and understand data and provide expert insights.
 Please respond based on the conversation history and the current question.
 
-Data source details:
-"""
-    ds_type = data_context.get("data_source_type")
-    ds_details = data_context.get("data_source_details", {})
-    col_descs = data_context.get("column_descriptions", {})
-
-    # --- 修改：Prompt 指示使用占位符 --- 
-    placeholder_filename = None
-    load_instruction = ""
-
-    if ds_type == 'csv':
-        placeholder_filename = 'data.csv' # Fixed placeholder
-        system_message += f"- Type: File (CSV)\n"
-        system_message += f"- Column descriptions below."
-        load_instruction = f"When loading data in code, always use `pd.read_csv('{placeholder_filename}')`."
-    elif ds_type == 'excel':
-        placeholder_filename = 'data.xlsx' # Fixed placeholder
-        system_message += f"- Type: File (Excel)\n"
-        system_message += f"- Column descriptions below."
-        load_instruction = f"When loading data in code, always use `pd.read_excel('{placeholder_filename}')`."
-    elif ds_type == 'mysql':
-        # MySQL 保持不变，仍需提供连接信息
-        conn_info = ds_details.get("connection_info", {})
-        table_name = ds_details.get("table_name", "unknown_table")
-        system_message += f"- Type: MySQL database\n"
-        system_message += f"- Host: {conn_info.get('host', '?')}:{conn_info.get('port', '?')}\n"
-        system_message += f"- Database: {conn_info.get('database', '?')}\n"
-        system_message += f"- User: {conn_info.get('user', '?')}\n"
-        system_message += f"- Table: {table_name}\n"
-        load_instruction = f"In code, connect to the above MySQL (password will be injected at runtime) and query the table using `pd.read_sql('SELECT * FROM `{table_name}`', connection)`."
-    else:
-        system_message += "- Data source not provided or unrecognized.\n"
-        load_instruction = "Unable to determine how to load the data."
-
-    system_message += "\nColumn descriptions:\n"
-    if col_descs:
-        for col, desc in col_descs.items():
-            system_message += f"- {col}: {desc if desc else '(no description)'}\n"
-    else:
-        system_message += "- No column descriptions.\n"
-
-    system_message += """
-
-Current visualization code (if any):
-{current_code}
-
 --- Code generation rules ---
-{load_instruction}
-
 1. Generate appropriate Python code based on the user's needs:
 
    A. If the user asks for a visualization (charts, figures):
@@ -175,18 +228,91 @@ Current visualization code (if any):
       - Do not include plotting/saving code
       - Ensure outputs are easy to read
 
-Remember: use the specified placeholders when loading files or the specified DB connection when using MySQL.
+Remember: load the data exactly as described under "Data loading" below (the file placeholder, or the specified DB connection when using MySQL).
 
 Do NOT generate extra explanations!!!
-""".format(current_code=data_context.get('current_code', '(none)'), load_instruction=load_instruction)
 
-    # 构建包含历史记录的消息列表
+"""
+
+@functools.lru_cache(maxsize=256)
+def _render_session_block(ds_type, host, port, database, user, table_name, column_items) -> str:
+    """渲染数据源、列描述和数据加载方式 (同一数据集的每一轮对话得到同一个字符串)"""
+    block = "Data source details:\n"
+    # --- Prompt 指示使用占位符 ---
+    if ds_type == 'csv':
+        block += "- Type: File (CSV)\n"
+        load_instruction = "When loading data in code, always use `pd.read_csv('data.csv')`."
+    elif ds_type == 'excel':
+        block += "- Type: File (Excel)\n"
+        load_instruction = "When loading data in code, always use `pd.read_excel('data.xlsx')`."
+    elif ds_type == 'mysql':
+        # MySQL 仍需提供连接信息
+        block += "- Type: MySQL database\n"
+        block += f"- Host: {host}:{port}\n"
+        block += f"- Database: {database}\n"
+        block += f"- User: {user}\n"
+        block += f"- Table: {table_name}\n"
+        load_instruction = f"In code, connect to the above MySQL (password will be injected at runtime) and query the table using `pd.read_sql('SELECT * FROM `{table_name}`', connection)`."
+    else:
+        block += "- Data source not provided or unrecognized.\n"
+        load_instruction = "Unable to determine how to load the data."
+
+    block += "\nColumn descriptions:\n"
+    if column_items:
+        for col, desc in column_items:
+            block += f"- {col}: {desc if desc else '(no description)'}\n"
+    else:
+        block += "- No column descriptions.\n"
+    block += f"\nData loading: {load_instruction}\n"
+    return block
+
+def _session_block(data_context):
+    """会话级的数据集说明，只取决于数据源和列描述，不含本轮内容"""
+    ds_type = data_context.get("data_source_type")
+    ds_details = data_context.get("data_source_details") or {}
+    conn_info = ds_details.get("connection_info") or {}
+    col_descs = data_context.get("column_descriptions") or {}
+    return _render_session_block(
+        ds_type,
+        str(conn_info.get('host', '?')), str(conn_info.get('port', '?')), str(conn_info.get('database', '?')), str(conn_info.get('user', '?')),
+        str(ds_details.get("table_name", "unknown_table")),
+        tuple((str(col), str(desc) if desc else "") for col, desc in col_descs.items()),
+    )
+
+def _render_turn_context(current_code, conversation_summary=None):
+    """本轮变化的内容 (较早对话的摘要、当前可视化代码)，放在最后一条用户消息中，不破坏前面的缓存前缀"""
+    parts = []
+    if conversation_summary:
+        parts.append(f"Summary of the earlier conversation:\n{conversation_summary}")
+    parts.append(f"Current visualization code (if any):\n{current_code or '(none)'}")
+    return "\n\n".join(parts)
+
+def get_streaming_response(user_message, data_context, history: list = None, message_placeholder=None, image_id=None, session_id=None):
+    """获取真正的流式输出响应
+    
+    Args:
+        user_message (str): 用户的当前输入消息
+        data_context (dict): 数据上下文，包含数据源类型/详情和列描述
+        history (list, optional): 之前的对话历史记录列表 (按 token 预算装入，较早的轮次以会话摘要代替)
+        message_placeholder (streamlit.empty, optional): 用于显示流式输出的占位符
+        image_id (str, optional): (目前未使用，因为路径在 code_execution 中处理)
+        session_id (str, optional): 会话ID，用于读取和更新会话摘要
+    
+    Returns:
+        str: AI助手的完整回复, 或 None 如果出错
+    """
+    # 如果没有提供图片ID，则生成一个
+    if image_id is None:
+        image_id = uuid.uuid4().hex
+    
+    # 提示按 固定前缀 → 会话级数据集说明 → 历史 → 本轮内容 排列：前两部分逐字节复用，提供方可以缓存这段前缀
+    conversation_summary, recent_history = get_conversation_memory().build_history(session_id, history or [])
+    system_message = CHAT_SYSTEM_PREFIX + _session_block(data_context)
+    turn_context = _render_turn_context(data_context.get("current_code"), conversation_summary)
     messages = [{"role": "system", "content": system_message}]
-    if history:
-        # 限制历史记录长度，避免超出 token 限制 (例如，保留最近 N 条消息)
-        max_history_len = 10 # 可调整
-        messages.extend(history[-(max_history_len*2):]) # 乘以2大致包含用户和助手
-    messages.append({"role": "user", "content": user_message})
+    messages.extend(recent_history)
+    messages.append({"role": "user", "content": f"{turn_context}\n\n--- Current question ---\n{user_message}"})
+    print(f"[Memory] 历史 {len(history or [])} 条，放入提示 {len(recent_history)} 条{'及摘要' if conversation_summary else ''}，提示约 {sum(message_tokens(m) for m in messages)} tokens")
 
     print_messages = messages[-10:] 
     print("[Streaming Request] Sending messages to LLM (last 10):", json.dumps(print_messages, indent=2, ensure_ascii=False))
@@ -200,9 +326,7 @@ Do NOT generate extra explanations!!!
     # 处理流式响应
     if message_placeholder:
         try:
-            for chunk in llm.generate_response(messages):
-                full_reply += chunk
-                message_placeholder.markdown(full_reply)
+            full_reply = _stream_into_placeholder(llm.generate_response(messages), message_placeholder)
         except Exception as e:
             print(f"Error during streaming generation: {e}")
             try:
@@ -223,18 +347,8 @@ Do NOT generate extra explanations!!!
     
     return full_reply 
 
-def process_analysis_streaming(output_text, user_query, data_context=None, message_placeholder=None):
-    """处理分析结果并提供流式解释
-    
-    Args:
-        output_text (str): 代码执行的输出文本
-        user_query (str): 用户的原始查询
-        data_context (dict, optional): 数据上下文信息
-        message_placeholder (streamlit.empty, optional): 用于显示流式输出的占位符
-        
-    Returns:
-        str: 对分析结果的专业解释
-    """
+def _analysis_explanation_messages(output_text, user_query, data_context=None):
+    """构建解释分析结果的消息列表"""
     # 构建系统消息
     system_message = """You are a professional data analyst. Your task is to explain the execution results of analysis code in a way the user can easily understand.
 Ensure the explanation is accurate, professional, and concise. Do not merely repeat numbers; provide insights. If the output is empty, return nothing."""
@@ -272,6 +386,22 @@ Provide a concise, professional explanation focusing on key findings and insight
         {"role": "system", "content": system_message},
         {"role": "user", "content": prompt}
     ]
+    return messages
+
+def process_analysis_streaming(output_text, user_query, data_context=None, message_placeholder=None, pending_response=None):
+    """处理分析结果并提供流式解释
+    
+    Args:
+        output_text (str): 代码执行的输出文本
+        user_query (str): 用户的原始查询
+        data_context (dict, optional): 数据上下文信息
+        message_placeholder (streamlit.empty, optional): 用于显示流式输出的占位符
+        pending_response (optional): start_explanation 提前发出的请求，有占位符时直接读取
+        
+    Returns:
+        str: 对分析结果的专业解释
+    """
+    messages = _analysis_explanation_messages(output_text, user_query, data_context)
     
     # 尝试使用LLM进行分析
     try:
@@ -284,9 +414,7 @@ Provide a concise, professional explanation focusing on key findings and insight
         # 处理流式响应
         if message_placeholder:
             try:
-                for chunk in llm.generate_response(messages):
-                    full_reply += chunk
-                    message_placeholder.markdown(full_reply)
+                full_reply = _stream_into_placeholder(pending_response if pending_response is not None else llm.generate_response(messages), message_placeholder)
             except Exception as e:
                 print(f"Error during analysis streaming generation: {e}")
                 # Provide a basic analysis if streaming fails
@@ -317,18 +445,8 @@ Provide a concise, professional explanation focusing on key findings and insight
         return basic_response 
     
     
-def process_image_streaming(output_text, user_query, data_context=None, message_placeholder=None):
-    """处理图像生成结果并提供流式解释
-    
-    Args:
-        output_text (str): 代码执行的输出文本
-        user_query (str): 用户的原始查询
-        data_context (dict, optional): 数据上下文信息
-        message_placeholder (streamlit.empty, optional): 用于显示流式输出的占位符
-        
-    Returns:
-        str: 对分析结果的专业解释
-    """
+def _image_explanation_messages(output_text, user_query, data_context=None):
+    """构建解释图表生成结果的消息列表"""
     # 构建系统消息
     system_message = """You are a professional data analyst. Your task is to explain the execution results of visualization code and make them easy to understand.
 If the output is empty, return nothing. If the content is only warnings, return nothing as well."""
@@ -363,6 +481,22 @@ Provide a concise, professional explanation to help the user understand the resu
         {"role": "system", "content": system_message},
         {"role": "user", "content": prompt}
     ]
+    return messages
+
+def process_image_streaming(output_text, user_query, data_context=None, message_placeholder=None, pending_response=None):
+    """处理图像生成结果并提供流式解释
+    
+    Args:
+        output_text (str): 代码执行的输出文本
+        user_query (str): 用户的原始查询
+        data_context (dict, optional): 数据上下文信息
+        message_placeholder (streamlit.empty, optional): 用于显示流式输出的占位符
+        pending_response (optional): start_explanation 提前发出的请求，有占位符时直接读取
+        
+    Returns:
+        str: 对分析结果的专业解释
+    """
+    messages = _image_explanation_messages(output_text, user_query, data_context)
     
     # 尝试使用LLM进行分析
     try:
@@ -375,9 +509,7 @@ Provide a concise, professional explanation to help the user understand the resu
         # 处理流式响应
         if message_placeholder:
             try:
-                for chunk in llm.generate_response(messages):
-                    full_reply += chunk
-                    message_placeholder.markdown(full_reply)
+                full_reply = _stream_into_placeholder(pending_response if pending_response is not None else llm.generate_response(messages), message_placeholder)
             except Exception as e:
                 print(f"Error during analysis streaming generation: {e}")
                 # 在出错情况下，提供一个基本的分析
@@ -406,4 +538,25 @@ Provide a concise, professional explanation to help the user understand the resu
         basic_response = f"## Analysis Result\n\nOutput from code execution:\n\n```\n{output_text}\n```"
         if message_placeholder:
             message_placeholder.markdown(basic_response)
-        return basic_response 
\ No newline at end of file
+        return basic_response
+
+def start_explanation(kind, output_text, user_query, data_context=None):
+    """提前发出执行结果的解释请求，返回的回复流交给 process_image_streaming/process_analysis_streaming 读取
+
+    使用异步客户端时请求在后台进行，与页面显示图表、保存消息等工作重叠。
+
+    Args:
+        kind (str): "image" 或 "analysis"
+        output_text (str): 代码执行的输出文本
+        user_query (str): 用户的原始查询
+        data_context (dict, optional): 数据上下文信息
+
+    Returns:
+        回复流，请求失败时返回 None (由 process_*_streaming 重新请求并处理错误)
+    """
+    build_messages = _image_explanation_messages if kind == "image" else _analysis_explanation_messages
+    try:
+        return StreamingLLM().generate_response(build_messages(output_text, user_query, data_context))
+    except Exception as e:
+        print(f"Error starting {kind} explanation: {e}")
+        return None
@@ -121,12 +121,18 @@ def display_user_settings(user_info):
         else:
             default_index = 0
         theme = st.selectbox("Theme", theme_options_en, index=default_index)
+        compact_dataframes = st.toggle(
+            "Compact data in memory",
+            value=user_settings.get('compact_dataframes', False),
+            help="Downcast numeric columns and store text columns as category/Arrow strings when loading data"
+        )
         
         if st.button("Save Settings"):
             new_settings = {
                 "notifications": notifications,
                 "dark_mode": dark_mode,
-                "theme": theme
+                "theme": theme,
+                "compact_dataframes": compact_dataframes
             }
             success, message = update_settings(user_info['username'], new_settings)
             if success:
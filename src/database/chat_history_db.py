@@ -2,6 +2,7 @@ from datetime import datetime
 from bson import ObjectId  # 用于处理 MongoDB ObjectIDs
 import os # 新增
 import shutil # 新增
+import json
 import traceback # For better error logging
 
 # 从 mongodb.py 导入共享的数据库对象
@@ -16,12 +17,14 @@ except ImportError:
 # 获取或创建 chat_sessions 和 chat_messages 集合
 chat_sessions = db['chat_sessions']
 chat_messages = db['chat_messages']
+dataset_profiles = db['dataset_profiles'] # 按数据内容哈希保存的数据分析报告
 
 # 可选：为常用查询字段创建索引以提高性能
 chat_sessions.create_index('user_id')
 chat_sessions.create_index([('user_id', 1), ('last_updated_at', -1)]) # 复合索引，用于按用户获取并排序
 chat_messages.create_index('session_id')
 chat_messages.create_index([('session_id', 1), ('timestamp', 1)]) # 复合索引，用于按会话获取并排序
+dataset_profiles.create_index([('content_hash', 1), ('profiler_version', 1)], unique=True)
 
 def create_new_session(user_id: str, session_name: str = "未命名会话") -> str | None:
     """
@@ -270,5 +273,90 @@ def get_session_details(session_id: str) -> dict | None:
         print(f"获取会话 {session_id} 详细信息时出错: {e}\n{traceback.format_exc()}")
         return None
 
+def update_session_summary(session_id: str, summary: str, covered_messages: int) -> bool:
+    """
+    保存会话较早对话的滚动摘要。
+
+    Args:
+        session_id: 会话的 ID。
+        summary: 摘要文本。
+        covered_messages: 摘要覆盖的历史消息数 (从会话的第一条消息算起)。
+
+    Returns:
+        如果更新成功返回 True，否则返回 False。
+    """
+    try:
+        result = chat_sessions.update_one(
+            {"_id": ObjectId(session_id)},
+            {
+                "$set": {
+                    "summary": summary,
+                    "summary_covered_messages": covered_messages,
+                    "summary_updated_at": datetime.now()
+                }
+            }
+        )
+        if result.matched_count == 0:
+            print(f"警告：尝试更新不存在的会话 {session_id} 的摘要。")
+            return False
+        return True
+    except Exception as e:
+        print(f"更新会话 {session_id} 摘要时出错: {e}\n{traceback.format_exc()}")
+        return False
+
+def get_dataset_profile(content_hash: str, profiler_version: str) -> dict | None:
+    """
+    获取已保存的数据分析报告。
+
+    Args:
+        content_hash: 数据文件的内容哈希。
+        profiler_version: 生成报告的分析器版本，版本不同的报告不会被复用。
+
+    Returns:
+        包含 'profile' 和 'column_descriptions' 的字典，如果未找到则返回 None。
+    """
+    try:
+        doc = dataset_profiles.find_one({"content_hash": content_hash, "profiler_version": profiler_version})
+        if not doc:
+            return None
+        return {
+            # 报告的键是列名和分类值，可能包含 MongoDB 不允许的字符，因此以 JSON 字符串保存
+            "profile": json.loads(doc["profile"]) if doc.get("profile") else None,
+            "column_descriptions": doc.get("column_descriptions") or {}
+        }
+    except Exception as e:
+        print(f"获取数据分析报告 {content_hash} 时出错: {e}\n{traceback.format_exc()}")
+        return None
+
+def save_dataset_profile(content_hash: str, profiler_version: str, profile: dict, column_descriptions: dict) -> bool:
+    """
+    保存数据分析报告，相同内容哈希和分析器版本的报告会被覆盖。
+
+    Args:
+        content_hash: 数据文件的内容哈希。
+        profiler_version: 生成报告的分析器版本。
+        profile: 数据分析报告。
+        column_descriptions: 自动推断的列描述。
+
+    Returns:
+        如果保存成功返回 True，否则返回 False。
+    """
+    try:
+        dataset_profiles.update_one(
+            {"content_hash": content_hash, "profiler_version": profiler_version},
+            {
+                "$set": {
+                    "profile": json.dumps(profile, ensure_ascii=False, default=str),
+                    "column_descriptions": {str(col): desc for col, desc in column_descriptions.items()},
+                    "updated_at": datetime.now()
+                }
+            },
+            upsert=True
+        )
+        return True
+    except Exception as e:
+        print(f"保存数据分析报告 {content_hash} 时出错: {e}\n{traceback.format_exc()}")
+        return False
+
 # --- 简单的测试 (如果直接运行此文件) ---
  
\ No newline at end of file
@@ -59,6 +59,31 @@ def get_mysql_tables(connection):
         print(f"获取表列表时出错: {e}")
         return []
 
+def get_mysql_table_version(connection, table_name):
+    """获取表的版本标识，用于判断缓存的数据是否仍然有效
+
+    Args:
+        connection: MySQL连接对象
+        table_name (str): 表名
+
+    Returns:
+        str: 由建表时间、更新时间和行数估计组成的版本字符串，获取失败时返回 None
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT CREATE_TIME, UPDATE_TIME, TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                (table_name,)
+            )
+            row = cursor.fetchone()
+        if not row:
+            return None
+        return f"{row['CREATE_TIME']}|{row['UPDATE_TIME']}|{row['TABLE_ROWS']}"
+    except Exception as e:
+        print(f"获取表版本时出错: {e}")
+        return None
+
 def get_mysql_table_data(connection, table_name, limit=10000):
     """获取表数据
     
@@ -90,6 +115,28 @@ def get_mysql_table_data(connection, table_name, limit=10000):
         error_info = f"获取表数据时出错: {str(e)}\n{traceback.format_exc()}"
         return None, error_info
 
+def iter_mysql_table_chunks(connection, table_name, chunk_rows=100000):
+    """使用服务端游标按块读取整张表，客户端内存只保留一个分块
+
+    游标未读完之前该连接不能执行其它查询。
+
+    Args:
+        connection: MySQL连接对象
+        table_name (str): 表名
+        chunk_rows (int): 每个分块的行数
+
+    Yields:
+        DataFrame: 数据分块
+    """
+    with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+        cursor.execute(f"SELECT * FROM `{table_name}`")
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
 def execute_query(connection, query):
     """执行SQL查询
     
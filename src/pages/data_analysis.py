@@ -2,26 +2,35 @@ import streamlit as st
 import pandas as pd
 import os
 import tempfile
+import shutil
 import uuid
 import re
 import time
+import hashlib
 from src.auth.auth import is_logged_in, update_settings
-from src.utils.data_processing import load_data_file, process_data, infer_column_descriptions
-from src.visualization.code_generation import create_chart
+from src.utils.data_processing import load_data_file, process_data, infer_column_descriptions, compact_dataframe
+from src.utils.profiling import profile_chunks, PROFILER_VERSION, STREAMING_PROFILER_VERSION
+from src.utils.parallel_profiling import profile_and_describe, submit_profile_task
+from src.utils.columnar_store import read_columnar_copy, write_columnar_copy, read_columnar_sample, ingest_csv_to_columnar, LARGE_FILE_THRESHOLD_BYTES
+from src.visualization.code_generation import generate_chart_code
+from src.visualization.chart_format import chart_format_of, CHART_MIME_TYPES
 from src.web_utils.ui_elements import display_sidebar_user_info, display_error, display_success, display_code, display_dataframe_info
-from src.database.mysql import connect_mysql, get_mysql_tables, get_mysql_table_data, close_mysql_connection
-from src.visualization.code_execution import execute_code
-from src.ai.streaming import get_streaming_response, process_analysis_streaming, process_image_streaming
-from src.database.chat_history_db import add_message_to_session, get_messages_by_session, update_session_name, get_session_details, update_session_data_context
+from src.database.mysql import connect_mysql, get_mysql_tables, get_mysql_table_data, get_mysql_table_version, iter_mysql_table_chunks, close_mysql_connection
+from src.utils.dataframe_cache import get_dataframe_cache, make_file_cache_key, make_mysql_cache_key
+from src.utils.file_manager import get_content_hash
+from src.visualization.code_execution import write_mysql_snapshot
+from src.visualization.jobs import get_job_manager, FINISHED_STATES, JOB_QUEUED, JOB_CANCELLED, JOB_POLL_INTERVAL_SECONDS
+from src.ai.streaming import get_streaming_response, process_analysis_streaming, process_image_streaming, start_explanation
+from src.database.chat_history_db import add_message_to_session, get_messages_by_session, update_session_name, get_session_details, update_session_data_context, get_dataset_profile, save_dataset_profile
 from bson import ObjectId
 import functools # Import functools for partial if needed, or use args/kwargs directly
 
 # 修改SVG处理函数，将其提取到主代码之外，便于复用
 def display_svg_with_controls(image_path_relative, message_id):
-    """统一显示SVG图表并添加控制按钮
+    """统一显示图表并添加控制按钮 (SVG内联显示；复杂图表在执行时保存为位图，按扩展名改用 st.image)
     
     Args:
-        image_path_relative: SVG图片的相对路径
+        image_path_relative: 图表文件的相对路径 (.svg/.png/.webp)
         message_id: 消息ID，用于生成唯一控件ID
     """
     try:
@@ -29,11 +38,9 @@ def display_svg_with_controls(image_path_relative, message_id):
         project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
         src_root = os.path.join(project_root, "src")
         full_image_path = os.path.join(src_root, image_path_relative)
+        chart_format = chart_format_of(full_image_path)
         
         if os.path.exists(full_image_path):
-            with open(full_image_path, 'r', encoding='utf-8') as f:
-                svg_content = f.read()
-            
             # Initialize zoom state
             if "svg_scale" not in st.session_state:
                 st.session_state.svg_scale = {}
@@ -43,26 +50,33 @@ def display_svg_with_controls(image_path_relative, message_id):
             # Get default size
             default_width = st.session_state.default_chart_width
             default_height = st.session_state.default_chart_height
+            scale = st.session_state.svg_scale[full_image_path]
             
-            if '<svg ' in svg_content:
-                # Extract original size if any
-                w_match = re.search(r'width="([^"]*)"', svg_content)
-                h_match = re.search(r'height="([^"]*)"', svg_content)
+            if chart_format == "svg":
+                with open(full_image_path, 'r', encoding='utf-8') as f:
+                    svg_content = f.read()
                 
-                # Replace with default size
-                svg_content = re.sub(r'width="[^"]*"', f'width="{default_width}px"', svg_content)
-                svg_content = re.sub(r'height="[^"]*"', f'height="{default_height}px"', svg_content)
+                if '<svg ' in svg_content:
+                    # Extract original size if any
+                    w_match = re.search(r'width="([^"]*)"', svg_content)
+                    h_match = re.search(r'height="([^"]*)"', svg_content)
+                    
+                    # Replace with default size
+                    svg_content = re.sub(r'width="[^"]*"', f'width="{default_width}px"', svg_content)
+                    svg_content = re.sub(r'height="[^"]*"', f'height="{default_height}px"', svg_content)
+                    
+                    # Apply scaling
+                    if scale != 1.0:
+                        scaled_width = int(default_width * scale)
+                        scaled_height = int(default_height * scale)
+                        svg_content = re.sub(r'width="[^"]*"', f'width="{scaled_width}px"', svg_content)
+                        svg_content = re.sub(r'height="[^"]*"', f'height="{scaled_height}px"', svg_content)
                 
-                # Apply scaling
-                scale = st.session_state.svg_scale[full_image_path]
-                if scale != 1.0:
-                    scaled_width = int(default_width * scale)
-                    scaled_height = int(default_height * scale)
-                    svg_content = re.sub(r'width="[^"]*"', f'width="{scaled_width}px"', svg_content)
-                    svg_content = re.sub(r'height="[^"]*"', f'height="{scaled_height}px"', svg_content)
-            
-            # Show SVG
-            st.markdown(svg_content, unsafe_allow_html=True)
+                # Show SVG
+                st.markdown(svg_content, unsafe_allow_html=True)
+            else:
+                # Show raster chart (height follows the image aspect ratio)
+                st.image(full_image_path, width=int(default_width * scale))
             
             # Controls
             cols = st.columns(3)
@@ -79,8 +93,8 @@ def display_svg_with_controls(image_path_relative, message_id):
                     st.download_button(
                         label="Download",
                         data=file,
-                        file_name=f"chart_{message_id}.svg",
-                        mime="image/svg+xml",
+                        file_name=f"chart_{message_id}.{chart_format}",
+                        mime=CHART_MIME_TYPES.get(chart_format, "application/octet-stream"),
                         key=f"download_{message_id}"
                     )
             
@@ -92,6 +106,143 @@ def display_svg_with_controls(image_path_relative, message_id):
         st.error(f"Error displaying chart: {e}")
         return False
 
+def bind_shared_dataframe(cache_key, loader):
+    """通过进程内共享缓存获取数据集，并登记当前浏览器会话为持有者
+
+    用户在设置中开启内存压缩时，缓存的是压缩后的版本 (压缩报告保存在 df.attrs["memory_report"])。
+
+    Args:
+        cache_key: 数据集缓存键 (见 make_file_cache_key / make_mysql_cache_key)
+        loader: 缓存未命中时的加载函数
+
+    Returns:
+        pd.DataFrame: 所有会话共享的DataFrame (不要原地修改)
+    """
+    user_settings = (st.session_state.get("user_info") or {}).get("settings", {})
+    if cache_key[0] == "mysql":
+        # 沙箱使用的列式快照取自压缩之前的数据，read_sql 得到的类型与直接查询一致
+        fetch_loader, snapshot_key = loader, cache_key
+        def loader():
+            fetched = fetch_loader()
+            write_mysql_snapshot(snapshot_key, fetched)
+            return fetched
+    if user_settings.get("compact_dataframes"):
+        cache_key = tuple(cache_key) + ("compact",)
+        raw_loader = loader
+        loader = lambda: compact_dataframe(raw_loader())[0]
+    if "df_cache_holder" not in st.session_state:
+        st.session_state.df_cache_holder = uuid.uuid4().hex
+    holder = st.session_state.df_cache_holder
+    cache = get_dataframe_cache()
+    df = cache.acquire(cache_key, holder, loader)
+    previous_key = st.session_state.get("df_cache_key")
+    if previous_key is not None and previous_key != cache_key:
+        cache.release(previous_key, holder)
+    st.session_state.df_cache_key = cache_key
+    print(f"[DataFrame Cache] {cache.stats()}")
+    return df
+
+def dataset_profile_version(sampled, df=None):
+    """数据分析报告的存储版本
+
+    压缩后的 DataFrame 中列为 category/降精度类型，报告和推断的列描述与原始数据不同，因此分开保存。
+    """
+    version = STREAMING_PROFILER_VERSION if sampled else PROFILER_VERSION
+    if df is not None and "memory_report" in df.attrs:
+        version += "-compact"
+    return version
+
+def _generate_dataset_profile(content_hash, profiler_version, df, sampled, streaming_profile):
+    """生成并保存数据分析报告和自动列描述 (在后台线程中运行)"""
+    if sampled:
+        profile, descriptions = streaming_profile, infer_column_descriptions(df)
+    else:
+        # 列很多的大表按列切分到进程池并行分析
+        profile, descriptions = profile_and_describe(df)
+    stored = {"profile": profile, "column_descriptions": descriptions}
+    # 旧会话的样本没有流式报告，不保存不完整的记录，之后重新上传时会补上
+    if profile is not None:
+        save_dataset_profile(content_hash, profiler_version, profile, descriptions)
+    return stored
+
+def bind_dataset_profile(content_hash, df, sampled=False, streaming_profile=None):
+    """读取或生成数据分析报告和自动列描述，结果按内容哈希和类型版本保存，相同数据再次加载时直接复用
+
+    没有保存过的报告在后台线程中生成，页面之后的运行通过 resolve_dataset_profile 取得结果。
+
+    Args:
+        content_hash: 数据文件内容哈希
+        df: 已加载的DataFrame (大文件为样本)
+        sampled: df 是否为大文件的样本；样本的报告必须来自流式分析
+        streaming_profile: 分块导入时生成的流式分析报告
+    """
+    profiler_version = dataset_profile_version(sampled, df)
+    stored = get_dataset_profile(content_hash, profiler_version)
+    st.session_state.dataset_profile = stored["profile"] if stored else None
+    st.session_state.inferred_descriptions = stored["column_descriptions"] if stored else None
+    if stored is not None:
+        print(f"[Dataset Profile] 复用已保存的数据分析报告 ({content_hash}, {profiler_version})")
+        st.session_state.dataset_profile_task = None
+        return
+    print(f"[Dataset Profile] 在后台生成数据分析报告 ({content_hash}, {profiler_version})")
+    st.session_state.dataset_profile_task = submit_profile_task(_generate_dataset_profile, content_hash, profiler_version, df, sampled, streaming_profile)
+
+def resolve_dataset_profile():
+    """后台报告生成完成后写入会话状态 (未完成时保持不变，下次运行页面时再检查)"""
+    task = st.session_state.get("dataset_profile_task")
+    if task is None or not task.done():
+        return
+    st.session_state.dataset_profile_task = None
+    try:
+        stored = task.result()
+    except Exception as e:
+        print(f"[Dataset Profile] 生成数据分析报告失败: {e}")
+        return
+    st.session_state.dataset_profile = stored["profile"]
+    st.session_state.inferred_descriptions = stored["column_descriptions"]
+
+def _generate_mysql_table_profile(conn_info, table_name, profile_key):
+    """用单独的连接流式分析整张表，并按表版本保存报告 (在后台线程中运行)
+
+    页面上取数据的连接在表单提交后就关闭，因此这里自己建立并关闭连接。
+    """
+    connection, conn_error = connect_mysql(**conn_info)
+    if conn_error:
+        raise Exception(f"Connection failed: {conn_error}")
+    try:
+        profile = profile_chunks(iter_mysql_table_chunks(connection, table_name))
+    finally:
+        close_mysql_connection(connection)
+    # MySQL 数据不推断列描述，整表分析只提供报告
+    stored = {"profile": profile, "column_descriptions": {}}
+    if profile_key:
+        save_dataset_profile(profile_key, STREAMING_PROFILER_VERSION, profile, {})
+    return stored
+
+def bind_mysql_table_profile(conn_info, conn_info_safe, table_name, table_version):
+    """读取或在后台生成 MySQL 整张表的流式分析报告
+
+    报告以 (连接信息, 表名, 表版本) 的缓存键为标识保存，表没有变化时再次读取直接复用；
+    无法取得表版本时仍在后台分析，但不保存。
+
+    Args:
+        conn_info: 包含密码的连接信息 (供后台任务建立连接)
+        conn_info_safe: 不含密码的连接信息 (用于构造缓存键)
+        table_name: 表名
+        table_version: 表版本 (见 get_mysql_table_version)，无法取得时为 None
+    """
+    profile_key = None
+    if table_version:
+        table_key = make_mysql_cache_key(conn_info_safe, table_name, None, table_version)
+        profile_key = "mysql-" + hashlib.sha1(repr(table_key).encode("utf-8")).hexdigest()
+        stored = get_dataset_profile(profile_key, STREAMING_PROFILER_VERSION)
+        if stored is not None:
+            print(f"[Dataset Profile] 复用已保存的整表分析报告 ({table_name}, {table_version})")
+            st.session_state.dataset_profile = stored["profile"]
+            return
+    print(f"[Dataset Profile] 在后台流式分析整张表 {table_name}")
+    st.session_state.dataset_profile_task = submit_profile_task(_generate_mysql_table_profile, conn_info, table_name, profile_key)
+
 st.set_page_config(
     page_title="Data Analysis | Data Analysis Assistant",
     page_icon="📊",
@@ -121,6 +272,250 @@ def apply_code_callback(code_to_apply):
         print("[Apply Code Callback] Error: Code to apply is empty.")
         st.toast("Error: cannot apply empty code.", icon="🚨")
 
+# 执行中显示的输出的最大长度 (只显示末尾部分)
+JOB_OUTPUT_TAIL_CHARS = 4000
+
+def show_execution_result(success, image_path, output_text, code_to_run, left_col, chat_container):
+    """在聊天区域显示代码执行结果 (图表或分析)，生成解释并保存到会话历史"""
+    if not success:
+        st.error(f"Code execution failed: {output_text}")
+        return
+    st.session_state.chart_status = "generated"
+
+    # 处理结果
+    if image_path:
+        # 图表生成情况 - 直接在聊天界面中显示
+        st.session_state.current_image = image_path
+        # 解释请求先在后台发出，与读取和显示图表并行
+        pending_explanation = None
+        if output_text.strip():
+            pending_explanation = start_explanation(
+                "image",
+                output_text,
+                st.session_state.get('current_input', '生成图表'),
+                data_context=st.session_state.get('loaded_context')
+            )
+
+        # 在聊天容器中显示图表
+        with left_col:
+            with chat_container:
+                with st.chat_message("assistant"):
+                    # Display chart
+                    st.markdown("I have generated a visualization as requested:")
+                    display_svg_with_controls(image_path, message_id=f"regen_{uuid.uuid4().hex}")
+
+                    explanation = ""
+
+                    if output_text.strip():
+                        # Analysis in progress
+                        analysis_placeholder = st.empty()
+                        analysis_placeholder.markdown("*Analyzing chart...*")
+
+                        # # 使用streaming模块的函数进行流式分析
+                        from src.ai.streaming import process_image_streaming
+
+
+                        # 流式处理图表分析结果
+                        explanation = process_image_streaming(
+                            output_text,  # 包含print输出的内容
+                            st.session_state.get('current_input', '生成图表'),
+                            data_context=st.session_state.get('loaded_context'),
+                            message_placeholder=analysis_placeholder,
+                            pending_response=pending_explanation
+                        )
+
+                        # --- 检查 explanation 是否有效 ---
+                        if not explanation:
+                            print("[Chart Analysis] process_image_streaming 未返回有效的解释.")
+                            explanation = ""
+                        # --------------------------------
+
+                        # Optional: show raw output
+                        if output_text.strip():
+                            with st.expander("View Raw Output"):
+                                st.code(output_text, language="text")
+
+        # 构建消息结构用于保存到历史记录
+        regenerated_message_content = "I have regenerated the visualization as requested:"
+
+        # --- 修改：动态构建 metadata ---
+        regen_metadata = {
+            "code": code_to_run,
+            "raw_output": output_text
+        }
+        if explanation: # 只有在 explanation 有效时才添加
+            regen_metadata["explanation"] = explanation
+        # ---------------------------
+
+        regen_message = {
+            "role": "assistant",
+            "content_type": "image",
+            "content": {"path": image_path, "text": regenerated_message_content},
+            "metadata": regen_metadata # 使用动态构建的 metadata
+        }
+
+        # 保存到会话状态和数据库
+        if "messages" not in st.session_state: 
+            st.session_state.messages = []
+        st.session_state.messages.append(regen_message)
+        add_message_to_session(
+            session_id=current_session_id, 
+            username=st.session_state.user_info['username'], 
+            role="assistant", 
+            content_type=regen_message["content_type"], 
+            content=regen_message["content"], 
+            metadata=regen_message["metadata"]
+        )
+    else:
+        # 分析结果情况 - 直接在聊天界面流式显示
+        with left_col:
+            with chat_container:
+                with st.chat_message("assistant"):
+                    # Analysis in progress
+                    analysis_placeholder = st.empty()
+                    analysis_placeholder.markdown("*Analysis is generating...*")
+
+                    # 使用streaming模块的函数进行流式分析
+                    from src.ai.streaming import process_analysis_streaming
+
+                    # 流式处理分析结果
+
+                    explanation = process_analysis_streaming(
+                        output_text,
+                        st.session_state.get('current_input', '分析数据'),
+                        data_context=st.session_state.get('loaded_context'),
+                        message_placeholder=analysis_placeholder
+                    )
+
+                    # Show raw output (optional)
+                    with st.expander("View Raw Output"):
+                        st.code(output_text, language="python")
+
+        # 构建消息结构用于保存到历史记录
+        regenerated_message_content = explanation
+        regen_message = {
+            "role": "assistant",
+            "content_type": "text",
+            "content": regenerated_message_content,
+            "metadata": {"code": code_to_run, "raw_output": output_text},
+            "_id": f"analysis_{uuid.uuid4().hex}"
+        }
+
+        # 添加到消息列表并保存到数据库
+        if "messages" not in st.session_state: 
+            st.session_state.messages = []
+        st.session_state.messages.append(regen_message)
+        add_message_to_session(
+            session_id=current_session_id, 
+            username=st.session_state.user_info['username'], 
+            role="assistant", 
+            content_type=regen_message["content_type"], 
+            content=regen_message["content"], 
+            metadata=regen_message["metadata"]
+        )
+
+def finish_initial_chart(success, image_path, output_text, code):
+    """初始图表的执行任务结束后，保存图表消息到会话状态和数据库；失败时显示错误"""
+    if not (success and image_path):
+        st.error(f"Chart generation failed (code execution error): {output_text}")
+        st.session_state.chart_status = "failed"
+        return
+    st.session_state.current_image = image_path
+    st.session_state.chart_status = "generated"
+
+    # --- 修改：先手动添加消息到 state，再存DB ---
+    initial_message_content = "I have generated a visualization based on your data. You can ask for further analysis or modify the visualization via the chat."
+    # 构建消息结构 (与数据库保存的 image 类型一致)
+    initial_message = {
+        "role": "assistant",
+        "content_type": "image", 
+        "content": {"path": image_path, "text": initial_message_content}, # Add text part to content
+        "metadata": {"code": code},
+        "_id": f"initial_{uuid.uuid4().hex}" # Fake ID for immediate display
+    }
+    # Ensure messages list exists
+    if "messages" not in st.session_state or not isinstance(st.session_state.messages, list):
+        st.session_state.messages = []
+    st.session_state.messages.append(initial_message) # Add to state first
+
+    # 再尝试存入数据库
+    if current_session_id:
+        print("[Initial Chart Gen] Attempting to save initial message to DB...") # 添加日志
+        add_success = add_message_to_session(
+            session_id=current_session_id,
+            username=st.session_state.user_info['username'],
+            role="assistant",
+            content_type="image", # Save as image type
+            content={"path": image_path, "text": initial_message_content}, # Save path and text
+            metadata={"code": code}
+        )
+        if add_success:
+            print("[Initial Chart Gen] Initial message saved to DB successfully.")
+        else:
+            print("[Initial Chart Gen] Failed to save initial message to DB.")
+    else:
+        print("[Initial Chart Gen] Error: Cannot save initial message, current_session_id is missing.") # 添加日志
+    # 聊天区域在本次运行中已经显示过，重新运行以显示初始图表消息
+    st.rerun()
+
+@st.fragment(run_every=JOB_POLL_INTERVAL_SECONDS)
+def execution_job_fragment(job_id):
+    """显示未结束的执行任务的状态、实时输出和取消按钮
+
+    作为片段定时重新运行：每次只读取一次任务状态并刷新本片段，不占用脚本线程等待任务；
+    任务结束 (或已不存在) 时重新运行整个页面，由 render_execution_job 显示结果。
+    """
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None or job["status"] in FINISHED_STATES:
+        st.rerun()
+    if job["status"] == JOB_QUEUED:
+        st.markdown(f"*Waiting for an executor... ({job.get('queue_depth', 0)} in queue, {job['queued_seconds']:.0f}s)*")
+    else:
+        st.markdown(f"*Executing code... ({job['running_seconds']:.0f}s)*")
+    if job["output"]:
+        st.code(job["output"][-JOB_OUTPUT_TAIL_CHARS:], language="text")
+    if st.button("Cancel", key=f"cancel_job_{job_id}"):
+        manager.cancel(job_id)
+
+def render_execution_job(job_state, left_col, chat_container):
+    """在聊天区域显示后台执行任务：未结束时显示定时刷新的任务片段，结束后显示结果并清除任务
+
+    Args:
+        job_state (dict): st.session_state.execution_job (job_id, code, session_id；初始图表的任务带有 initial 标记)
+        left_col: 聊天所在的列
+        chat_container: 聊天消息容器
+    """
+    manager = get_job_manager()
+    job = manager.get(job_state["job_id"])
+    if job is None or job_state.get("session_id") != current_session_id:
+        st.session_state.execution_job = None
+        return
+    if job["status"] not in FINISHED_STATES:
+        with left_col:
+            with chat_container:
+                with st.chat_message("assistant"):
+                    execution_job_fragment(job["job_id"])
+        return
+    st.session_state.execution_job = None
+    manager.discard(job["job_id"])
+    success, image_path, output_text = job["result"]
+    if job["status"] == JOB_CANCELLED:
+        if job_state.get("initial"):
+            st.session_state.chart_status = "failed"
+        with left_col:
+            with chat_container:
+                with st.chat_message("assistant"):
+                    st.warning("Code execution was cancelled.")
+                    if output_text.strip():
+                        with st.expander("View Partial Output"):
+                            st.code(output_text, language="text")
+        return
+    if job_state.get("initial"):
+        finish_initial_chart(success, image_path, output_text, job_state["code"])
+        return
+    show_execution_result(success, image_path, output_text, job_state["code"], left_col, chat_container)
+
 # Initialize the flag if it doesn't exist
 if 'code_just_applied' not in st.session_state:
     st.session_state.code_just_applied = False
@@ -418,6 +813,8 @@ if "current_session_name" not in st.session_state and session_details:
 
 # 检查 df 是否已加载 (用于判断是否需要显示加载按钮或数据已加载)
 df_loaded = 'df' in st.session_state and isinstance(st.session_state.df, pd.DataFrame) and not st.session_state.df.empty
+if df_loaded and st.session_state.get('df_cache_key') is not None:
+    get_dataframe_cache().touch(st.session_state.df_cache_key, st.session_state.get('df_cache_holder'))
 
 if has_data_context and not df_loaded:
     # --- 情况1：有历史上下文，但数据尚未加载 --- 
@@ -456,18 +853,52 @@ if has_data_context and not df_loaded:
                     if not os.path.exists(full_path):
                         raise FileNotFoundError(f"Data file not found: {full_path}")
 
-                    if context_type == "csv":
-                        st.session_state.df = pd.read_csv(full_path)
-                    else: # excel
-                        try:
-                            st.session_state.df = pd.read_excel(full_path, engine='openpyxl')
-                        except Exception as e_openpyxl:
-                            print(f"Failed loading Excel with openpyxl: {e_openpyxl}")
+                    def _load_file_context():
+                        if context_details.get("sampled"):
+                            # 分块导入的大文件只加载样本，完整数据由沙箱代码从列式副本读取
+                            sample_df = read_columnar_sample(full_path)
+                            if sample_df is None:
+                                raise Exception("Sample of the large data file is missing. Please re-upload the file.")
+                            return sample_df
+                        columnar_df = read_columnar_copy(full_path)
+                        if columnar_df is not None:
+                            # 优先读取上传时生成的列式副本，跳过CSV/Excel解析
+                            return columnar_df
+                        if context_type == "csv":
+                            # 复用上传时检测到的CSV格式，跳过编码/分隔符嗅探
+                            loaded_df, load_error = load_data_file(full_path, dialect=context_details.get("csv_dialect"))
+                            if load_error:
+                                raise Exception(load_error)
+                        else: # excel
                             try:
-                                st.session_state.df = pd.read_excel(full_path, engine='xlrd') # Try xlrd
-                            except Exception as e_xlrd:
-                                print(f"Failed loading Excel with xlrd: {e_xlrd}")
-                                raise Exception(f"Unable to read Excel file {original_filename}. Please ensure it exists and is valid.")
+                                loaded_df = pd.read_excel(full_path, engine='openpyxl')
+                            except Exception as e_openpyxl:
+                                print(f"Failed loading Excel with openpyxl: {e_openpyxl}")
+                                try:
+                                    loaded_df = pd.read_excel(full_path, engine='xlrd') # Try xlrd
+                                except Exception as e_xlrd:
+                                    print(f"Failed loading Excel with xlrd: {e_xlrd}")
+                                    raise Exception(f"Unable to read Excel file {original_filename}. Please ensure it exists and is valid.")
+                        # 旧会话没有列式副本，补写一份供下次加载和代码执行使用
+                        write_columnar_copy(loaded_df, full_path)
+                        return loaded_df
+
+                    # 通过进程内缓存读取，多个会话打开同一数据集时共享同一份内存
+                    content_hash = context_details.get("content_hash")
+                    if not content_hash:
+                        # 旧会话的上下文没有内容哈希：计算一次并写回，之后的加载不再读取整个文件
+                        content_hash = get_content_hash(full_path)
+                        context_details = {**context_details, "content_hash": content_hash}
+                        st.session_state.loaded_context["data_source_details"] = context_details
+                        update_session_data_context(current_session_id, context_type, context_details)
+                    cache_key = make_file_cache_key(content_hash, sampled=bool(context_details.get("sampled")))
+                    st.session_state.df = bind_shared_dataframe(cache_key, _load_file_context)
+                    st.session_state.content_hash = content_hash
+                    if context_type == "csv":
+                        st.session_state.csv_dialect = context_details.get("csv_dialect") or st.session_state.df.attrs.get("csv_dialect")
+                    if context_details.get("sampled"):
+                        st.session_state.dataset_info = {"row_count": context_details.get("row_count"), "sampled": True}
+                    bind_dataset_profile(content_hash, st.session_state.df, sampled=bool(context_details.get("sampled")))
 
                     # 检查加载后的DataFrame
                     if isinstance(st.session_state.df, pd.DataFrame) and not st.session_state.df.empty:
@@ -516,11 +947,21 @@ if has_data_context and not df_loaded:
                             if conn_error:
                                 raise Exception(f"Connection failed: {conn_error}")
                             
-                            df, data_error = get_mysql_table_data(connection, table_name, limit=1000) # Use limit?
-                            close_mysql_connection(connection) # Close connection after fetching
-                            
-                            if data_error:
-                                raise Exception(f"Failed to fetch data: {data_error}")
+                            def _fetch_table():
+                                fetched_df, data_error = get_mysql_table_data(connection, table_name, limit=1000) # Use limit?
+                                if data_error:
+                                    raise Exception(f"Failed to fetch data: {data_error}")
+                                return fetched_df
+
+                            try:
+                                # 表版本可用时通过进程内缓存读取，其它会话已加载的同一张表不再重复查询
+                                table_version = get_mysql_table_version(connection, table_name)
+                                if table_version:
+                                    df = bind_shared_dataframe(make_mysql_cache_key(conn_info, table_name, 1000, table_version), _fetch_table)
+                                else:
+                                    df = _fetch_table()
+                            finally:
+                                close_mysql_connection(connection) # Close connection after fetching
                             
                             if df is None or df.empty:
                                 raise Exception("Fetched data is empty.")
@@ -568,17 +1009,53 @@ elif not st.session_state.get('file_uploaded'): # Use .get() for safety
                 upload_dir_full = os.path.join(project_root, "src", upload_dir_relative)
                 stored_path_full = os.path.join(upload_dir_full, unique_filename)
                 os.makedirs(upload_dir_full, exist_ok=True)
+                # 分块写入磁盘，避免再复制一份完整的上传内容
+                uploaded_file.seek(0)
                 with open(stored_path_full, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
+                    shutil.copyfileobj(uploaded_file, f, length=8 * 1024 * 1024)
                 print(f"File saved to: {stored_path_full}")
-                if file_type == "CSV":
-                    st.session_state.df = pd.read_csv(stored_path_full)
+                st.session_state.dataset_info = None
+                st.session_state.dataset_profile = None
+                st.session_state.content_hash = get_content_hash(stored_path_full)
+                # 相同内容之前分析过时，导入大文件不再重复生成流式报告
+                stored_profile = get_dataset_profile(st.session_state.content_hash, dataset_profile_version(sampled=True))
+                streaming_profile = None
+                if file_type == "CSV" and uploaded_file.size > LARGE_FILE_THRESHOLD_BYTES:
+                    # 大文件：分块导入列式副本，内存中只保留样本用于预览和提示词
+                    progress_bar = st.progress(0.0, text="Importing large file...")
+                    def _update_ingest_progress(fraction, rows):
+                        progress_bar.progress(fraction, text=f"Importing large file... {rows:,} rows")
+                    sample_df, ingest_info, ingest_error = ingest_csv_to_columnar(stored_path_full, progress_callback=_update_ingest_progress, profile=stored_profile is None)
+                    progress_bar.empty()
+                    if ingest_error:
+                        raise Exception(ingest_error)
+                    st.session_state.df = sample_df
+                    st.session_state.csv_dialect = ingest_info.get("csv_dialect")
+                    st.session_state.dataset_info = {"row_count": ingest_info["row_count"], "sampled": True}
+                    streaming_profile = ingest_info.get("profile")
+                elif file_type == "CSV":
+                    df, load_error = load_data_file(stored_path_full)
+                    if load_error:
+                        raise Exception(load_error)
+                    st.session_state.df = df
+                    st.session_state.csv_dialect = df.attrs.get("csv_dialect")
                 else:
                     try:
                         st.session_state.df = pd.read_excel(stored_path_full, engine='openpyxl')
                     except Exception as e1:
                         print(f"使用openpyxl读取失败: {e1}")
                         st.session_state.df = pd.read_excel(stored_path_full, engine='xlrd')
+                if not st.session_state.dataset_info:
+                    # 写入列式副本，之后的会话加载和沙箱代码都直接读取它
+                    write_columnar_copy(st.session_state.df, stored_path_full)
+                # 登记到进程内缓存；其它会话已加载过相同内容时直接复用那一份
+                uploaded_df = st.session_state.df
+                st.session_state.df = bind_shared_dataframe(
+                    make_file_cache_key(st.session_state.content_hash, sampled=bool(st.session_state.dataset_info)),
+                    lambda: uploaded_df
+                )
+                # 报告基于上传的原始数据 (未压缩)，所有用户共用同一份
+                bind_dataset_profile(st.session_state.content_hash, uploaded_df, sampled=bool(st.session_state.dataset_info), streaming_profile=streaming_profile)
                 file_info_content = {
                     "original_filename": original_filename,
                     "stored_path": stored_path_relative.replace(os.sep, '/'),
@@ -710,6 +1187,7 @@ elif not st.session_state.get('file_uploaded'): # Use .get() for safety
             with st.form("mysql_fetch_form"):
                 password = st.text_input("Enter database password", type="password", key="mysql_fetch_password")
                 limit_rows = st.number_input("Limit rows (0 = unlimited)", min_value=0, value=1000, key="mysql_limit_rows")
+                profile_full_table = st.checkbox("Profile the full table (single streaming pass, approximate)", value=False, key="mysql_profile_full_table")
                 submitted = st.form_submit_button("Fetch data")
 
                 if submitted:
@@ -726,10 +1204,18 @@ elif not st.session_state.get('file_uploaded'): # Use .get() for safety
                                     raise Exception(f"Connection failed: {conn_error}")
                                 
                                 limit = limit_rows if limit_rows > 0 else None
-                                df, data_error = get_mysql_table_data(connection, selected_table, limit=limit) 
-                                
-                                if data_error:
-                                    raise Exception(f"Failed to fetch data: {data_error}")
+                                def _fetch_table():
+                                    fetched_df, data_error = get_mysql_table_data(connection, selected_table, limit=limit)
+                                    if data_error:
+                                        raise Exception(f"Failed to fetch data: {data_error}")
+                                    return fetched_df
+
+                                # 表版本可用时通过进程内缓存读取，其它会话已加载的同一张表不再重复查询
+                                table_version = get_mysql_table_version(connection, selected_table)
+                                if table_version:
+                                    df = bind_shared_dataframe(make_mysql_cache_key(conn_info_safe, selected_table, limit, table_version), _fetch_table)
+                                else:
+                                    df = _fetch_table()
                                 
                                 if df is None or df.empty:
                                     st.warning("Fetched data is empty.")
@@ -739,6 +1225,13 @@ elif not st.session_state.get('file_uploaded'): # Use .get() for safety
                                 else:
                                     st.session_state.df = df
 
+                                # 只加载了部分行时，可以用服务端游标流式分析整张表
+                                st.session_state.dataset_profile = None
+                                st.session_state.inferred_descriptions = None
+                                st.session_state.dataset_profile_task = None
+                                if profile_full_table:
+                                    bind_mysql_table_profile(full_conn_info, conn_info_safe, selected_table, table_version)
+
                                 # --- 成功获取数据后的状态更新 ---
                                 st.session_state.file_uploaded = True # 标记数据已"上传" (概念上)
                                 st.session_state.file_type = "mysql" 
@@ -802,13 +1295,15 @@ elif st.session_state.get('file_uploaded') and not st.session_state.get('descrip
     st.subheader("Please provide a description for each column")
     with st.form("column_descriptions_form"):
         if 'column_descriptions' not in st.session_state: st.session_state.column_descriptions = {}
+        resolve_dataset_profile()
         if 'df' in st.session_state and isinstance(st.session_state.df, pd.DataFrame):
             for col in st.session_state.df.columns:
                 col_type = st.session_state.df[col].dtype
+                inferred_description = (st.session_state.get('inferred_descriptions') or {}).get(str(col))
                 st.session_state.column_descriptions[col] = st.text_area(
                     f"{col} ({col_type})", 
                     st.session_state.column_descriptions.get(col, ""),
-                    placeholder="Enter a description for this column...",
+                    placeholder=f"Suggested: {inferred_description}" if inferred_description else "Enter a description for this column...",
                     key=f"desc_{col}" # Add key
                 )
         else:
@@ -826,6 +1321,12 @@ elif st.session_state.get('file_uploaded') and not st.session_state.get('descrip
                     stored_path = st.session_state.get('file_path')
                     if stored_path:
                         data_source_details = {"stored_path": stored_path, "column_descriptions": descriptions}
+                        if source_type_raw == 'csv' and st.session_state.get('csv_dialect'):
+                            data_source_details["csv_dialect"] = st.session_state.csv_dialect
+                        if st.session_state.get('dataset_info'):
+                            data_source_details.update(st.session_state.dataset_info)
+                        if st.session_state.get('content_hash'):
+                            data_source_details["content_hash"] = st.session_state.content_hash
                     else: raise ValueError("File path not found")
                 elif source_type_raw == 'mysql':
                     data_source_type = 'mysql'
@@ -852,66 +1353,48 @@ elif st.session_state.get('file_uploaded') and st.session_state.get('description
     
     # Initial Chart Generation (if needed) - NO RERUN at the end
     if st.session_state.get('chart_status') == "initial_generation":
+        # 生成代码需要等待模型回复，在当前线程完成；执行代码作为后台任务提交，与 Run Code 按钮相同
         with st.spinner("Generating initial visualization..."):
             # --- 确保传递了 data_source_type --- 
-            code, image_path, result = create_chart(
-                user_id=st.session_state.user_info['username'],
-                session_id=current_session_id,
-                df=st.session_state.df,
+            code, error = generate_chart_code(
                 column_descriptions=st.session_state.column_descriptions,
                 data_source_type=st.session_state.get('file_type'), # Pass the type
-                persistent_file_path=st.session_state.get('file_path') # Pass the path
+                df=st.session_state.df,
+                persistent_file_path=st.session_state.get('file_path'), # Pass the path
+                df_cache_key=st.session_state.get('df_cache_key')
             )
-            # Success if result indicates success and artifacts exist
-            if isinstance(result, str) and result.startswith("Chart generated successfully") and code and image_path:
-                 st.session_state.visualization_code = code
-                 st.session_state.current_image = image_path
-                 st.session_state.chart_status = "generated"
-
-                 # --- 修改：先手动添加消息到 state，再存DB ---
-                 initial_message_content = "I have generated a visualization based on your data. You can ask for further analysis or modify the visualization via the chat."
-                 # 构建消息结构 (与数据库保存的 image 类型一致)
-                 initial_message = {
-                     "role": "assistant",
-                     "content_type": "image", 
-                     "content": {"path": image_path, "text": initial_message_content}, # Add text part to content
-                     "metadata": {"code": code},
-                     "_id": f"initial_{uuid.uuid4().hex}" # Fake ID for immediate display
-                 }
-                 # Ensure messages list exists
-                 if "messages" not in st.session_state or not isinstance(st.session_state.messages, list):
-                     st.session_state.messages = []
-                 st.session_state.messages.append(initial_message) # Add to state first
-
-                 # 再尝试存入数据库
-                 if current_session_id:
-                     print("[Initial Chart Gen] Attempting to save initial message to DB...") # 添加日志
-                     add_success = add_message_to_session(
-                         session_id=current_session_id,
-                         username=st.session_state.user_info['username'],
-                         role="assistant",
-                         content_type="image", # Save as image type
-                         content={"path": image_path, "text": initial_message_content}, # Save path and text
-                         metadata={"code": code}
-                     )
-                     if add_success:
-                         print("[Initial Chart Gen] Initial message saved to DB successfully.")
-                     else:
-                         print("[Initial Chart Gen] Failed to save initial message to DB.")
-                 else:
-                      print("[Initial Chart Gen] Error: Cannot save initial message, current_session_id is missing.") # 添加日志
-            else:
-                st.error(f"Chart generation failed: {result}")
-                st.session_state.chart_status = "failed"
-            
-            print("[Initial Chart Gen] Finished initial generation block.") # 添加日志
+        if error:
+            st.error(f"Chart generation failed: {error}")
+            st.session_state.chart_status = "failed"
+        else:
+            st.session_state.visualization_code = code
+            job_id = get_job_manager().submit(
+                code,
+                user_id=st.session_state.user_info['username'],
+                session_id=current_session_id,
+                data_source_type=st.session_state.get('file_type'),
+                persistent_file_path=st.session_state.get('file_path')
+            )
+            st.session_state.execution_job = {"job_id": job_id, "code": code, "session_id": current_session_id, "initial": True}
+            st.session_state.chart_status = "initial_running"
+        print("[Initial Chart Gen] Finished initial generation block.") # 添加日志
 
     # --- Chat Interface Layout --- 
     left_col, right_col = st.columns([3, 1])
     with st.expander("Data Info", expanded=False):
         st.subheader("Data Preview")
         if 'df' in st.session_state and isinstance(st.session_state.df, pd.DataFrame):
-            st.dataframe(st.session_state.df.head())
+            dataset_info = st.session_state.get('dataset_info')
+            if dataset_info and dataset_info.get("sampled"):
+                st.caption(f"Working with a random sample of {len(st.session_state.df):,} rows out of {dataset_info.get('row_count', 0):,}. Code execution uses the full dataset.")
+            display_dataframe_info(st.session_state.df)
+            resolve_dataset_profile()
+            if st.session_state.get('dataset_profile_task') is not None:
+                st.caption("Dataset profile is being generated...")
+            if st.session_state.get('dataset_profile'):
+                approximate = "误差说明" in st.session_state.dataset_profile
+                st.subheader("Full Dataset Profile (approximate)" if approximate else "Dataset Profile")
+                st.json(st.session_state.dataset_profile, expanded=False)
         else:
             st.warning("Data not loaded or failed to load.")
         st.subheader("Column Descriptions")
@@ -1119,7 +1602,8 @@ elif st.session_state.get('file_uploaded') and st.session_state.get('description
                             user_message=st.session_state.current_input,
                             data_context=data_context,
                             history=chat_history_for_llm,
-                            message_placeholder=message_placeholder
+                            message_placeholder=message_placeholder,
+                            session_id=current_session_id
                         )
                         # --- 新增：在 try 块内部用最终 response 更新占位符 --- 
                         if response:
@@ -1255,6 +1739,9 @@ elif st.session_state.get('file_uploaded') and st.session_state.get('description
             st.info("The adjusted size will apply to all charts.")
             
         with st.expander("Visualization Code", expanded=True):
+            # 正在后台执行的任务：在聊天区域显示状态和实时输出，结束后显示结果
+            if st.session_state.get("execution_job"):
+                render_execution_job(st.session_state.execution_job, left_col, chat_container)
             viz_code = st.session_state.get('visualization_code')
             if viz_code:
                 # 使用时间戳作为唯一key，确保每次rerun时都重新渲染
@@ -1269,172 +1756,45 @@ elif st.session_state.get('file_uploaded') and st.session_state.get('description
                     if st.button("Copy code"):
                         st.toast("Please copy the code above manually.")
                 with col2:
-                    # 修改执行代码按钮的处理逻辑
-                    if st.button(execute_button_text):
-                        # 不再设置should_regenerate并rerun，而是直接执行代码
-                        with st.spinner("Executing code..."):
-                            # 从当前上下文获取数据类型
-                            loaded_context = st.session_state.get('loaded_context')
-                            data_type = None
-                            if loaded_context and loaded_context.get("data_source_type"):
-                                data_type = loaded_context.get("data_source_type")
+                    # 修改执行代码按钮的处理逻辑：提交后台执行任务，页面轮询结果
+                    if st.button(execute_button_text, disabled=bool(st.session_state.get("execution_job"))):
+                        # 从当前上下文获取数据类型
+                        loaded_context = st.session_state.get('loaded_context')
+                        data_type = None
+                        if loaded_context and loaded_context.get("data_source_type"):
+                            data_type = loaded_context.get("data_source_type")
+                        else:
+                            data_type = st.session_state.get('file_type')
+
+                        # 获取路径
+                        persistent_path = None
+                        if data_type in ['csv', 'excel']:
+                            if loaded_context and loaded_context.get("data_source_details") and loaded_context["data_source_details"].get("stored_path"):
+                                persistent_path = loaded_context["data_source_details"]["stored_path"]
                             else:
-                                data_type = st.session_state.get('file_type')
-                            
-                            # 获取路径
-                            persistent_path = None
-                            if data_type in ['csv', 'excel']:
-                                if loaded_context and loaded_context.get("data_source_details") and loaded_context["data_source_details"].get("stored_path"):
-                                    persistent_path = loaded_context["data_source_details"]["stored_path"]
-                                else:
-                                    persistent_path = st.session_state.get('file_path')
-                            
-                            # 获取代码
-                            code_to_run = viz_code
-                            
-                            # 执行代码
-                            if data_type and (data_type not in ['csv', 'excel'] or persistent_path) and code_to_run:
-                                success, image_path, output_text = execute_code(
-                                    code_to_run, 
-                                    user_id=st.session_state.user_info['username'],
-                                    session_id=current_session_id, 
-                                    data_source_type=data_type,
-                                    persistent_file_path=persistent_path
-                                )
-                                
-                                if success:
-                                    st.session_state.chart_status = "generated"
-                                    
-                                    # 处理结果
-                                    if image_path:
-                                        # 图表生成情况 - 直接在聊天界面中显示
-                                        st.session_state.current_image = image_path
-                                        
-                                        # 在聊天容器中显示图表
-                                        with left_col:
-                                            with chat_container:
-                                                with st.chat_message("assistant"):
-                                                    # Display chart
-                                                    st.markdown("I have generated a visualization as requested:")
-                                                    display_svg_with_controls(image_path, message_id=f"regen_{uuid.uuid4().hex}")
-                                                    
-                                                    explanation = ""
-
-                                                    if output_text.strip():
-                                                        # Analysis in progress
-                                                        analysis_placeholder = st.empty()
-                                                        analysis_placeholder.markdown("*Analyzing chart...*")
-                                                        
-                                                        # # 使用streaming模块的函数进行流式分析
-                                                        from src.ai.streaming import process_image_streaming
-                                                        
-                                                                                                            
-                                                        # 流式处理图表分析结果
-                                                        explanation = process_image_streaming(
-                                                            output_text,  # 包含print输出的内容
-                                                            st.session_state.get('current_input', '生成图表'),
-                                                            data_context=st.session_state.get('loaded_context'),
-                                                            message_placeholder=analysis_placeholder
-                                                        )
-                                                        
-                                                        # --- 检查 explanation 是否有效 ---
-                                                        if not explanation:
-                                                            print("[Chart Analysis] process_image_streaming 未返回有效的解释.")
-                                                            explanation = ""
-                                                        # --------------------------------
-                                                        
-                                                        # Optional: show raw output
-                                                        if output_text.strip():
-                                                            with st.expander("View Raw Output"):
-                                                                st.code(output_text, language="text")
-                                            
-                                        # 构建消息结构用于保存到历史记录
-                                        regenerated_message_content = "I have regenerated the visualization as requested:"
-                                        
-                                        # --- 修改：动态构建 metadata ---
-                                        regen_metadata = {
-                                            "code": code_to_run,
-                                            "raw_output": output_text
-                                        }
-                                        if explanation: # 只有在 explanation 有效时才添加
-                                            regen_metadata["explanation"] = explanation
-                                        # ---------------------------
-                                        
-                                        regen_message = {
-                                            "role": "assistant",
-                                            "content_type": "image",
-                                            "content": {"path": image_path, "text": regenerated_message_content},
-                                            "metadata": regen_metadata # 使用动态构建的 metadata
-                                        }
-                                        
-                                        # 保存到会话状态和数据库
-                                        if "messages" not in st.session_state: 
-                                            st.session_state.messages = []
-                                        st.session_state.messages.append(regen_message)
-                                        add_message_to_session(
-                                            session_id=current_session_id, 
-                                            username=st.session_state.user_info['username'], 
-                                            role="assistant", 
-                                            content_type=regen_message["content_type"], 
-                                            content=regen_message["content"], 
-                                            metadata=regen_message["metadata"]
-                                        )
-                                    else:
-                                        # 分析结果情况 - 直接在聊天界面流式显示
-                                        with left_col:
-                                            with chat_container:
-                                                with st.chat_message("assistant"):
-                                                    # Analysis in progress
-                                                    analysis_placeholder = st.empty()
-                                                    analysis_placeholder.markdown("*Analysis is generating...*")
-                                                    
-                                                    # 使用streaming模块的函数进行流式分析
-                                                    from src.ai.streaming import process_analysis_streaming
-                                                    
-                                                    # 流式处理分析结果
-                                                    
-                                                    explanation = process_analysis_streaming(
-                                                        output_text,
-                                                        st.session_state.get('current_input', '分析数据'),
-                                                        data_context=st.session_state.get('loaded_context'),
-                                                        message_placeholder=analysis_placeholder
-                                                    )
-                                                    
-                                                    # Show raw output (optional)
-                                                    with st.expander("View Raw Output"):
-                                                        st.code(output_text, language="python")
-                                        
-                                        # 构建消息结构用于保存到历史记录
-                                        regenerated_message_content = explanation
-                                        regen_message = {
-                                            "role": "assistant",
-                                            "content_type": "text",
-                                            "content": regenerated_message_content,
-                                            "metadata": {"code": code_to_run, "raw_output": output_text},
-                                            "_id": f"analysis_{uuid.uuid4().hex}"
-                                        }
-                                        
-                                        # 添加到消息列表并保存到数据库
-                                        if "messages" not in st.session_state: 
-                                            st.session_state.messages = []
-                                        st.session_state.messages.append(regen_message)
-                                        add_message_to_session(
-                                            session_id=current_session_id, 
-                                            username=st.session_state.user_info['username'], 
-                                            role="assistant", 
-                                            content_type=regen_message["content_type"], 
-                                            content=regen_message["content"], 
-                                            metadata=regen_message["metadata"]
-                                        )
-                                else:
-                                    st.error(f"Code execution failed: {output_text}")
+                                persistent_path = st.session_state.get('file_path')
+
+                        # 获取代码
+                        code_to_run = viz_code
+
+                        # 提交执行任务 (立即返回)
+                        if data_type and (data_type not in ['csv', 'excel'] or persistent_path) and code_to_run:
+                            job_id = get_job_manager().submit(
+                                code_to_run,
+                                user_id=st.session_state.user_info['username'],
+                                session_id=current_session_id,
+                                data_source_type=data_type,
+                                persistent_file_path=persistent_path
+                            )
+                            st.session_state.execution_job = {"job_id": job_id, "code": code_to_run, "session_id": current_session_id}
+                            st.rerun()
+                        else:
+                            if not data_type:
+                                st.error("Error: unable to determine data source type!")
+                            elif data_type in ['csv', 'excel'] and not persistent_path:
+                                st.error("Error: unable to determine data file path!")
                             else:
-                                if not data_type:
-                                    st.error("Error: unable to determine data source type!")
-                                elif data_type in ['csv', 'excel'] and not persistent_path:
-                                    st.error("Error: unable to determine data file path!")
-                                else:
-                                    st.error("No code to execute.")
+                                st.error("No code to execute.")
             else:
                 st.info("No code yet. Please select code from the left chat.")
 
@@ -1450,3 +1810,4 @@ if "default_chart_width" not in st.session_state:  # 默认图表宽度
     st.session_state.default_chart_width = 600
 if "default_chart_height" not in st.session_state:  # 默认图表高度
     st.session_state.default_chart_height = 400
+
@@ -42,7 +42,7 @@ if st.button("➕ Create Session", type="primary", use_container_width=True):
         # 清理可能存在的旧会话状态（可选，但推荐）
         keys_to_reset = ['messages', 'df', 'file_uploaded', 'column_descriptions',
                          'descriptions_provided', 'visualization_code', 'chart_status',
-                         'file_path', 'current_image', 'file_type', 'mysql_step']
+                         'file_path', 'current_image', 'file_type', 'mysql_step', 'csv_dialect', 'dataset_info', 'dataset_profile', 'inferred_descriptions', 'dataset_profile_task', 'execution_job']
         for key in keys_to_reset:
             if key in st.session_state:
                 del st.session_state[key]
@@ -86,7 +86,7 @@ else:
                         st.session_state.current_session_name = session['session_name']
                         keys_to_reset = ['messages', 'df', 'file_uploaded', 'column_descriptions',
                                          'descriptions_provided', 'visualization_code', 'chart_status',
-                                         'file_path', 'current_image', 'file_type', 'mysql_step', 'loaded_context']
+                                         'file_path', 'current_image', 'file_type', 'mysql_step', 'loaded_context', 'csv_dialect', 'dataset_info', 'dataset_profile', 'inferred_descriptions', 'dataset_profile_task', 'execution_job']
                         for key in keys_to_reset:
                             if key in st.session_state:
                                 del st.session_state[key]
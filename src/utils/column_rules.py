@@ -0,0 +1,90 @@
+import os
+import re
+import json
+import functools
+from typing import Dict, Any, List, Optional, Pattern, Tuple
+
+# 部署时可通过该环境变量指定 JSON 规则文件，格式见 load_column_rules
+COLUMN_RULES_PATH = os.environ.get("AUTOVIS_COLUMN_RULES")
+
+# 按顺序匹配列名 (小写后做子串匹配)，第一个命中的规则决定描述
+# datetime_label 存在时，列为时间类型用 datetime_label，否则用 label
+DEFAULT_COLUMN_RULES: List[Dict[str, Any]] = [
+    {"name": "datetime", "label": "可能是时间/日期", "datetime_label": "时间/日期", "keywords": ["date", "time", "year", "month"]},
+    {"name": "id", "label": "ID/标识符", "keywords": ["id"]},
+    {"name": "name", "label": "名称/标题", "keywords": ["name", "title"]},
+    {"name": "amount", "label": "金额/价格", "keywords": ["price", "cost", "amount", "salary", "income", "revenue", "sale", "价格", "金额", "成本"]},
+    {"name": "quantity", "label": "数量/计数", "keywords": ["count", "quantity", "number", "num", "qty", "数量"]},
+    {"name": "ratio", "label": "比率/百分比", "keywords": ["rate", "ratio", "percent", "proportion", "比率", "百分比"]},
+    {"name": "gender", "label": "性别", "keywords": ["gender", "sex", "性别"]},
+    {"name": "age", "label": "年龄", "keywords": ["age", "年龄"]},
+    {"name": "category", "label": "类别/分类", "keywords": ["category", "type", "class", "group", "status", "类别", "类型", "分类"]},
+]
+
+class CompiledRule:
+    """编译后的列名规则：所有关键词合并为一个正则"""
+
+    def __init__(self, name: str, label: str, keywords: List[str], datetime_label: Optional[str] = None):
+        self.name = name
+        self.label = label
+        self.datetime_label = datetime_label
+        self.pattern: Pattern = re.compile("|".join(re.escape(keyword.lower()) for keyword in keywords))
+
+def load_column_rules(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """读取列名规则表
+
+    JSON 文件可以包含:
+        "rules": 完整的规则列表，替换默认规则
+        "extra_keywords": {规则名: [关键词, ...]}，在已有规则上追加关键词 (例如行业术语)
+
+    Args:
+        path: JSON 规则文件路径，默认读取 AUTOVIS_COLUMN_RULES
+
+    Returns:
+        List[Dict]: 规则列表 (读取失败时返回默认规则)
+    """
+    path = path or COLUMN_RULES_PATH
+    rules = [dict(rule, keywords=list(rule["keywords"])) for rule in DEFAULT_COLUMN_RULES]
+    if not path:
+        return rules
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        if config.get("rules"):
+            rules = config["rules"]
+        for name, keywords in (config.get("extra_keywords") or {}).items():
+            for rule in rules:
+                if rule["name"] == name:
+                    rule["keywords"].extend(keywords)
+                    break
+            else:
+                print(f"[Column Rules] 未知规则名 {name}，已忽略")
+        print(f"[Column Rules] 已加载规则文件: {path}")
+    except Exception as e:
+        print(f"[Column Rules] 读取规则文件失败 ({path})，使用默认规则: {e}")
+    return rules
+
+@functools.lru_cache(maxsize=8)
+def get_compiled_rules(path: Optional[str] = None) -> Tuple[CompiledRule, ...]:
+    """读取并编译规则表 (按路径缓存)"""
+    return tuple(
+        CompiledRule(rule["name"], rule["label"], rule["keywords"], rule.get("datetime_label"))
+        for rule in load_column_rules(path)
+        if rule.get("keywords")
+    )
+
+def match_column_rule(column_name: str, rules: Tuple[CompiledRule, ...]) -> Optional[CompiledRule]:
+    """返回第一个匹配列名的规则
+
+    Args:
+        column_name: 列名
+        rules: get_compiled_rules 的返回值
+
+    Returns:
+        CompiledRule | None: 没有规则命中时返回 None
+    """
+    name = str(column_name).lower()
+    for rule in rules:
+        if rule.pattern.search(name):
+            return rule
+    return None
@@ -0,0 +1,298 @@
+import os
+import traceback
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from typing import Optional, Dict, Any, Tuple, Callable, Union
+from src.utils.data_processing import sniff_csv_dialect
+from src.utils.profiling import StreamingProfiler
+
+# 列式副本保存在原文件旁边，例如 user_uploads/<user>/<session>/<uuid>_data.csv.arrow
+COLUMNAR_SUFFIX = ".arrow"
+# 大文件只在内存中保留一份代表性样本，样本单独保存以便会话重新加载
+SAMPLE_SUFFIX = ".sample.arrow"
+
+# 超过该大小的CSV使用分块流式导入 (可通过环境变量调整)
+LARGE_FILE_THRESHOLD_BYTES = int(os.environ.get("AUTOVIS_LARGE_FILE_BYTES", 200 * 1024 * 1024))
+INGEST_CHUNK_ROWS = 100_000
+INGEST_SAMPLE_ROWS = 10_000
+
+def get_columnar_path(source_path: str) -> str:
+    """获取数据文件对应的列式副本路径
+
+    Args:
+        source_path: 原始CSV/Excel文件路径
+
+    Returns:
+        str: 列式副本 (Arrow IPC) 路径
+    """
+    return f"{source_path}{COLUMNAR_SUFFIX}"
+
+def get_sample_path(source_path: str) -> str:
+    """获取大文件样本副本路径
+
+    Args:
+        source_path: 原始文件路径
+
+    Returns:
+        str: 样本副本 (Arrow IPC) 路径
+    """
+    return f"{source_path}{SAMPLE_SUFFIX}"
+
+def has_fresh_columnar_copy(source_path: str) -> bool:
+    """检查列式副本是否存在且不早于原始文件
+
+    Args:
+        source_path: 原始文件路径
+
+    Returns:
+        bool: 副本是否可用
+    """
+    columnar_path = get_columnar_path(source_path)
+    if not os.path.exists(columnar_path):
+        return False
+    if not os.path.exists(source_path):
+        return True
+    return os.path.getmtime(columnar_path) >= os.path.getmtime(source_path)
+
+def write_columnar_copy(df: pd.DataFrame, source_path: str) -> Optional[str]:
+    """把已解析的DataFrame写成带类型的列式副本
+
+    先写临时文件再原子替换，避免读取方看到写了一半的副本。
+
+    Args:
+        df: 已加载的DataFrame
+        source_path: 原始文件路径
+
+    Returns:
+        str | None: 副本路径，写入失败时返回 None (不影响正常使用原文件)
+    """
+    columnar_path = get_columnar_path(source_path)
+    tmp_path = f"{columnar_path}.tmp"
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, columnar_path)
+        print(f"[Columnar Store] 已写入列式副本: {columnar_path}")
+        return columnar_path
+    except Exception as e:
+        print(f"[Columnar Store] 写入列式副本失败 ({source_path}): {e}\n{traceback.format_exc()}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+def read_columnar_copy(source_path: str) -> Optional[pd.DataFrame]:
+    """读取列式副本 (内存映射)
+
+    Args:
+        source_path: 原始文件路径
+
+    Returns:
+        pd.DataFrame | None: 副本不存在、已过期或读取失败时返回 None
+    """
+    if not has_fresh_columnar_copy(source_path):
+        return None
+    try:
+        table = feather.read_table(get_columnar_path(source_path), memory_map=True)
+        return table.to_pandas()
+    except Exception as e:
+        print(f"[Columnar Store] 读取列式副本失败 ({source_path}): {e}")
+        return None
+
+def read_columnar_sample(source_path: str) -> Optional[pd.DataFrame]:
+    """读取流式导入时保存的样本
+
+    Args:
+        source_path: 原始文件路径
+
+    Returns:
+        pd.DataFrame | None: 样本不存在或读取失败时返回 None
+    """
+    sample_path = get_sample_path(source_path)
+    if not os.path.exists(sample_path):
+        return None
+    try:
+        return feather.read_table(sample_path, memory_map=True).to_pandas()
+    except Exception as e:
+        print(f"[Columnar Store] 读取样本失败 ({source_path}): {e}")
+        return None
+
+def _chunk_schema(chunk: pd.DataFrame, overrides: Dict[str, pa.DataType]) -> pa.Schema:
+    """根据第一个分块推断列式副本的schema，文本列统一为 string"""
+    fields = []
+    for field in pa.Schema.from_pandas(chunk, preserve_index=False):
+        if field.name in overrides:
+            field = field.with_type(overrides[field.name])
+        elif chunk[field.name].dtype == object or pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        fields.append(field)
+    return pa.schema(fields)
+
+class _SchemaMismatch(Exception):
+    """后续分块中某列无法转换为第一个分块推断出的类型"""
+
+    def __init__(self, column: str, widened: pa.DataType):
+        super().__init__(column)
+        self.column = column
+        self.widened = widened
+
+def _chunk_to_table(chunk: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """把分块转换为固定schema的Arrow表"""
+    arrays = []
+    for field in schema:
+        values = chunk[field.name]
+        try:
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if pa.types.is_string(field.type):
+                arrays.append(pa.array(values.astype(str).where(values.notna()), type=field.type, from_pandas=True))
+            elif pa.types.is_integer(field.type):
+                raise _SchemaMismatch(field.name, pa.float64())
+            else:
+                raise _SchemaMismatch(field.name, pa.string())
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def ingest_csv_to_columnar(source_path: str,
+                           dialect: Optional[Dict[str, Any]] = None,
+                           chunk_rows: int = INGEST_CHUNK_ROWS,
+                           sample_rows: int = INGEST_SAMPLE_ROWS,
+                           progress_callback: Optional[Callable[[float, int], None]] = None,
+                           profile: bool = False) -> Tuple[Optional[pd.DataFrame], Dict[str, Any], Union[str, None]]:
+    """分块读取大CSV并写入列式副本，内存中只保留均匀随机样本
+
+    每个分块转换后立即写入Arrow IPC文件，内存占用只与分块大小和样本大小有关。
+    如果某列在文件后部出现了更宽的类型 (例如整数列出现小数)，会放宽该列类型后重新导入。
+    profile 为 True 时在同一次遍历中用 StreamingProfiler 生成近似分析报告，保存在导入信息的 "profile" 中。
+
+    Args:
+        source_path: CSV文件路径
+        dialect: CSV格式，为 None 时自动检测
+        chunk_rows: 每个分块的行数
+        sample_rows: 保留在内存中的样本行数
+        progress_callback: 进度回调 (已读取字节比例, 已处理行数)
+        profile: 是否同时生成流式分析报告
+
+    Returns:
+        Tuple[pd.DataFrame, Dict, str]: (样本DataFrame, 导入信息, 错误信息)
+    """
+    if not dialect:
+        dialect = sniff_csv_dialect(source_path)
+    overrides: Dict[str, pa.DataType] = {}
+    while True:
+        try:
+            sample, info = _ingest_once(source_path, dialect, chunk_rows, sample_rows, overrides, progress_callback, profile)
+            info["csv_dialect"] = dict(dialect)
+            return sample, info, None
+        except _SchemaMismatch as mismatch:
+            print(f"[Columnar Store] 列 {mismatch.column} 类型不一致，放宽为 {mismatch.widened} 后重新导入")
+            overrides[mismatch.column] = mismatch.widened
+        except Exception as e:
+            return None, {}, f"分块导入失败: {str(e)}\n{traceback.format_exc()}"
+
+def _ingest_once(source_path, dialect, chunk_rows, sample_rows, overrides, progress_callback, profile):
+    columnar_path = get_columnar_path(source_path)
+    tmp_path = f"{columnar_path}.tmp"
+    total_bytes = max(os.path.getsize(source_path), 1)
+    rng = np.random.default_rng()
+    writer = None
+    schema = None
+    sample = None
+    row_count = 0
+    profiler = StreamingProfiler() if profile else None
+    try:
+        with open(source_path, 'rb') as handle:
+            for chunk in pd.read_csv(handle, chunksize=chunk_rows, **dialect):
+                if dialect.get("header") is None:
+                    chunk.columns = [f"column_{i + 1}" for i in range(chunk.shape[1])]
+                if writer is None:
+                    schema = _chunk_schema(chunk, overrides)
+                    writer = pa.ipc.new_file(tmp_path, schema)
+                writer.write_table(_chunk_to_table(chunk, schema))
+                if profiler is not None:
+                    profiler.update(chunk)
+
+                # bottom-k 抽样：给每行一个随机键，始终保留键最小的 sample_rows 行，等价于全量均匀抽样
+                keyed = chunk.assign(_sample_key=rng.random(len(chunk)), _row_number=np.arange(row_count, row_count + len(chunk)))
+                sample = keyed if sample is None else pd.concat([sample, keyed])
+                if len(sample) > sample_rows:
+                    sample = sample.nsmallest(sample_rows, "_sample_key")
+
+                row_count += len(chunk)
+                if progress_callback:
+                    progress_callback(min(handle.tell() / total_bytes, 1.0), row_count)
+        if writer is None:
+            raise ValueError("文件为空")
+        writer.close()
+        writer = None
+        os.replace(tmp_path, columnar_path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    sample = sample.sort_values("_row_number").drop(columns=["_sample_key", "_row_number"]).reset_index(drop=True)
+    sample_table = _chunk_to_table(sample, schema)
+    feather.write_feather(sample_table, get_sample_path(source_path), compression="uncompressed")
+    # 样本按副本schema还原，保证与沙箱中读取到的完整数据类型一致
+    sample = sample_table.to_pandas()
+    print(f"[Columnar Store] 分块导入完成: {row_count} 行, 样本 {len(sample)} 行 -> {columnar_path}")
+    info = {"row_count": row_count, "sampled": True}
+    if profiler is not None:
+        info["profile"] = profiler.report()
+    return sample, info
+
+def build_columnar_reader_code(data_path: str) -> str:
+    """生成注入沙箱的代码片段，让 pd.read_csv/pd.read_excel 读取数据文件时透明地改读列式副本
+
+    只拦截读取当前数据文件、且参数不影响结果的调用；其它调用仍走原函数。
+
+    Args:
+        data_path: 沙箱代码中使用的数据文件路径 (相对于执行目录)
+
+    Returns:
+        str: Python 代码片段
+    """
+    return f"""
+# 透明读取列式副本，避免重复解析原始文件
+import os as _cs_os
+import pandas as _cs_pd
+
+def _cs_install_columnar_reader(data_path, columnar_path):
+    ignorable = {{"encoding", "encoding_errors", "sep", "delimiter", "engine", "low_memory"}}
+
+    def use_copy(path, args, kwargs):
+        if args or not isinstance(path, str):
+            return False
+        if _cs_os.path.normpath(path) != _cs_os.path.normpath(data_path):
+            return False
+        if not _cs_os.path.exists(columnar_path):
+            return False
+        if _cs_os.path.exists(data_path) and _cs_os.path.getmtime(columnar_path) < _cs_os.path.getmtime(data_path):
+            return False
+        if kwargs.get("sheet_name", 0) != 0:
+            return False
+        usecols = kwargs.get("usecols")
+        if usecols is not None and not all(isinstance(c, str) for c in usecols):
+            return False
+        return set(kwargs) <= ignorable | {{"usecols", "nrows", "sheet_name"}}
+
+    def wrap(original):
+        def reader(path, *args, **kwargs):
+            if not use_copy(path, args, kwargs):
+                return original(path, *args, **kwargs)
+            import pyarrow.feather as _cs_feather
+            usecols = kwargs.get("usecols")
+            table = _cs_feather.read_table(columnar_path, columns=list(usecols) if usecols is not None else None, memory_map=True)
+            nrows = kwargs.get("nrows")
+            if nrows is not None:
+                table = table.slice(0, nrows)
+            return table.to_pandas()
+        return reader
+
+    _cs_pd.read_csv = wrap(_cs_pd.read_csv)
+    _cs_pd.read_excel = wrap(_cs_pd.read_excel)
+
+_cs_install_columnar_reader({data_path!r}, {get_columnar_path(data_path)!r})
+"""
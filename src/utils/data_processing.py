@@ -1,15 +1,103 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Tuple, List, Any, Union
+from typing import Dict, Tuple, List, Any, Union, Optional, Iterator
 import os
+import csv
+import codecs
 import traceback
+import warnings
+import pyarrow as pa
+import pyarrow.compute as pc
+from src.utils.profiling import profile_dataframe
+from src.utils.column_rules import get_compiled_rules, match_column_rule, COLUMN_RULES_PATH
 
-def load_data_file(file_path: str) -> Tuple[pd.DataFrame, Union[str, None]]:
+# 编码/分隔符嗅探只读取文件开头的有限字节
+SNIFF_SAMPLE_BYTES = 64 * 1024
+SNIFF_ENCODINGS = ['utf-8', 'gbk', 'latin1']
+SNIFF_DELIMITERS = [',', '\t', ';', '|']
+# 自动推断列描述时，需要扫描数据的检查 (唯一值数量、文本长度) 最多使用的行数
+DESCRIPTION_SAMPLE_ROWS = 1_000
+
+def _decode_sample(raw: bytes) -> Tuple[str, str]:
+    """用候选编码解码字节前缀
+
+    前缀可能在多字节字符中间被截断，因此只在末尾几个字节处出错时仍视为解码成功。
+
+    Args:
+        raw: 文件开头的字节
+
+    Returns:
+        Tuple[str, str]: (编码, 解码后的文本)
+    """
+    if raw.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig', raw[len(codecs.BOM_UTF8):].decode('utf-8', errors='ignore')
+
+    for encoding in SNIFF_ENCODINGS:
+        try:
+            return encoding, raw.decode(encoding)
+        except UnicodeDecodeError as e:
+            if e.start >= len(raw) - 4:
+                return encoding, raw[:e.start].decode(encoding)
+    return 'latin1', raw.decode('latin1')
+
+def _looks_numeric(value: str) -> bool:
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+def sniff_csv_dialect(file_path: str, sample_bytes: int = SNIFF_SAMPLE_BYTES) -> Dict[str, Any]:
+    """只读取文件开头的有限字节，检测CSV的编码、分隔符、引号和表头
+
+    Args:
+        file_path: 文件路径
+        sample_bytes: 最多读取的字节数
+
+    Returns:
+        Dict: 可直接传给 pd.read_csv 的参数 (encoding, sep, quotechar, header)
+    """
+    with open(file_path, 'rb') as f:
+        raw = f.read(sample_bytes)
+
+    encoding, text = _decode_sample(raw)
+    # 丢弃可能被截断的最后一行
+    if len(raw) >= sample_bytes and '\n' in text:
+        text = text[:text.rfind('\n')]
+
+    dialect = {"encoding": encoding, "sep": ",", "quotechar": '"', "header": 0}
+    if not text.strip():
+        return dialect
+
+    try:
+        sniffed = csv.Sniffer().sniff(text, delimiters=''.join(SNIFF_DELIMITERS))
+        dialect["sep"] = sniffed.delimiter
+        dialect["quotechar"] = sniffed.quotechar or '"'
+    except csv.Error:
+        # Sniffer 无法判断时，选择在首行中出现次数最多的候选分隔符
+        first_line = text.splitlines()[0]
+        counts = {sep: first_line.count(sep) for sep in SNIFF_DELIMITERS}
+        best = max(counts, key=counts.get)
+        if counts[best] > 0:
+            dialect["sep"] = best
+
+    # 只有首行全部是数值时才认为没有表头，避免把纯文本表头误判为数据
+    first_row = next(csv.reader([text.splitlines()[0]], delimiter=dialect["sep"], quotechar=dialect["quotechar"]), [])
+    if first_row and all(_looks_numeric(field.strip()) for field in first_row):
+        dialect["header"] = None
+
+    return dialect
+
+def load_data_file(file_path: str, dialect: Optional[Dict[str, Any]] = None) -> Tuple[pd.DataFrame, Union[str, None]]:
     """加载数据文件
-    
+
+    CSV文件先通过 sniff_csv_dialect 检测格式，再只做一次完整解析。检测结果保存在
+    df.attrs["csv_dialect"] 中，调用方可将其持久化，下次加载时通过 dialect 参数传入以跳过检测。
+
     Args:
         file_path: 文件路径
-        
+        dialect: 已知的CSV格式 (sniff_csv_dialect 的返回值)，为 None 时自动检测
+
     Returns:
         Tuple[pd.DataFrame, str]: (DataFrame, 错误信息)
     """
@@ -17,22 +105,17 @@ def load_data_file(file_path: str) -> Tuple[pd.DataFrame, Union[str, None]]:
         file_ext = os.path.splitext(file_path)[1].lower()
         
         if file_ext == '.csv':
-            # 尝试不同的编码和分隔符
-            encodings = ['utf-8', 'gbk', 'latin1']
-            separators = [',', '\t', ';']
-            
-            for encoding in encodings:
-                for sep in separators:
-                    try:
-                        df = pd.read_csv(file_path, encoding=encoding, sep=sep)
-                        # 如果读取成功且列数大于1，则返回
-                        if df.shape[1] > 1:
-                            return df, None
-                    except Exception:
-                        continue
-            
-            # 如果上面的组合都失败了，尝试最基本的读取
-            df = pd.read_csv(file_path)
+            if not dialect:
+                dialect = sniff_csv_dialect(file_path)
+            try:
+                df = pd.read_csv(file_path, **dialect)
+            except UnicodeDecodeError:
+                # 前缀之后出现了无法解码的字节，保留检测到的格式，替换非法字符
+                df = pd.read_csv(file_path, encoding_errors='replace', **dialect)
+            if dialect.get("header") is None:
+                # 无表头时生成字符串列名，保证后续列描述等逻辑可用
+                df.columns = [f"column_{i + 1}" for i in range(df.shape[1])]
+            df.attrs["csv_dialect"] = dict(dialect)
             return df, None
             
         elif file_ext in ['.xlsx', '.xls']:
@@ -44,95 +127,174 @@ def load_data_file(file_path: str) -> Tuple[pd.DataFrame, Union[str, None]]:
         error_info = f"加载文件失败: {str(e)}\n{traceback.format_exc()}"
         return None, error_info
 
-def infer_column_descriptions(df: pd.DataFrame) -> Dict[str, str]:
+def iter_csv_chunks(file_path: str, dialect: Optional[Dict[str, Any]] = None, chunk_rows: int = 100_000) -> Iterator[pd.DataFrame]:
+    """按固定行数分块读取CSV，用于无法一次载入内存的大文件
+
+    Args:
+        file_path: 文件路径
+        dialect: 已知的CSV格式，为 None 时自动检测
+        chunk_rows: 每个分块的行数
+
+    Yields:
+        pd.DataFrame: 数据分块 (无表头时列名为 column_N)
+    """
+    if not dialect:
+        dialect = sniff_csv_dialect(file_path)
+    for chunk in pd.read_csv(file_path, chunksize=chunk_rows, encoding_errors='replace', **dialect):
+        if dialect.get("header") is None:
+            chunk.columns = [f"column_{i + 1}" for i in range(chunk.shape[1])]
+        yield chunk
+
+def _bounded_sample(df: pd.DataFrame, max_rows: int) -> pd.DataFrame:
+    """等间隔抽取至多 max_rows 行，用于只需要近似结果的类型检查"""
+    if len(df) <= max_rows:
+        return df
+    return df.iloc[::-(-len(df) // max_rows)]
+
+def _numeric_nunique(block: np.ndarray) -> np.ndarray:
+    """对二维数值块按列计算唯一值数量 (不含缺失值)，一次排序完成"""
+    ordered = np.sort(block, axis=0)  # NaN 排在最后
+    valid = ~np.isnan(ordered)
+    changes = (ordered[1:] != ordered[:-1]) & valid[1:]
+    return valid[:1].sum(axis=0) + changes.sum(axis=0)
+
+def _text_mean_lengths(sample: pd.DataFrame, positions: List[int]) -> Dict[int, float]:
+    """用 Arrow 向量化计算多个文本列的平均长度 (与 Series.str.len().mean() 一致)
+
+    列中含有非字符串值时 Arrow 无法转换，返回空结果，由调用方逐列计算。
+    """
+    if not positions or sample.shape[0] == 0:
+        return {}
+    try:
+        values = sample.iloc[:, positions].to_numpy(dtype=object).ravel(order='F')
+        lengths = pc.utf8_length(pa.array(values, type=pa.string(), from_pandas=True))
+        lengths = lengths.to_numpy(zero_copy_only=False).astype(np.float64).reshape((sample.shape[0], len(positions)), order='F')
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return {}
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # 全为缺失值的列平均长度为 NaN，与 pandas 一致
+        means = np.nanmean(lengths, axis=0)
+    return dict(zip(positions, means))
+
+def infer_column_descriptions(df: pd.DataFrame, rules_path: Optional[str] = None) -> Dict[str, str]:
     """基于数据自动推断列描述
     
+    先按编译好的列名规则表匹配 (见 src.utils.column_rules，可按部署配置)，
+    没有规则命中时再根据数据类型判断，需要扫描数据的检查只在至多 DESCRIPTION_SAMPLE_ROWS 行的样本上进行。
+
     Args:
         df: 待分析的DataFrame
+        rules_path: JSON 规则文件路径，默认读取 AUTOVIS_COLUMN_RULES
         
     Returns:
         Dict[str, str]: 列名到描述的映射
     """
+    rules = get_compiled_rules(rules_path or COLUMN_RULES_PATH)
+    row_count = df.shape[0]
     descriptions = {}
+    sample = _bounded_sample(df, DESCRIPTION_SAMPLE_ROWS)
+
+    dtypes = list(df.dtypes)
+    matched = [match_column_rule(col, rules) for col in df.columns]
+
+    # 没有规则命中的浮点/整数列一次性计算样本的唯一值数量
+    numeric_positions = [i for i, rule in enumerate(matched)
+                         if rule is None and (pd.api.types.is_float_dtype(dtypes[i]) or pd.api.types.is_integer_dtype(dtypes[i]))]
+    numeric_nunique = {}
+    if numeric_positions and row_count > 20:
+        block = sample.iloc[:, numeric_positions].to_numpy(dtype=np.float64)
+        numeric_nunique = dict(zip(numeric_positions, _numeric_nunique(block)))
     
-    for col in df.columns:
-        # 获取列的数据类型
-        col_type = df[col].dtype
-        
-        # 获取基本数据样本
-        if df.shape[0] > 0:
-            sample = df[col].iloc[0]
-            sample_type = type(sample).__name__
-        else:
-            sample = None
-            sample_type = "未知"
-        
-        # 推断列的用途
-        col_lower = col.lower()
-        description = ""
-        
-        # 时间相关列
-        if 'date' in col_lower or 'time' in col_lower or 'year' in col_lower or 'month' in col_lower:
-            if pd.api.types.is_datetime64_any_dtype(col_type):
-                description = "时间/日期"
+    # 没有规则命中的文本列一次性计算样本的平均长度
+    text_positions = [i for i, rule in enumerate(matched)
+                      if rule is None and not pd.api.types.is_numeric_dtype(dtypes[i]) and pd.api.types.is_string_dtype(dtypes[i])]
+    text_mean_length = _text_mean_lengths(sample, text_positions)
+    
+    for position, col in enumerate(df.columns):
+        col_type = dtypes[position]
+        rule = matched[position]
+        if rule is not None:
+            if rule.datetime_label and pd.api.types.is_datetime64_any_dtype(col_type):
+                description = rule.datetime_label
             else:
-                description = "可能是时间/日期"
-        
-        # ID列
-        elif 'id' in col_lower or col_lower.endswith('_id'):
-            description = "ID/标识符"
-        
-        # 名称列
-        elif 'name' in col_lower or 'title' in col_lower:
-            description = "名称/标题"
-        
-        # 金额/价格列
-        elif any(kw in col_lower for kw in ['price', 'cost', 'amount', 'salary', 'income', 'revenue', 'sale', '价格', '金额', '成本']):
-            description = "金额/价格"
-        
-        # 数量列
-        elif any(kw in col_lower for kw in ['count', 'quantity', 'number', 'num', 'qty', '数量']):
-            description = "数量/计数"
-        
-        # 百分比/比率列
-        elif any(kw in col_lower for kw in ['rate', 'ratio', 'percent', 'proportion', '比率', '百分比']):
-            description = "比率/百分比"
-        
-        # 性别列
-        elif 'gender' in col_lower or 'sex' in col_lower or '性别' in col_lower:
-            description = "性别"
-        
-        # 年龄列
-        elif 'age' in col_lower or '年龄' in col_lower:
-            description = "年龄"
-        
-        # 类别/分类列
-        elif any(kw in col_lower for kw in ['category', 'type', 'class', 'group', 'status', '类别', '类型', '分类']):
-            description = "类别/分类"
-        
+                description = rule.label
         # 基于数据类型的默认描述
-        else:
-            if pd.api.types.is_numeric_dtype(col_type):
-                # 检查是否可能是分类数据
-                if df[col].nunique() < 10 and df.shape[0] > 20:
-                    description = "可能是分类数值"
-                else:
-                    description = "数值"
-            elif pd.api.types.is_string_dtype(col_type):
-                # 检查文本长度
-                if df[col].str.len().mean() > 100:
-                    description = "长文本"
-                else:
-                    description = "文本"
-            elif pd.api.types.is_bool_dtype(col_type):
-                description = "布尔值/标志"
+        elif pd.api.types.is_numeric_dtype(col_type):
+            # 检查是否可能是分类数据
+            unique_count = numeric_nunique[position] if position in numeric_nunique else sample.iloc[:, position].nunique()
+            if row_count > 20 and unique_count < 10:
+                description = "可能是分类数值"
+            else:
+                description = "数值"
+        elif pd.api.types.is_string_dtype(col_type):
+            # 检查文本长度
+            mean_length = text_mean_length[position] if position in text_mean_length else sample.iloc[:, position].str.len().mean()
+            if mean_length > 100:
+                description = "长文本"
             else:
-                description = f"{col_type}"
+                description = "文本"
+        elif pd.api.types.is_bool_dtype(col_type):
+            description = "布尔值/标志"
+        else:
+            description = f"{col_type}"
         
         descriptions[col] = description
     
     return descriptions
 
+def compact_dataframe(df: pd.DataFrame, category_max_ratio: float = 0.5) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """压缩DataFrame的内存占用 (可选步骤)
+
+    - 整数列向下转换为能容纳取值范围的最小整数类型
+    - 浮点列仅在转换为 float32 不损失精度时才转换
+    - 唯一值占比不超过 category_max_ratio 的文本列转换为 category
+    - 其余文本列转换为 Arrow 字符串类型
+
+    Args:
+        df: 待压缩的DataFrame (不会被修改)
+        category_max_ratio: 文本列转换为 category 的唯一值占比上限
+
+    Returns:
+        Tuple[pd.DataFrame, Dict]: (压缩后的DataFrame, 内存报告)
+    """
+    before_bytes = int(df.memory_usage(deep=True).sum())
+    compacted = {}
+    changes = {}
+    row_count = df.shape[0]
+
+    for col in df.columns:
+        series = df[col]
+        new_series = series
+        if pd.api.types.is_bool_dtype(series.dtype):
+            pass
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            new_series = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series.dtype) and series.dtype != np.float32:
+            as_float32 = series.astype(np.float32)
+            if as_float32.astype(series.dtype).equals(series):
+                new_series = as_float32
+        elif series.dtype == object and row_count > 0:
+            if pd.api.types.infer_dtype(series, skipna=True) == 'string':
+                if series.nunique(dropna=True) / row_count <= category_max_ratio:
+                    new_series = series.astype('category')
+                else:
+                    new_series = series.astype('string[pyarrow]')
+        if new_series.dtype != series.dtype:
+            changes[col] = f"{series.dtype} → {new_series.dtype}"
+        compacted[col] = new_series
+
+    result = pd.DataFrame(compacted, index=df.index)
+    result.attrs = dict(df.attrs)
+    after_bytes = int(result.memory_usage(deep=True).sum())
+    report = {
+        "压缩前": f"{before_bytes / 1024**2:.2f} MB",
+        "压缩后": f"{after_bytes / 1024**2:.2f} MB",
+        "压缩比": f"{before_bytes / after_bytes:.1f}x" if after_bytes else "-",
+        "列类型变化": changes
+    }
+    result.attrs["memory_report"] = report
+    return result, report
+
 def process_data(df: pd.DataFrame) -> Dict[str, Any]:
     """处理数据并生成基本分析报告
     
@@ -142,50 +304,4 @@ def process_data(df: pd.DataFrame) -> Dict[str, Any]:
     Returns:
         Dict: 数据分析报告
     """
-    report = {}
-    
-    # 基本信息
-    report["行数"] = df.shape[0]
-    report["列数"] = df.shape[1]
-    report["内存使用"] = f"{df.memory_usage(deep=True).sum() / 1024**2:.2f} MB"
-    
-    # 缺失值信息
-    missing_values = df.isna().sum()
-    report["缺失值"] = {}
-    for col in df.columns:
-        if missing_values[col] > 0:
-            report["缺失值"][col] = f"{missing_values[col]} ({missing_values[col]/df.shape[0]:.1%})"
-    
-    # 数值列统计
-    numeric_cols = df.select_dtypes(include=['number']).columns
-    report["数值列统计"] = {}
-    for col in numeric_cols:
-        report["数值列统计"][col] = {
-            "最小值": float(df[col].min()) if not pd.isna(df[col].min()) else None,
-            "最大值": float(df[col].max()) if not pd.isna(df[col].max()) else None,
-            "平均值": float(df[col].mean()) if not pd.isna(df[col].mean()) else None,
-            "中位数": float(df[col].median()) if not pd.isna(df[col].median()) else None,
-            "标准差": float(df[col].std()) if not pd.isna(df[col].std()) else None
-        }
-    
-    # 分类列统计
-    categorical_cols = df.select_dtypes(include=['object', 'category']).columns
-    report["分类列统计"] = {}
-    for col in categorical_cols:
-        if df[col].nunique() < 20:  # 只处理基数不太高的分类列
-            value_counts = df[col].value_counts().to_dict()
-            # 将计数转换为字符串表示
-            formatted_counts = {str(k): f"{v} ({v/df.shape[0]:.1%})" for k, v in value_counts.items()}
-            report["分类列统计"][col] = formatted_counts
-    
-    # 时间列分析
-    date_cols = df.select_dtypes(include=['datetime']).columns
-    report["时间列分析"] = {}
-    for col in date_cols:
-        report["时间列分析"][col] = {
-            "最早": str(df[col].min()) if not pd.isna(df[col].min()) else None,
-            "最晚": str(df[col].max()) if not pd.isna(df[col].max()) else None,
-            "时间跨度(天)": (df[col].max() - df[col].min()).days if not pd.isna(df[col].min()) and not pd.isna(df[col].max()) else None
-        }
-    
-    return report 
\ No newline at end of file
+    return profile_dataframe(df)
@@ -0,0 +1,200 @@
+import os
+import time
+import threading
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# 进程内共享的DataFrame缓存预算 (字节)，可通过环境变量调整
+DEFAULT_CACHE_BUDGET_BYTES = int(os.environ.get("AUTOVIS_DF_CACHE_BYTES", 2 * 1024 ** 3))
+# 持有者超过该时间没有访问，视为已离开 (浏览器关闭时不会主动释放引用)
+HOLDER_IDLE_SECONDS = int(os.environ.get("AUTOVIS_DF_CACHE_IDLE_SECONDS", 3600))
+
+class _CacheEntry:
+    def __init__(self, df: pd.DataFrame, nbytes: int):
+        self.df = df
+        self.nbytes = nbytes
+        self.holders: Dict[str, float] = {}  # 持有者ID -> 最后访问时间
+
+    def active_holders(self, now: float) -> int:
+        return sum(1 for last_seen in self.holders.values() if now - last_seen < HOLDER_IDLE_SECONDS)
+
+class DataFrameCache:
+    """进程内共享、带引用计数的DataFrame缓存
+
+    同一数据集 (相同的文件内容或MySQL表 + 表版本) 在所有浏览器会话之间只保留一份。
+    超出字节预算时按LRU顺序淘汰没有活跃持有者的条目。缓存中的DataFrame是共享对象，调用方不能原地修改。
+
+    淘汰只是建议性的：缓存只去掉自己的引用，各会话的 st.session_state.df 仍然引用同一个对象，
+    要等这些会话切换数据集或被 Streamlit 回收后内存才真正释放。字节预算因此限制的是缓存新增的共享数据，
+    而不是进程内DataFrame的总内存。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BUDGET_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[Hashable, threading.Lock] = {}
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        """读取缓存条目 (不增加引用)
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            pd.DataFrame | None: 未命中时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.df
+
+    def acquire(self, key: Hashable, holder: str, loader: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """获取数据集并登记持有者，未命中时调用 loader 加载
+
+        同一个键的并发加载只会执行一次 loader，其它调用方等待并复用结果。
+
+        Args:
+            key: 缓存键
+            holder: 持有者ID (例如 用户名:会话ID)
+            loader: 加载函数，返回DataFrame，失败时抛出异常
+
+        Returns:
+            pd.DataFrame: 共享的DataFrame
+        """
+        with self._lock:
+            load_lock = self._loading.setdefault(key, threading.Lock())
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    entry.holders[holder] = time.time()
+                    return entry.df
+                self.misses += 1
+            try:
+                df = loader()
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+            return self._insert(key, df, holder)
+
+    def put(self, key: Hashable, holder: str, df: pd.DataFrame) -> pd.DataFrame:
+        """登记调用方已经加载好的数据集
+
+        如果缓存中已有相同的数据集，返回已有的共享对象，调用方应丢弃自己的副本。
+
+        Args:
+            key: 缓存键
+            holder: 持有者ID
+            df: 已加载的DataFrame
+
+        Returns:
+            pd.DataFrame: 共享的DataFrame
+        """
+        return self.acquire(key, holder, lambda: df)
+
+    def touch(self, key: Hashable, holder: str) -> None:
+        """刷新持有者的最后访问时间"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.holders[holder] = time.time()
+
+    def release(self, key: Hashable, holder: str) -> None:
+        """释放持有者对数据集的引用，之后该条目可以被淘汰"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.holders.pop(holder, None)
+                self._evict_if_needed()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存命中率、占用等指标"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _insert(self, key: Hashable, df: pd.DataFrame, holder: str) -> pd.DataFrame:
+        nbytes = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _CacheEntry(df, nbytes)
+                self._entries[key] = entry
+                self._total_bytes += nbytes
+            self._entries.move_to_end(key)
+            entry.holders[holder] = time.time()
+            self._evict_if_needed()
+            return entry.df
+
+    def _evict_if_needed(self) -> None:
+        # 调用方需持有 self._lock
+        if self._total_bytes <= self.max_bytes:
+            return
+        now = time.time()
+        for key in list(self._entries.keys()):
+            if self._total_bytes <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.active_holders(now) > 0:
+                continue
+            del self._entries[key]
+            self._total_bytes -= entry.nbytes
+            self.evictions += 1
+            print(f"[DataFrame Cache] 淘汰 {key} ({entry.nbytes / 1024**2:.1f} MB)")
+
+_cache_instance: Optional[DataFrameCache] = None
+_cache_instance_lock = threading.Lock()
+
+def get_dataframe_cache() -> DataFrameCache:
+    """获取进程内唯一的DataFrame缓存"""
+    global _cache_instance
+    with _cache_instance_lock:
+        if _cache_instance is None:
+            _cache_instance = DataFrameCache()
+        return _cache_instance
+
+def make_file_cache_key(content_hash: str, sampled: bool = False) -> tuple:
+    """构造文件数据源的缓存键 (只取决于文件内容，同一文件重复上传时共享同一份数据)
+
+    Args:
+        content_hash: 文件内容哈希
+        sampled: 是否为大文件的样本
+
+    Returns:
+        tuple: 缓存键
+    """
+    return ("file", content_hash, "sample" if sampled else "full")
+
+def make_mysql_cache_key(conn_info: Dict[str, Any], table_name: str, limit: Optional[int], table_version: str) -> tuple:
+    """构造MySQL数据源的缓存键 (不包含密码)
+
+    Args:
+        conn_info: 连接信息
+        table_name: 表名
+        limit: 行数限制
+        table_version: 表版本 (见 get_mysql_table_version)
+
+    Returns:
+        tuple: 缓存键
+    """
+    return ("mysql", conn_info.get("host"), conn_info.get("port"), conn_info.get("database"), table_name, limit, table_version)
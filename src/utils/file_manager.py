@@ -1,6 +1,7 @@
 import os
 import shutil
 import uuid
+import hashlib
 import pandas as pd
 from datetime import datetime
 from typing import Dict, Tuple, List, Any, Union, Optional
@@ -18,6 +19,41 @@ def ensure_dir_exists(directory: str) -> None:
     if not os.path.exists(directory):
         os.makedirs(directory)
 
+def compute_content_hash(file_path: str, block_size: int = 8 * 1024 * 1024) -> str:
+    """计算文件内容哈希，用于识别相同的数据集
+
+    Args:
+        file_path: 文件路径
+        block_size: 每次读取的字节数
+
+    Returns:
+        str: 十六进制哈希值
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+_content_hash_memo: Dict[Tuple[str, int, int], str] = {}
+
+def get_content_hash(file_path: str) -> str:
+    """获取文件内容哈希，按 (路径, 修改时间, 大小) 记住结果，文件未变化时不再重新读取
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        str: 十六进制哈希值
+    """
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    content_hash = _content_hash_memo.get(memo_key)
+    if content_hash is None:
+        content_hash = compute_content_hash(file_path)
+        _content_hash_memo[memo_key] = content_hash
+    return content_hash
+
 def get_user_data_dir(user_id: str) -> str:
     """获取用户数据目录
     
@@ -205,21 +241,22 @@ def cleanup_temp_files(max_age_days: int = 7) -> None:
     Args:
         max_age_days: 文件最大保留天数
     """
-    # 清理 src/codeexe 目录中的临时文件
+    # 清理 src/codeexe 目录 (包括各会话的临时工作目录 sessions/<用户>/<会话>) 中的临时文件
     codeexe_dir = os.path.join(SRC_ROOT, "codeexe")
     if os.path.exists(codeexe_dir):
         now = datetime.now()
-        for file_name in os.listdir(codeexe_dir):
-            file_path = os.path.join(codeexe_dir, file_name)
-            if os.path.isfile(file_path):
-                # 获取文件修改时间
-                file_mod_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                # 计算文件年龄（天）
-                age_days = (now - file_mod_time).days
-                # 如果文件年龄超过最大保留天数，删除文件
-                if age_days > max_age_days:
-                    try:
-                        os.remove(file_path)
-                        print(f"已删除临时文件: {file_path}")
-                    except Exception as e:
-                        print(f"删除文件 {file_path} 失败: {str(e)}") 
\ No newline at end of file
+        for dir_path, _, file_names in os.walk(codeexe_dir):
+            for file_name in file_names:
+                file_path = os.path.join(dir_path, file_name)
+                if os.path.isfile(file_path):
+                    # 获取文件修改时间
+                    file_mod_time = datetime.fromtimestamp(os.path.getmtime(file_path))
+                    # 计算文件年龄（天）
+                    age_days = (now - file_mod_time).days
+                    # 如果文件年龄超过最大保留天数，删除文件
+                    if age_days > max_age_days:
+                        try:
+                            os.remove(file_path)
+                            print(f"已删除临时文件: {file_path}")
+                        except Exception as e:
+                            print(f"删除文件 {file_path} 失败: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,148 @@
+import os
+import math
+import atexit
+import threading
+import multiprocessing
+import pandas as pd
+import pyarrow as pa
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Optional, Tuple
+from src.utils.profiling import profile_dataframe, profile_columns, format_memory_usage
+from src.utils.data_processing import infer_column_descriptions
+
+# 并行分析的进程数，默认使用全部CPU
+PARALLEL_PROFILE_WORKERS = int(os.environ.get("AUTOVIS_PROFILE_WORKERS", os.cpu_count() or 1))
+# 单元格数 (行数 x 列数) 低于该值时串行分析，进程间传输数据的开销大于并行收益
+PARALLEL_PROFILE_MIN_CELLS = int(os.environ.get("AUTOVIS_PARALLEL_PROFILE_MIN_CELLS", 20_000_000))
+# 每个进程至少分到的列数
+PARALLEL_PROFILE_MIN_COLUMNS_PER_WORKER = 8
+
+REPORT_SECTIONS = ["缺失值", "数值列统计", "分类列统计", "时间列分析"]
+
+_executor: Optional[ProcessPoolExecutor] = None
+# 当前进程池的进程数
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+def _get_executor(max_workers: int) -> ProcessPoolExecutor:
+    """获取常驻进程池 (spawn 方式启动，Streamlit 进程是多线程的，不能安全地 fork)"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != max_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+            _executor_workers = max_workers
+        return _executor
+
+_task_executor: Optional[ThreadPoolExecutor] = None
+
+def submit_profile_task(fn, *args, **kwargs) -> Future:
+    """在后台线程中生成数据分析报告，不占用 Streamlit 脚本线程 (大表仍按列分到进程池并行计算)
+
+    Returns:
+        Future: 任务结果
+    """
+    global _task_executor
+    with _executor_lock:
+        if _task_executor is None:
+            _task_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="autovis-profile")
+    return _task_executor.submit(fn, *args, **kwargs)
+
+@atexit.register
+def _shutdown_executor() -> None:
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+
+def _write_shard(table: pa.Table) -> Tuple[shared_memory.SharedMemory, int]:
+    """把一组列写成 Arrow IPC 流放入共享内存"""
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    size = sink.size()
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    with pa.ipc.new_stream(pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf)), table.schema) as writer:
+        writer.write_table(table)
+    return shm, size
+
+def _profile_shard(shm_name: str, size: int) -> Dict[str, Any]:
+    """工作进程：从共享内存读取一组列，计算该组列的报告和列描述
+
+    读取 Arrow 表时直接引用共享内存中的缓冲区；转换为 DataFrame 时会把该组列复制一份到工作进程的内存中。
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(shm.buf)[:size]).read_all()
+        shard = table.to_pandas()
+        del table
+        result = {
+            "sections": profile_columns(shard),
+            "memory_bytes": int(shard.memory_usage(deep=True, index=False).sum()),
+            "column_descriptions": infer_column_descriptions(shard),
+        }
+        del shard
+        return result
+    finally:
+        shm.close()
+
+def _split_columns(columns: List[Any], parts: int) -> List[List[Any]]:
+    size = math.ceil(len(columns) / parts)
+    return [columns[i:i + size] for i in range(0, len(columns), size)]
+
+def profile_and_describe(df: pd.DataFrame, max_workers: Optional[int] = None) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """生成数据分析报告和自动列描述，大表按列切分到进程池并行计算
+
+    每组列以 Arrow IPC 格式写入共享内存，工作进程直接映射读取，不经过 pickle 序列化；
+    工作进程转换为 DataFrame 时各自复制一次所分到的列。
+    数据量低于 PARALLEL_PROFILE_MIN_CELLS、列数太少或列无法转换为 Arrow 时串行计算。
+
+    Args:
+        df: 待分析的DataFrame
+        max_workers: 进程数，默认 PARALLEL_PROFILE_WORKERS
+
+    Returns:
+        Tuple[Dict, Dict]: (数据分析报告, 列描述)
+    """
+    max_workers = max_workers or PARALLEL_PROFILE_WORKERS
+    workers = min(max_workers, df.shape[1] // PARALLEL_PROFILE_MIN_COLUMNS_PER_WORKER)
+    if workers < 2 or df.shape[0] * df.shape[1] < PARALLEL_PROFILE_MIN_CELLS:
+        return profile_dataframe(df), infer_column_descriptions(df)
+    if not df.columns.is_unique or not all(isinstance(col, str) for col in df.columns):
+        # Arrow 表要求列名唯一且为字符串
+        return profile_dataframe(df), infer_column_descriptions(df)
+
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        print(f"[Parallel Profile] 无法转换为 Arrow，改为串行分析: {e}")
+        return profile_dataframe(df), infer_column_descriptions(df)
+
+    shards = []
+    try:
+        for columns in _split_columns(list(df.columns), workers):
+            shards.append(_write_shard(table.select(columns)))
+        del table
+        executor = _get_executor(max_workers)
+        futures = [executor.submit(_profile_shard, shm.name, size) for shm, size in shards]
+        results = [future.result() for future in futures]
+    finally:
+        for shm, _ in shards:
+            shm.close()
+            shm.unlink()
+
+    report = {
+        "行数": df.shape[0],
+        "列数": df.shape[1],
+        "内存使用": format_memory_usage(df.index.memory_usage(deep=True) + sum(r["memory_bytes"] for r in results)),
+    }
+    descriptions = {}
+    for section in REPORT_SECTIONS:
+        report[section] = {}
+    # 按切分顺序合并，列顺序与串行计算一致
+    for result in results:
+        for section in REPORT_SECTIONS:
+            report[section].update(result["sections"][section])
+        descriptions.update(result["column_descriptions"])
+    print(f"[Parallel Profile] {df.shape[1]} 列分为 {len(results)} 组并行分析")
+    return report, descriptions
@@ -0,0 +1,238 @@
+import math
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Iterable, List
+from src.utils.sketches import HyperLogLog, KLLSketch, HeavyHitters
+
+# 分类列只统计唯一值少于该数量的列
+CATEGORY_PROFILE_MAX_UNIQUE = 20
+# 流式分析中高基数分类列报告的高频值数量
+STREAMING_TOP_VALUES = 10
+# 报告格式或算法变化时递增，保存的旧版本报告不再复用
+PROFILER_VERSION = "1"
+STREAMING_PROFILER_VERSION = "stream-1"
+
+def _to_float_or_none(value) -> Any:
+    return None if pd.isna(value) else float(value)
+
+def profile_dataframe(df: pd.DataFrame) -> Dict[str, Any]:
+    """生成与 process_data 相同格式的数据分析报告
+
+    按数据类型分组做向量化归约：数值列的 min/max/mean/median/std 各在整个数值块上计算一次，
+    缺失值统计在整个表上计算一次；分类列只做一次不排序的计数，唯一值数量直接取计数结果的长度，
+    只有低基数列才对计数结果排序。
+
+    Args:
+        df: 待分析的DataFrame
+
+    Returns:
+        Dict: 数据分析报告
+    """
+    report = {}
+    row_count = df.shape[0]
+    memory_bytes = df.memory_usage(deep=True).sum()
+
+    # 基本信息
+    report["行数"] = row_count
+    report["列数"] = df.shape[1]
+    report["内存使用"] = format_memory_usage(memory_bytes)
+    report.update(profile_columns(df))
+    return report
+
+def format_memory_usage(memory_bytes: int) -> str:
+    return f"{memory_bytes / 1024**2:.2f} MB"
+
+def profile_columns(df: pd.DataFrame) -> Dict[str, Any]:
+    """生成报告中按列计算的部分 (缺失值、数值列、分类列、时间列)
+
+    各部分中的列保持 df 中的顺序，因此按列切分后分别计算、再按切分顺序拼接，结果与整体计算相同。
+
+    Args:
+        df: 待分析的DataFrame
+
+    Returns:
+        Dict: 报告中按列计算的各部分
+    """
+    report = {}
+    row_count = df.shape[0]
+
+    # 缺失值信息
+    missing_values = df.isna().sum()
+    missing_values = missing_values[missing_values > 0]
+    report["缺失值"] = {col: f"{count} ({count/row_count:.1%})" for col, count in missing_values.items()}
+
+    # 数值列统计
+    report["数值列统计"] = {}
+    numeric_df = df.select_dtypes(include=['number'])
+    if numeric_df.shape[1] > 0:
+        stats = pd.DataFrame({
+            "最小值": numeric_df.min(),
+            "最大值": numeric_df.max(),
+            "平均值": numeric_df.mean(),
+            "中位数": numeric_df.median(),
+            "标准差": numeric_df.std()
+        })
+        for col, row in zip(numeric_df.columns, stats.itertuples(index=False)):
+            report["数值列统计"][col] = {name: _to_float_or_none(value) for name, value in zip(stats.columns, row)}
+
+    # 分类列统计
+    report["分类列统计"] = {}
+    categorical_df = df.select_dtypes(include=['object', 'category'])
+    for col in categorical_df.columns:
+        value_counts = categorical_df[col].value_counts(sort=False)
+        observed = value_counts[value_counts > 0] if isinstance(categorical_df[col].dtype, pd.CategoricalDtype) else value_counts
+        if len(observed) < CATEGORY_PROFILE_MAX_UNIQUE:  # 只处理基数不太高的分类列
+            value_counts = value_counts.sort_values(ascending=False)
+            report["分类列统计"][col] = {str(k): f"{v} ({v/row_count:.1%})" for k, v in value_counts.items()}
+
+    # 时间列分析
+    report["时间列分析"] = {}
+    date_df = df.select_dtypes(include=['datetime'])
+    if date_df.shape[1] > 0:
+        earliest = date_df.min()
+        latest = date_df.max()
+        for col in date_df.columns:
+            start, end = earliest[col], latest[col]
+            report["时间列分析"][col] = {
+                "最早": str(start) if not pd.isna(start) else None,
+                "最晚": str(end) if not pd.isna(end) else None,
+                "时间跨度(天)": (end - start).days if not pd.isna(start) and not pd.isna(end) else None
+            }
+
+    return report
+
+class StreamingProfiler:
+    """逐块更新的近似数据分析 (用于无法一次载入内存的大表)
+
+    只需遍历一次数据：行数、缺失值、最值、均值和标准差是精确的 (均值/方差按分块合并)；
+    唯一值数量使用 HyperLogLog，中位数使用 KLL 草图，分类频数使用 Misra-Gries 草图，误差范围写在报告中。
+    """
+
+    def __init__(self):
+        self.row_count = 0
+        self.columns: List[str] = []
+        self.missing: Dict[str, int] = {}
+        self.numeric: Dict[str, Dict[str, Any]] = {}
+        self.categorical: Dict[str, Dict[str, Any]] = {}
+        self.datetime: Dict[str, Dict[str, Any]] = {}
+        self.distinct: Dict[str, HyperLogLog] = {}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """用一个数据分块更新统计"""
+        if not self.columns:
+            self.columns = [str(col) for col in chunk.columns]
+        self.row_count += len(chunk)
+        for col, count in chunk.isna().sum().items():
+            self.missing[col] = self.missing.get(col, 0) + int(count)
+
+        for col in chunk.columns:
+            series = chunk[col]
+            self.distinct.setdefault(col, HyperLogLog()).update(series)
+            if pd.api.types.is_bool_dtype(series.dtype):
+                continue
+            if col in self.categorical:
+                self.categorical[col]["heavy_hitters"].update(series)
+            elif pd.api.types.is_numeric_dtype(series.dtype):
+                self._update_numeric(col, series)
+            elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+                self._update_datetime(col, series)
+            elif series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype):
+                heavy_hitters = HeavyHitters()
+                if col in self.numeric:
+                    # 后续分块中出现了文本，该列改为按分类列统计，之前分块的频数已丢失
+                    del self.numeric[col]
+                    heavy_hitters.exact = False
+                heavy_hitters.update(series)
+                self.categorical[col] = {"heavy_hitters": heavy_hitters}
+
+    def _update_numeric(self, col: str, series: pd.Series) -> None:
+        values = series.dropna().to_numpy(dtype=np.float64)
+        state = self.numeric.setdefault(col, {"count": 0, "mean": 0.0, "m2": 0.0, "min": None, "max": None, "quantiles": KLLSketch()})
+        state["quantiles"].update(series)
+        if values.size == 0:
+            return
+        # Chan 等人的并行方差合并公式
+        chunk_count = values.size
+        chunk_mean = float(values.mean())
+        chunk_m2 = float(((values - chunk_mean) ** 2).sum())
+        total = state["count"] + chunk_count
+        delta = chunk_mean - state["mean"]
+        state["mean"] += delta * chunk_count / total
+        state["m2"] += chunk_m2 + delta * delta * state["count"] * chunk_count / total
+        state["count"] = total
+        chunk_min, chunk_max = float(values.min()), float(values.max())
+        state["min"] = chunk_min if state["min"] is None else min(state["min"], chunk_min)
+        state["max"] = chunk_max if state["max"] is None else max(state["max"], chunk_max)
+
+    def _update_datetime(self, col: str, series: pd.Series) -> None:
+        state = self.datetime.setdefault(col, {"min": None, "max": None})
+        chunk_min, chunk_max = series.min(), series.max()
+        if not pd.isna(chunk_min):
+            state["min"] = chunk_min if state["min"] is None else min(state["min"], chunk_min)
+            state["max"] = chunk_max if state["max"] is None else max(state["max"], chunk_max)
+
+    def report(self) -> Dict[str, Any]:
+        """生成与 profile_dataframe 结构相同的报告，并附带唯一值估计和误差说明"""
+        row_count = self.row_count
+        report = {
+            "行数": row_count,
+            "列数": len(self.columns),
+            "内存使用": "流式计算",
+            "缺失值": {col: f"{count} ({count/row_count:.1%})" for col, count in self.missing.items() if count > 0},
+            "数值列统计": {},
+            "分类列统计": {},
+            "时间列分析": {},
+            "唯一值估计": {col: sketch.estimate() for col, sketch in self.distinct.items()},
+            "高频值": {},
+        }
+
+        for col, state in self.numeric.items():
+            has_values = state["count"] > 0
+            report["数值列统计"][col] = {
+                "最小值": state["min"],
+                "最大值": state["max"],
+                "平均值": state["mean"] if has_values else None,
+                "中位数": state["quantiles"].quantile(0.5),
+                "标准差": math.sqrt(state["m2"] / (state["count"] - 1)) if state["count"] > 1 else None
+            }
+
+        max_count_error = 0
+        for col, state in self.categorical.items():
+            heavy_hitters = state["heavy_hitters"]
+            max_count_error = max(max_count_error, heavy_hitters.max_error)
+            if heavy_hitters.exact and len(heavy_hitters.counters) < CATEGORY_PROFILE_MAX_UNIQUE:
+                report["分类列统计"][col] = {k: f"{v} ({v/row_count:.1%})" for k, v in heavy_hitters.all_counts().items()}
+            else:
+                top_values = heavy_hitters.top(STREAMING_TOP_VALUES)
+                if top_values:
+                    report["高频值"][col] = {k: f"≥{v} ({v/row_count:.1%})" for k, v in top_values.items()}
+
+        for col, state in self.datetime.items():
+            start, end = state["min"], state["max"]
+            report["时间列分析"][col] = {
+                "最早": str(start) if start is not None else None,
+                "最晚": str(end) if end is not None else None,
+                "时间跨度(天)": (end - start).days if start is not None else None
+            }
+
+        report["误差说明"] = {
+            "唯一值估计": f"HyperLogLog，相对标准误差约 ±{HyperLogLog().relative_error:.2%}",
+            "中位数": f"KLL 草图，排名误差不超过 {KLLSketch().rank_error:.2%} (99% 置信度)",
+            "高频值": f"Misra-Gries 草图，计数为下界，低估不超过 {max_count_error} 行",
+            "其它": "行数、缺失值、最值、平均值和标准差为精确值"
+        }
+        return report
+
+def profile_chunks(chunks: Iterable[pd.DataFrame]) -> Dict[str, Any]:
+    """对分块数据源 (iter_csv_chunks / iter_mysql_table_chunks) 做一次遍历的近似分析
+
+    Args:
+        chunks: DataFrame 分块迭代器
+
+    Returns:
+        Dict: 近似数据分析报告
+    """
+    profiler = StreamingProfiler()
+    for chunk in chunks:
+        profiler.update(chunk)
+    return profiler.report()
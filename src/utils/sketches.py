@@ -0,0 +1,157 @@
+import math
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional
+
+# HyperLogLog 寄存器数量为 2^HLL_PRECISION，相对标准误差约为 1.04 / sqrt(2^p)
+HLL_PRECISION = 14
+# KLL 顶层压缩器容量，决定分位数的排名误差
+KLL_K = 200
+# Misra-Gries 计数器数量，计数低估不超过 N / (k + 1)
+HEAVY_HITTERS_K = 256
+
+def _hash_values(values: pd.Series) -> np.ndarray:
+    """把一列值 (不含缺失值) 映射为 64 位哈希"""
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+
+class HyperLogLog:
+    """HyperLogLog 唯一值计数
+
+    每个分块向量化更新：哈希高 p 位选择寄存器，其余位的前导零个数决定寄存器取值。
+    两个草图可以按寄存器取最大值合并。
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        """相对标准误差"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def update(self, values: pd.Series) -> None:
+        values = values.dropna()
+        if values.empty:
+            return
+        hashes = _hash_values(values)
+        remaining_bits = 64 - self.precision
+        index = (hashes >> np.uint64(remaining_bits)).astype(np.intp)
+        remainder = hashes & np.uint64((1 << remaining_bits) - 1)
+        # remainder 不超过 2^50，转换为浮点数是精确的；frexp 的指数即为二进制位数
+        _, bit_length = np.frexp(remainder.astype(np.float64))
+        rank = (remaining_bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros > 0:
+            # 小基数时使用线性计数
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+class KLLSketch:
+    """KLL 分位数草图 (简化实现)
+
+    第 h 层压缩器中的每个元素代表 2^h 个原始值。某层超出容量时排序并随机保留奇数或偶数位置的元素，
+    提升到上一层。越低的层容量越小，总内存约为 O(k)。
+    """
+
+    def __init__(self, k: int = KLL_K, seed: Optional[int] = None):
+        self.k = k
+        self.count = 0
+        self.levels: List[np.ndarray] = [np.empty(0, dtype=np.float64)]
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def rank_error(self) -> float:
+        """单侧归一化排名误差 (99% 置信度)"""
+        return 2.296 / self.k ** 0.9723
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values: pd.Series) -> None:
+        values = pd.to_numeric(values, errors='coerce').dropna().to_numpy(dtype=np.float64)
+        if values.size == 0:
+            return
+        self.count += values.size
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if items.size > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype=np.float64))
+                items = np.sort(items)
+                # 奇数个元素时留下一个在当前层，其余两两配对，随机保留其中一个提升到上一层
+                keep = items[:items.size % 2]
+                paired = items[items.size % 2:]
+                promoted = paired[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(items.size, 1 << level, dtype=np.float64) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        position = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+        return float(values[order][min(position, len(order) - 1)])
+
+class HeavyHitters:
+    """Misra-Gries 高频值草图
+
+    保留至多 k 个计数器。每个分块先精确计数再合并，计数器超过 k 个时所有计数减去第 k+1 大的计数。
+    估计值是真实频数的下界，低估不超过 N / (k + 1)；不同值不超过 k 个时计数是精确的。
+    """
+
+    def __init__(self, k: int = HEAVY_HITTERS_K):
+        self.k = k
+        self.count = 0
+        self.counters = pd.Series(dtype=np.int64)
+        self.exact = True
+
+    @property
+    def max_error(self) -> int:
+        """计数的最大低估值"""
+        return 0 if self.exact else self.count // (self.k + 1)
+
+    def update(self, values: pd.Series) -> None:
+        values = values.dropna()
+        if values.empty:
+            return
+        self.count += len(values)
+        if values.dtype != object:
+            values = values.astype(str)
+        # 分块计数先单独约简到 k 个计数器再合并 (Misra-Gries 摘要可合并)，避免与大量低频值对齐
+        chunk_counts = self._reduce(values.value_counts(sort=False))
+        self.counters = self._reduce(self.counters.add(chunk_counts, fill_value=0).astype(np.int64))
+
+    def _reduce(self, counts: pd.Series) -> pd.Series:
+        if len(counts) <= self.k:
+            return counts
+        threshold = np.partition(counts.to_numpy(), -(self.k + 1))[-(self.k + 1)]
+        self.exact = False
+        return counts[counts > threshold] - threshold
+
+    def top(self, n: int) -> Dict[str, int]:
+        """返回至多 n 个高频值；估计计数不超过误差上界的值无法与噪声区分，不返回"""
+        counters = self.counters[self.counters > self.max_error]
+        return {str(k): int(v) for k, v in counters.nlargest(n).items()}
+
+    def all_counts(self) -> Dict[str, Any]:
+        return {str(k): int(v) for k, v in self.counters.sort_values(ascending=False).items()}
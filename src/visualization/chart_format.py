@@ -0,0 +1,137 @@
+"""按图表复杂度选择输出格式
+
+生成的代码总是把图表保存为 chart_<id>.svg。这里替换沙箱中的 Figure.savefig，保存图表文件时:
+    - 点数很多的单个集合/折线在SVG中栅格化 (坐标轴、文字仍为矢量)
+    - 剩余的矢量元素仍然过多时改为保存位图 (chart_<id>.png 或 .webp)
+    - SVG 写出后做一次压缩 (去掉元数据和标签间空白，路径坐标保留两位小数)
+图表的实际格式由文件扩展名记录，页面按扩展名选择显示方式。
+"""
+import os
+import re
+from typing import List, Optional, Tuple
+
+# SVG中允许的矢量元素数 (点、顶点、柱子等)，超过时保存为位图
+SVG_MAX_ELEMENTS = int(os.environ.get("AUTOVIS_SVG_MAX_ELEMENTS", 20_000))
+# 单个集合/折线的元素数超过该值时在SVG中栅格化
+SVG_RASTERIZE_ELEMENTS = int(os.environ.get("AUTOVIS_SVG_RASTERIZE_ELEMENTS", 2_000))
+# 位图格式 (png 或 webp) 和分辨率
+RASTER_FORMAT = os.environ.get("AUTOVIS_RASTER_FORMAT", "png").lower()
+RASTER_DPI = int(os.environ.get("AUTOVIS_RASTER_DPI", 150))
+SVG_COORD_DECIMALS = 2
+
+CHART_MIME_TYPES = {"svg": "image/svg+xml", "png": "image/png", "webp": "image/webp"}
+# 格式选择参数变化后，缓存的执行结果不再复用
+CHART_FORMAT_SETTINGS = f"svg{SVG_MAX_ELEMENTS}/raster{SVG_RASTERIZE_ELEMENTS}/{RASTER_FORMAT}@{RASTER_DPI}/d{SVG_COORD_DECIMALS}"
+
+# 代码执行时图表的目标文件名 (见 code_execution.prepare_execution)
+_CHART_FILE_PATTERN = re.compile(r"chart_[^/\\]+\.svg")
+_SVG_BOILERPLATE = re.compile(r"<\?xml[^>]*\?>\s*|<!DOCTYPE[^>]*>\s*|<!--.*?-->\s*|<metadata>.*?</metadata>\s*", re.DOTALL)
+_PATH_DATA = re.compile(r'\s(d|points)="([^"]*)"')
+_LONG_DECIMAL = re.compile(r"-?\d+\.\d{%d}\d+" % (SVG_COORD_DECIMALS + 1))
+_INTER_TAG_SPACE = re.compile(r">\s+<")
+
+def chart_format_of(path: str) -> str:
+    """根据扩展名返回图表格式 (svg/png/webp)"""
+    return os.path.splitext(path)[1].lstrip(".").lower()
+
+def resolve_chart_file(target_path: str) -> Optional[str]:
+    """查找实际生成的图表文件 (目标为 .svg，可能改为保存了位图)
+
+    Args:
+        target_path: 代码执行前确定的 chart_<id>.svg 绝对路径
+
+    Returns:
+        str | None: 实际存在的文件路径，有多个时取最新的；都不存在时返回 None
+    """
+    stem = os.path.splitext(target_path)[0]
+    candidates = [stem + "." + fmt for fmt in CHART_MIME_TYPES if os.path.exists(stem + "." + fmt)]
+    if not candidates:
+        return None
+    return max(candidates, key=os.path.getmtime)
+
+def _element_count(artist) -> int:
+    """估计一个图元写入SVG的元素数：集合按点/路径数，折线按顶点数，图片为 0，其它为 1"""
+    from matplotlib.collections import Collection, LineCollection
+    from matplotlib.lines import Line2D
+    from matplotlib.image import AxesImage
+    if isinstance(artist, LineCollection):
+        return sum(len(path.vertices) for path in artist.get_paths())
+    if isinstance(artist, Collection):
+        return max(len(artist.get_offsets()), len(artist.get_paths()))
+    if isinstance(artist, Line2D):
+        return len(artist.get_xydata())
+    if isinstance(artist, AxesImage):
+        return 0
+    return 1
+
+def choose_chart_format(fig) -> Tuple[str, List]:
+    """决定图表的保存格式
+
+    Args:
+        fig: matplotlib Figure
+
+    Returns:
+        Tuple[str, List]: (格式, 保存为SVG时需要栅格化的图元)
+    """
+    from matplotlib.collections import Collection
+    from matplotlib.lines import Line2D
+    dense, vector_elements = [], 0
+    for ax in fig.axes:
+        for artist in (*ax.collections, *ax.lines, *ax.patches, *ax.images):
+            count = _element_count(artist)
+            if count > SVG_RASTERIZE_ELEMENTS and isinstance(artist, (Collection, Line2D)):
+                dense.append(artist)
+            else:
+                vector_elements += count
+    if vector_elements > SVG_MAX_ELEMENTS:
+        return (RASTER_FORMAT if RASTER_FORMAT in CHART_MIME_TYPES else "png"), []
+    return "svg", dense
+
+def minify_svg(svg: str) -> str:
+    """压缩 matplotlib 生成的SVG：去掉XML声明、注释和元数据，去掉标签间空白，路径坐标保留两位小数"""
+    svg = _SVG_BOILERPLATE.sub("", svg)
+    round_decimal = lambda match: f"{float(match.group()):.{SVG_COORD_DECIMALS}f}"
+    svg = _PATH_DATA.sub(lambda match: f' {match.group(1)}="{_LONG_DECIMAL.sub(round_decimal, match.group(2))}"', svg)
+    return _INTER_TAG_SPACE.sub("><", svg).strip()
+
+def minify_svg_file(path: str) -> Tuple[int, int]:
+    """原地压缩SVG文件
+
+    Returns:
+        Tuple[int, int]: (压缩前字节数, 压缩后字节数)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        svg = f.read()
+    minified = minify_svg(svg)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(minified)
+    return len(svg.encode("utf-8")), len(minified.encode("utf-8"))
+
+def _shim_savefig(original):
+    def savefig(self, fname, *args, **kwargs):
+        # 只处理保存到图表目标文件的调用，用户显式指定格式时保持不变
+        if args or "format" in kwargs or not isinstance(fname, (str, os.PathLike)) or not _CHART_FILE_PATTERN.fullmatch(os.path.basename(os.fspath(fname))):
+            return original(self, fname, *args, **kwargs)
+        fname = os.fspath(fname)
+        chart_format, dense = choose_chart_format(self)
+        if chart_format == "svg":
+            for artist in dense:
+                artist.set_rasterized(True)
+            if dense:
+                kwargs.setdefault("dpi", RASTER_DPI)
+            result = original(self, fname, **kwargs)
+            minify_svg_file(fname)
+            return result
+        kwargs.setdefault("dpi", RASTER_DPI)
+        kwargs.setdefault("pil_kwargs", {"lossless": True} if chart_format == "webp" else {"optimize": True})
+        return original(self, os.path.splitext(fname)[0] + "." + chart_format, **kwargs)
+    return savefig
+
+def install_chart_format() -> None:
+    """替换 matplotlib Figure.savefig (重复调用无副作用)"""
+    from matplotlib.figure import Figure
+    if getattr(Figure, "_autovis_format_installed", False):
+        return
+    from src.visualization.plot_shims import warnings_at_caller
+    Figure.savefig = warnings_at_caller(_shim_savefig(Figure.savefig))
+    Figure._autovis_format_installed = True
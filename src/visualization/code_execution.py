@@ -4,114 +4,200 @@ import uuid
 import streamlit as st
 from autogen import ConversableAgent
 from autogen.coding import LocalCommandLineCodeExecutor, CodeBlock
+import hashlib
+import shutil
 import re # Import re for more robust replacement if needed
 import traceback # Make sure traceback is imported for the except block
+from src.utils.columnar_store import has_fresh_columnar_copy, build_columnar_reader_code, get_columnar_path, write_columnar_copy
+from src.visualization.worker_pool import get_worker_pool, ExecutionResult, EXECUTOR_MODE, EXECUTION_TIMEOUT_SECONDS, CANCELLED_EXIT_CODE
+from src.visualization.result_cache import get_result_cache, make_result_cache_key, is_cacheable_code
+from src.utils.file_manager import get_content_hash
+from src.visualization.scheduler import get_execution_scheduler
+from src.visualization.code_rewriter import rewrite_code
+from src.visualization.output_filter import WarningFilter
+from src.visualization.plot_shims import PLOT_SHIM_SETTINGS
+from src.visualization.chart_format import CHART_FORMAT_SETTINGS, chart_format_of, resolve_chart_file
 
-# 修改过滤警告函数，添加字体相关警告的规则
-def filter_warnings(output_text):
-    """过滤掉输出中的警告信息 (使用安全的按行过滤)
-    
-    Args:
-        output_text (str): 原始输出文本
-        
-    Returns:
-        str: 过滤后的文本
-    """
-    print("[filter_warnings] 使用按行过滤方法处理输出...")
-    if not output_text:
-        return ""
-        
-    lines = output_text.splitlines()
-    filtered_lines = []
-    
-    # 定义要过滤掉的警告关键词或前缀
-    warning_keywords = [
-        "Warning:", 
-        "UserWarning:", 
-        "DeprecationWarning:", 
-        "FutureWarning:", 
-        "RuntimeWarning:",
-        "MatplotlibDeprecationWarning:",
-        "findfont:"
-    ]
-    
-    # 定义要过滤掉的特定代码行片段 (新增)
-    code_lines_to_filter = [
-        "pd.read_sql(",
-        "plt.tight_layout()"
-    ]
-    
-    # 定义要过滤掉的字体相关行中的特定词 (避免误删)
-    font_line_keywords_to_filter = [
-        "Microsoft YaHei",
-        "SimHei",
-        "WenQuanYi",
-        "Noto Sans CJK JP"
-    ]
-
-    for line in lines:
-        line_stripped = line.strip()
-        should_filter = False
-        
-        # --- 添加更详细的日志 --- 
-        # print(f"  [Line Process] Processing line: {line}") # Can be noisy, comment out if needed
-        
-        # 检查是否包含警告关键词
-        for keyword in warning_keywords:
-            if keyword in line_stripped: # Case-sensitive check
-                should_filter = True
-                print(f"    [Filter Decision] Match found for warning keyword '{keyword}'. Filtering line.")
-                break 
-        
-        # 检查是否包含要过滤的代码行片段 (新增)
-        if not should_filter:
-            for code_snippet in code_lines_to_filter:
-                if code_snippet in line: # Check in original line to catch variations
-                    should_filter = True
-                    print(f"    [Filter Decision] Match found for code snippet '{code_snippet}'. Filtering line.")
-                    break
-        
-        # 如果是以 findfont 开头，再检查是否包含特定字体名 (保持不变)
-        if not should_filter and line_stripped.startswith("findfont:"):
-             for font_keyword in font_line_keywords_to_filter:
-                 if font_keyword in line: # Check in original line for context
-                     should_filter = True
-                     print(f"    [Filter Decision] Match found for findfont keyword '{font_keyword}'. Filtering line.")
-                     break
-        
-        # 检查是否是 plt.savefig 行 (保持不变)
-        if not should_filter and line_stripped.startswith("plt.savefig("):
-            should_filter = True
-            print(f"    [Filter Decision] Match found for plt.savefig. Filtering line.")
-            
-        # 打印最终决定并添加行
-        if not should_filter:
-            # print(f"    [Filter Decision] Keeping line.") # Can be noisy
-            filtered_lines.append(line)
-        # else:
-            # print(f"    [Filter Decision] Filtering line.") # Can be noisy
-            
-    # 重新组合过滤后的行，并去除多余的空行
-    filtered_text = '\n'.join(filtered_lines)
-    # 移除连续的空行（两个或更多换行符替换为一个）
-    filtered_text = re.sub(r'\n{2,}', '\n\n', filtered_text) 
-    
-    print(f"[filter_warnings] 过滤完成，原始行数: {len(lines)}, 过滤后行数: {len(filtered_lines)}")
-    return filtered_text.strip()
-
-# 创建一个本地命令行代码执行器，工作目录设定为 src/codeexe 的绝对路径
-# 注意：所有在代码中使用的相对路径都是相对于这个 work_dir
+# 日志中打印的执行输出的最大长度，大表格输出不完整写入服务日志
+LOG_OUTPUT_PREVIEW_CHARS = 2000
+
+def _log_preview(text):
+    if len(text) <= LOG_OUTPUT_PREVIEW_CHARS:
+        return text
+    return text[:LOG_OUTPUT_PREVIEW_CHARS] + f"\n... (省略 {len(text) - LOG_OUTPUT_PREVIEW_CHARS} 字符)"
+
+def _insert_after_first_import(code, snippet):
+    """把代码片段插入到第一条 import 语句之后 (没有 import 时放在开头)"""
+    import_pos = code.find("import")
+    if import_pos != -1:
+        newline_pos = code.find("\n", import_pos)
+        if newline_pos != -1:
+            return code[:newline_pos+1] + snippet + code[newline_pos+1:]
+    return snippet + code
+
+# 代码执行的根目录 src/codeexe，每个会话在 sessions/<用户>/<会话> 下有自己的临时工作目录
+# 注意：代码中使用的相对路径都是相对于会话的工作目录
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 SRC_ROOT = os.path.join(PROJECT_ROOT, "src")
 WORK_DIR_ABS = os.path.join(SRC_ROOT, "codeexe")
+SESSIONS_WORK_DIR = os.path.join(WORK_DIR_ABS, "sessions")
+
+def get_session_work_dir(user_id, session_id):
+    """返回会话的临时工作目录 (不存在时创建)，并发执行的会话互不干扰
 
-executor = LocalCommandLineCodeExecutor(
-    timeout=20,  # 增加超时时间
-    work_dir=WORK_DIR_ABS,
-)
+    Args:
+        user_id: 用户ID
+        session_id: 会话ID
+
+    Returns:
+        str: 工作目录的绝对路径
+    """
+    safe_parts = [re.sub(r"[^\w.-]", "_", str(part)).lstrip(".") or "_" for part in (user_id, session_id)]
+    work_dir = os.path.join(SESSIONS_WORK_DIR, *safe_parts)
+    os.makedirs(work_dir, exist_ok=True)
+    return work_dir
+
+def _relative_exec_path(full_path, work_dir):
+    """代码中使用的路径：相对于执行工作目录"""
+    return os.path.relpath(full_path, work_dir).replace(os.sep, '/')
+
+# 注入生成代码的中文字体设置
+FONT_SUPPORT_CODE = """
+# 添加中文字体支持
+import matplotlib.pyplot as plt
+import matplotlib
 
-def execute_code(code, user_id: str, session_id: str, data_source_type: str, persistent_file_path: str | None = None, image_id=None):
-    """执行代码并生成图片或返回分析结果的通用函数
+# 设置matplotlib后端为Agg，避免字体问题
+matplotlib.use('Agg')
+
+# 直接设置中文字体
+plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'WenQuanYi Micro Hei', 'WenQuanYi Zen Hei', 'Noto Sans CJK JP']
+plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+plt.rcParams['svg.fonttype'] = 'none'  # 确保字体被正确嵌入到SVG中
+"""
+
+# 子进程执行时安装沙箱中的 matplotlib 替换 (工作进程在预热时已安装)
+SANDBOX_SHIM_CODE = f"""
+# 点数过多时自动降采样，按图表复杂度选择SVG或位图
+import sys as _autovis_sys
+if {PROJECT_ROOT!r} not in _autovis_sys.path:
+    _autovis_sys.path.append({PROJECT_ROOT!r})
+from src.visualization.plot_shims import install_plot_shims as _autovis_install_plot_shims
+from src.visualization.chart_format import install_chart_format as _autovis_install_chart_format
+_autovis_install_plot_shims()
+_autovis_install_chart_format()
+"""
+
+# 渲染设置变化 (字体设置、降采样参数或图片格式选择) 后，缓存的执行结果不再复用
+RENDER_SETTINGS = hashlib.sha1((FONT_SUPPORT_CODE + PLOT_SHIM_SETTINGS + CHART_FORMAT_SETTINGS).encode("utf-8")).hexdigest()[:12]
+
+def _dataset_hash(data_source_type, persistent_file_path):
+    """执行结果缓存使用的数据集标识：文件为内容哈希，MySQL为包含表版本的缓存键
+
+    Returns:
+        str | None: 无法确定数据内容时返回 None (不使用缓存)
+    """
+    if data_source_type in ['csv', 'excel']:
+        full_data_path = os.path.join(SRC_ROOT, persistent_file_path)
+        return get_content_hash(full_data_path) if os.path.exists(full_data_path) else None
+    cache_key = st.session_state.get("df_cache_key")
+    if data_source_type == 'mysql' and cache_key and cache_key[0] == "mysql":
+        return hashlib.sha1(repr(cache_key).encode("utf-8")).hexdigest()
+    return None
+
+# 数据库数据的列式快照保存在执行目录下，供工作进程绑定
+SNAPSHOT_DIR = os.path.join(WORK_DIR_ABS, "data_snapshots")
+
+def _mysql_snapshot_base(cache_key):
+    """MySQL 数据的列式快照路径 (不含扩展名)；压缩与否的缓存键对应同一份原始数据，共用一个快照"""
+    key = tuple(cache_key)
+    if key[-1] == "compact":
+        key = key[:-1]
+    return os.path.join(SNAPSHOT_DIR, hashlib.sha1(repr(key).encode("utf-8")).hexdigest())
+
+def write_mysql_snapshot(cache_key, df):
+    """把从数据库读取的原始 (未压缩) 数据写成列式快照，沙箱中 read_sql 得到的类型与直接查询一致
+
+    Args:
+        cache_key: make_mysql_cache_key 生成的键
+        df: read_sql 返回的原始 DataFrame
+    """
+    if EXECUTOR_MODE != "pool":
+        return
+    snapshot_base = _mysql_snapshot_base(cache_key)
+    if not os.path.exists(get_columnar_path(snapshot_base)):
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        write_columnar_copy(df, snapshot_base)
+
+def _mysql_data_binding():
+    """返回页面已加载的MySQL数据的列式快照绑定 (快照在加载数据时写入，见 write_mysql_snapshot)
+
+    只有当前数据集在进程内缓存中有键 (即有表版本) 时才绑定，保证快照与表内容对应。
+
+    Returns:
+        dict | None: 数据绑定，无法绑定时返回 None
+    """
+    cache_key = st.session_state.get("df_cache_key")
+    df = st.session_state.get("df")
+    table_name = st.session_state.get("mysql_selected_table")
+    if not cache_key or cache_key[0] != "mysql" or df is None or not table_name:
+        return None
+    snapshot_base = _mysql_snapshot_base(cache_key)
+    snapshot_path = get_columnar_path(snapshot_base)
+    if not os.path.exists(snapshot_path):
+        if "memory_report" in df.attrs:
+            # 会话中只有压缩后的数据，类型与 read_sql 的结果不同，不绑定 (代码照常查询数据库)
+            return None
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        if write_columnar_copy(df, snapshot_base) is None:
+            return None
+    limit = cache_key[5]
+    # 加载时有行数限制且达到了限制，说明不是整张表，此时读取整张表的查询仍然访问数据库
+    return {"arrow_path": snapshot_path, "sql_table": table_name, "sql_complete": not limit or len(df) < limit}
+
+def _run_in_subprocess(code, work_dir):
+    """使用 autogen 的本地命令行执行器在新的解释器中执行代码"""
+    executor = LocalCommandLineCodeExecutor(
+        timeout=EXECUTION_TIMEOUT_SECONDS,
+        work_dir=work_dir,
+    )
+    return executor.execute_code_blocks([CodeBlock(code=code, language="python")])
+
+def _run_code(code, work_dir, data_binding, on_output=None, cancel_event=None):
+    """执行路径替换后的代码：优先使用预热的工作进程池，不可用时使用子进程 (子进程执行结束后才有输出，也不能中途取消)"""
+    if EXECUTOR_MODE == "pool":
+        # 使用预热的常驻工作进程，省去解释器启动和导入 pandas/matplotlib 的时间
+        try:
+            return get_worker_pool(WORK_DIR_ABS).execute(code, binding=data_binding, cwd=work_dir, on_output=on_output, cancel_event=cancel_event)
+        except Exception as pool_error:
+            print(f"[Execute Code] 工作进程池不可用，改用子进程执行: {pool_error}")
+    return _run_in_subprocess(code, work_dir)
+
+def _link_cached_chart(cached_full_path, target_dir_full, target_dir_relative_to_src, image_id):
+    """把缓存的图表硬链接 (不支持时复制) 为本会话目录下新的 chart_<id> 文件
+
+    缓存条目可能来自其他用户或会话，直接返回其路径会让聊天记录引用别人的目录，删除那个会话后图片也随之丢失。
+
+    Returns:
+        str | None: 新图表相对于 src 的路径，缓存的文件已不存在时返回 None
+    """
+    extension = os.path.splitext(cached_full_path)[1]
+    filename = f"chart_{image_id}{extension}"
+    target_full_path = os.path.join(target_dir_full, filename)
+    try:
+        try:
+            os.link(cached_full_path, target_full_path)
+        except OSError:
+            shutil.copy2(cached_full_path, target_full_path)
+    except OSError as e:
+        print(f"[Execute Code] 无法复用缓存的图表 {cached_full_path}: {e}")
+        return None
+    return os.path.join(target_dir_relative_to_src, filename).replace(os.sep, '/')
+
+def prepare_execution(code, user_id: str, session_id: str, data_source_type: str, persistent_file_path: str | None = None, image_id=None, use_cache: bool = True):
+    """准备代码执行：查询结果缓存，替换图表/数据路径和连接信息，生成执行计划
+
+    需要在 Streamlit 脚本线程中调用 (读取 st.session_state)，返回的执行计划可以交给任意线程执行。
 
     Args:
         code (str): 要执行的Python代码字符串 (可能包含占位符如 'data.csv')
@@ -120,177 +206,174 @@ def execute_code(code, user_id: str, session_id: str, data_source_type: str, per
         data_source_type (str): 数据源类型 ('csv', 'excel', 'mysql')
         persistent_file_path (str | None): 数据文件相对于 src 的持久化路径 (仅文件类型需要)
         image_id (str, optional): 图片的唯一ID
+        use_cache (bool): 相同代码在相同数据上执行过时直接返回缓存的结果
 
     Returns:
-        tuple: (是否成功, 图片相对路径 | None, 文本输出)
+        tuple: (执行计划 dict | None, 结果 | None)
+            命中缓存或无法执行时执行计划为 None，结果为 (是否成功, 图片相对路径 | None, 文本输出)
     """
     print(f"[Execute Code] Data source type: {data_source_type}")
     if not user_id or not session_id:
         print("Error: execute_code requires user_id and session_id.")
-        return False, None, "Error: missing user_id or session_id."
+        return None, (False, None, "Error: missing user_id or session_id.")
     # --- 新增：检查文件类型参数 --- 
     if data_source_type in ['csv', 'excel'] and not persistent_file_path:
         print(f"Error: file type ({data_source_type}) requires persistent_file_path.")
-        return False, None, f"Error: file type ({data_source_type}) requires persistent_file_path."
+        return None, (False, None, f"Error: file type ({data_source_type}) requires persistent_file_path.")
 
     try: # --- Main Try Block Starts Here ---
-        # --- 1. 构建目标图表路径 (不变) ---
+        # --- 1. 构建目标图表路径 (图表复杂时沙箱改为保存同名的位图，见 chart_format) ---
         image_id = image_id or str(uuid.uuid4().hex)
         chart_filename = f"chart_{image_id}.svg"
         target_dir_relative_to_src = os.path.join("session_assets", str(user_id), str(session_id))
         project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
         target_dir_full = os.path.join(project_root, "src", target_dir_relative_to_src)
         target_file_full_path = os.path.join(target_dir_full, chart_filename)
-        relative_chart_save_path_for_code = os.path.normpath(os.path.join("..", target_dir_relative_to_src, chart_filename)).replace(os.sep, '/')
+        session_work_dir = get_session_work_dir(user_id, session_id)
+        relative_chart_save_path_for_code = _relative_exec_path(target_file_full_path, session_work_dir)
 
         # --- 2. 创建目标目录 (不变) ---
         os.makedirs(target_dir_full, exist_ok=True)
 
-        # --- 3. 初始代码修改：替换图表保存路径 (不变) ---
-        modified_code = code.replace("'answer.png'", f"'{relative_chart_save_path_for_code}'")
-        modified_code = modified_code.replace("'answer.svg'", f"'{relative_chart_save_path_for_code}'")
-
-        # --- 4. 添加中文字体支持 (不变) ---
-        font_support_code = """
-# 添加中文字体支持
-import matplotlib.pyplot as plt
-import matplotlib
-
-# 设置matplotlib后端为Agg，避免字体问题
-matplotlib.use('Agg')
+        # --- 2.1 查询执行结果缓存；命中时把缓存的图表链接到本会话目录，不引用其他会话的文件 ---
+        result_cache_key = None
+        if use_cache and is_cacheable_code(code):
+            dataset_hash = _dataset_hash(data_source_type, persistent_file_path)
+            if dataset_hash:
+                result_cache_key = make_result_cache_key(code, dataset_hash, RENDER_SETTINGS)
+                cached = get_result_cache().get(result_cache_key)
+                if cached is not None:
+                    cached_image_full_path, cached_output = cached
+                    image_relative_path = None
+                    if cached_image_full_path:
+                        image_relative_path = _link_cached_chart(cached_image_full_path, target_dir_full, target_dir_relative_to_src, image_id)
+                    if image_relative_path or not cached_image_full_path:
+                        print(f"[Execute Code] 命中执行结果缓存 {get_result_cache().stats()}")
+                        return None, (True, image_relative_path, cached_output)
 
-# 直接设置中文字体
-plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'WenQuanYi Micro Hei', 'WenQuanYi Zen Hei', 'Noto Sans CJK JP']
-plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
-plt.rcParams['svg.fonttype'] = 'none'  # 确保字体被正确嵌入到SVG中
-"""
-        import_pos = modified_code.find("import")
-        if import_pos != -1:
-            newline_pos = modified_code.find("\n", import_pos)
-            if newline_pos != -1:
-                modified_code = modified_code[:newline_pos+1] + font_support_code + modified_code[newline_pos+1:]
-            else:
-                modified_code = font_support_code + modified_code
-        else:
-            modified_code = font_support_code + modified_code
-
-        # --- 5. 处理数据加载路径/信息 --- 
+        # --- 3. 确定数据文件路径和数据绑定 ---
+        data_binding = None
+        relative_data_exec_path = None
+        connection_info = None
         if data_source_type in ['csv', 'excel']:
-            # --- 计算文件执行路径 (不变) ---
-            relative_data_exec_path = os.path.normpath(os.path.join("..", persistent_file_path)).replace(os.sep, '/')
+            full_data_path = os.path.join(SRC_ROOT, persistent_file_path)
+            relative_data_exec_path = _relative_exec_path(full_data_path, session_work_dir)
             print(f"[Execute Code] Calculated data execution path: {relative_data_exec_path}")
-
-            # --- 根据文件类型替换不同的占位文件名 ---
-            if data_source_type == 'csv':
-                modified_code = modified_code.replace("'data.csv'", f"'{relative_data_exec_path}'")
-            elif data_source_type == 'excel':
-                modified_code = re.sub(r"""(['"])data\.xls[x|m|b]?\1""", rf"\1{relative_data_exec_path}\1", modified_code)
-
-
-
         elif data_source_type == 'mysql':
-            # --- Ensure we can replace MySQL connection info ---
             if "mysql_connection_info" in st.session_state:
-                conn_info = st.session_state.mysql_connection_info
-                # Example minimal replacement; full logic is handled below in section 6
-                modified_code = modified_code.replace('host="localhost"', f'host="{conn_info["host"]}"')
-                masked = {k: ('***' if k == 'password' else v) for k, v in conn_info.items()}
-                print(f"MySQL connection info replaced (from session_state): {masked}")
+                connection_info = st.session_state.mysql_connection_info
+                masked = {k: ('***' if k == 'password' else v) for k, v in connection_info.items()}
+                print(f"MySQL connection info: {masked}")
             else:
                 print("Warning: MySQL connection info not found in st.session_state; cannot replace.")
+            if EXECUTOR_MODE == "pool":
+                data_binding = _mysql_data_binding()
+        elif "mysql_connection_info" in st.session_state:
+            connection_info = st.session_state.mysql_connection_info
+
+        # --- 4. 替换图表保存路径、数据文件路径和数据库连接参数 (一次AST遍历，按代码缓存) ---
+        modified_code = rewrite_code(code, relative_chart_save_path_for_code, relative_data_exec_path, connection_info)
 
-            
-        # --- 6. 处理MySQL连接信息 (保持不变) ---
-        if ("mysql.connector.connect" in modified_code or "pymysql.connect" in modified_code) and "mysql_connection_info" in st.session_state:
-            conn_info = st.session_state.mysql_connection_info
-            # (替换逻辑保持不变) ...
-            modified_code = modified_code.replace(
-                'host="localhost"', f'host="{conn_info["host"]}"'
-            ).replace(
-                "host='localhost'", f"host='{conn_info['host']}'"
-            )
-            if "port" in conn_info:
-                modified_code = modified_code.replace(
-                    'port=3306', f'port={conn_info["port"]}'
-                ).replace(
-                    "port=3306", f"port={conn_info['port']}"
-                )
-            modified_code = modified_code.replace(
-                'user="root"', f'user="{conn_info["user"]}"'
-            ).replace(
-                "user='root'", f"user='{conn_info['user']}'"
-            )
-            modified_code = modified_code.replace(
-                'password="password"', f'password="{conn_info["password"]}"'
-            ).replace(
-                'password=""', f'password="{conn_info["password"]}"'
-            ).replace(
-                "password='password'", f"password='{conn_info['password']}'"
-            ).replace(
-                "password=''", f"password='{conn_info['password']}'"
-            )
-            modified_code = modified_code.replace(
-                'database="database_name"', f'database="{conn_info["database"]}"'
-            ).replace(
-                "database='database_name'", f"database='{conn_info['database']}'"
-            )
-            # (处理 charset 的逻辑也保持不变) ...
-            if "charset" in conn_info:
-                if "charset=" not in modified_code:
-                    connect_pos = modified_code.find("mysql.connector.connect(")
-                    if connect_pos == -1:
-                        connect_pos = modified_code.find("pymysql.connect(")
-                    if connect_pos != -1:
-                        bracket_count = 1
-                        for i in range(connect_pos + modified_code[connect_pos:].find("(") + 1, len(modified_code)):
-                            if modified_code[i] == "(": bracket_count += 1
-                            elif modified_code[i] == ")":
-                                bracket_count -= 1
-                                if bracket_count == 0:
-                                    modified_code = modified_code[:i] + f", charset='{conn_info['charset']}'" + modified_code[i:]
-                                    break
-                else:
-                    modified_code = modified_code.replace(
-                         'charset="utf8"', f'charset="{conn_info["charset"]}"'
-                    ).replace(
-                         "charset='utf8'", f"charset='{conn_info['charset']}'"
-                    ).replace(
-                          'charset="utf8mb4"', f'charset="{conn_info["charset"]}"'
-                    ).replace(
-                         "charset='utf8mb4'", f"charset='{conn_info['charset']}'"
-                    )
-            masked = {k: ('***' if k == 'password' else v) for k, v in conn_info.items()}
-            print(f"MySQL connection info: {masked}")
+        # --- 5. 添加中文字体支持；子进程中安装降采样和图表格式选择 (工作进程在预热时已安装) ---
+        modified_code = _insert_after_first_import(modified_code, FONT_SUPPORT_CODE)
+        if EXECUTOR_MODE != "pool":
+            modified_code = _insert_after_first_import(modified_code, SANDBOX_SHIM_CODE)
+
+        # --- 6. 有列式副本时，让沙箱内的 read_csv/read_excel 直接读取副本 ---
+        if relative_data_exec_path and has_fresh_columnar_copy(full_data_path):
+            if EXECUTOR_MODE == "pool":
+                # 工作进程缓存已加载的副本，预先绑定为 df，读取数据文件时不再有 I/O
+                data_binding = {"arrow_path": get_columnar_path(full_data_path), "paths": [relative_data_exec_path]}
+            else:
+                modified_code = _insert_after_first_import(modified_code, build_columnar_reader_code(relative_data_exec_path))
 
         print("执行的代码 (路径替换后):")
         print("-" * 50)
         print(modified_code)
         print("-" * 50)
 
-        # --- 7. 执行代码 (使用设定好工作目录的 executor) ---
-        
-        # 创建 CodeBlock 对象
-        code_block_obj = CodeBlock(code=modified_code, language="python")
-        # 直接使用 executor 执行 CodeBlock 列表
-        execution_result = executor.execute_code_blocks([code_block_obj])
+        plan = {
+            "user_id": user_id,
+            "code": modified_code,
+            "work_dir": session_work_dir,
+            "data_binding": data_binding,
+            "target_file_full_path": target_file_full_path,
+            "image_relative_path": os.path.join(target_dir_relative_to_src, chart_filename).replace(os.sep, '/'),
+            "result_cache_key": result_cache_key,
+        }
+        return plan, None
+
+    except Exception as e:
+        error_msg = f"Critical error during code execution: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        return None, (False, None, error_msg)
+
+def run_execution_plan(plan, on_output=None, on_start=None, cancel_event=None):
+    """按执行计划执行代码 (可在后台线程中调用)
+
+    Args:
+        plan (dict): prepare_execution 返回的执行计划
+        on_output (callable, optional): 执行过程中收到部分输出 (已过滤警告) 时的回调
+        on_start (callable, optional): 排队结束、开始执行时的回调
+        cancel_event (threading.Event, optional): 被设置时放弃排队或终止执行
+
+    Returns:
+        tuple: (是否成功, 图片相对路径 | None, 文本输出)
+    """
+    try:
+        # --- 7. 执行代码 (经调度器排队，在会话的工作目录中执行) ---
+        scheduler = get_execution_scheduler()
+        queued_at = time.perf_counter()
+        timings = {}
+        # 输出在执行过程中边收边过滤警告，回调收到的是过滤后的内容
+        warning_filter = WarningFilter()
+        streamed = {"chars": 0}
+
+        def handle_output(chunk):
+            streamed["chars"] += len(chunk)
+            filtered_chunk = warning_filter.feed(chunk)
+            if on_output is not None and filtered_chunk:
+                on_output(filtered_chunk)
+
+        def run():
+            timings["started"] = time.perf_counter()
+            if cancel_event is not None and cancel_event.is_set():
+                return ExecutionResult(CANCELLED_EXIT_CODE, "Cancelled: code execution was cancelled by the user")
+            if on_start is not None:
+                on_start()
+            return _run_code(plan["code"], plan["work_dir"], plan["data_binding"], handle_output, cancel_event)
+
+        execution_result = scheduler.run(plan["user_id"], run)
+        print(f"[Execute Code] 排队 {timings['started'] - queued_at:.2f}s，执行耗时 {time.perf_counter() - timings['started']:.2f}s ({EXECUTOR_MODE})")
 
         print(f"代码执行退出码: {execution_result.exit_code}")
-        print(f"代码执行输出:\n{execution_result.output}")
+        print(f"代码执行输出 ({len(execution_result.output)} 字符):\n{_log_preview(execution_result.output)}")
         
-        # 过滤警告信息
-        filtered_output = filter_warnings(execution_result.output)
-        print(f"过滤警告后的输出:\n{filtered_output}")
+        # 过滤警告信息 (子进程执行时输出在结束后一次性送入)
+        if streamed["chars"] < len(execution_result.output):
+            warning_filter.feed(execution_result.output[streamed["chars"]:])
+        filtered_output = warning_filter.finish()
+        print(f"过滤警告后的输出 ({warning_filter.total_lines} 行中保留 {warning_filter.kept_lines} 行):\n{_log_preview(filtered_output)}")
 
         # --- 8. 检查图片生成并返回相对路径 ---
+        target_file_full_path = plan["target_file_full_path"]
+        result_cache_key = plan["result_cache_key"]
         if execution_result.exit_code == 0: # 检查退出码是否为0 (成功)
-            # 检查目标文件是否真的被创建
-            if os.path.exists(target_file_full_path):
-                print(f"图表成功生成于: {target_file_full_path}")
+            # 检查图表文件是否真的被创建 (扩展名记录了沙箱选择的格式)
+            chart_file_full_path = resolve_chart_file(target_file_full_path)
+            if chart_file_full_path:
+                chart_format = chart_format_of(chart_file_full_path)
+                print(f"图表成功生成于: {chart_file_full_path} ({chart_format}, {os.path.getsize(chart_file_full_path)} 字节)")
                 # 返回相对于 src 目录的路径
-                return True, os.path.join(target_dir_relative_to_src, chart_filename).replace(os.sep, '/'), filtered_output
+                image_relative_path = os.path.splitext(plan["image_relative_path"])[0] + "." + chart_format
+                if result_cache_key is not None:
+                    get_result_cache().put(result_cache_key, chart_file_full_path, filtered_output)
+                return True, image_relative_path, filtered_output
             else:
                 print(f"代码执行成功，但目标文件未找到: {target_file_full_path}")
                 print(f"这可能是分析计算代码而非可视化代码，返回执行结果")
+                if result_cache_key is not None:
+                    get_result_cache().put(result_cache_key, None, filtered_output)
                 return True, None, filtered_output
         else:
             print(f"代码执行失败 (退出码: {execution_result.exit_code})。输出:\n{execution_result.output}")
@@ -301,6 +384,26 @@ plt.rcParams['svg.fonttype'] = 'none'  # 确保字体被正确嵌入到SVG中
         print(error_msg)
         return False, None, error_msg
 
+def execute_code(code, user_id: str, session_id: str, data_source_type: str, persistent_file_path: str | None = None, image_id=None, use_cache: bool = True):
+    """执行代码并生成图片或返回分析结果的通用函数 (阻塞直到执行结束，后台执行见 src.visualization.jobs)
+
+    Args:
+        code (str): 要执行的Python代码字符串 (可能包含占位符如 'data.csv')
+        user_id (str): 当前用户的ID
+        session_id (str): 当前会话的ID
+        data_source_type (str): 数据源类型 ('csv', 'excel', 'mysql')
+        persistent_file_path (str | None): 数据文件相对于 src 的持久化路径 (仅文件类型需要)
+        image_id (str, optional): 图片的唯一ID
+        use_cache (bool): 相同代码在相同数据上执行过时直接返回缓存的结果
+
+    Returns:
+        tuple: (是否成功, 图片相对路径 | None, 文本输出)
+    """
+    plan, result = prepare_execution(code, user_id, session_id, data_source_type, persistent_file_path, image_id, use_cache)
+    if plan is None:
+        return result
+    return run_execution_plan(plan)
+
 def regenerate_chart(code, user_id: str, session_id: str, data_source_type: str, persistent_file_path: str | None = None):
     """重新生成图表或执行分析代码
 
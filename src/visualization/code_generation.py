@@ -3,6 +3,8 @@ import pandas as pd
 from autogen import ConversableAgent
 import uuid
 from src.visualization.code_execution import execute_code
+from src.utils.dataframe_cache import get_dataframe_cache
+from src.ai.response_cache import cached_generate_reply, dataset_fingerprint
 import streamlit as st
 import pymysql
 
@@ -31,8 +33,11 @@ config_list = [
 #     }
 # ]
 
-def generate_code(file_path, column_descriptions):
-    """生成可视化代码的函数 (处理直接文件路径输入)"""
+def generate_code(file_path, column_descriptions, fingerprint=None, use_cache=True):
+    """生成可视化代码的函数 (处理直接文件路径输入)
+
+    fingerprint 为数据集指纹，和提示一起构成回复缓存键；use_cache 为 False 时不使用缓存的回复。
+    """
     file_extension = os.path.splitext(file_path)[1].lower()
     try:
         if file_extension == '.csv':
@@ -98,11 +103,14 @@ Only output code; do NOT include ```python fences or any extra text.
         sample_data=df_sample.to_string(),
         file_read_code=file_read_code
     )
-    code_response = code_generator.generate_reply(messages=[{"role": "user", "content": data_info}])
+    code_response = cached_generate_reply(code_generator, [{"role": "user", "content": data_info}], fingerprint, use_cache)
     return code_response, None
 
-def generate_code_from_df(df, column_descriptions, persistent_file_path: str | None):
-    """从DataFrame生成可视化代码，根据数据源类型生成不同提示"""
+def generate_code_from_df(df, column_descriptions, persistent_file_path: str | None, fingerprint=None, use_cache=True):
+    """从DataFrame生成可视化代码，根据数据源类型生成不同提示
+
+    fingerprint 为数据集指纹，和提示一起构成回复缓存键；use_cache 为 False 时不使用缓存的回复。
+    """
     try:
         code_generator = ConversableAgent(
             "code_generator",
@@ -238,59 +246,75 @@ Only output code; do NOT include any other text or ```python fences.
         print("-" * 30)
 
         # --- 调用 LLM 生成代码 (保持不变) ---
-        code_response = code_generator.generate_reply(messages=[{"role": "user", "content": data_info}])
+        code_response = cached_generate_reply(code_generator, [{"role": "user", "content": data_info}], fingerprint, use_cache)
         return code_response, None
     except Exception as e:
         import traceback # 确保导入 traceback
         print(f"Error generating visualization code: {e}\\n{traceback.format_exc()}")
         return None, f"Error generating visualization code: {str(e)}" 
 
-def create_chart(user_id: str, session_id: str, column_descriptions, data_source_type: str, df=None, persistent_file_path=None):
-    """创建图表的函数
+def generate_chart_code(column_descriptions, data_source_type: str, df=None, persistent_file_path=None, df_cache_key=None, use_cache=True):
+    """为数据集生成初始可视化代码 (只请求模型，不执行代码)
 
     Args:
-        # ... (user_id, session_id, column_descriptions, df, persistent_file_path)
+        column_descriptions: 列描述
         data_source_type (str): 数据源类型 ('csv', 'excel', 'mysql')
-        
+        df (pd.DataFrame, optional): 数据集
+        persistent_file_path (str, optional): 文件类数据源的持久化路径
+        df_cache_key (tuple, optional): 进程内DataFrame缓存的键，命中时优先使用共享的数据集
+        use_cache (bool): False 时重新请求模型生成代码，不使用缓存的回复
+
     Returns:
-        tuple: (生成的代码, 图片相对路径, 结果信息)
+        tuple: (生成的代码, 错误信息)
     """
-    if not user_id or not session_id:
-         return None, None, "Creating a chart requires user_id and session_id"
-    
-    # --- 修改：移除对 df 和 persistent_file_path 同时存在的严格要求（因为 mysql 类型只有 df）---
-    # if df is not None and not persistent_file_path:
-    #      return None, None, "从 DataFrame 创建图表时需要提供 persistent_file_path"
-    
+    # --- 优先从进程内共享缓存读取数据集，避免各会话各自持有副本 ---
+    if df_cache_key is not None:
+        shared_df = get_dataframe_cache().get(df_cache_key)
+        if shared_df is not None:
+            df = shared_df
+
     # --- 新增：对 MySQL 类型的处理 --- 
     is_mysql = (data_source_type == 'mysql')
     if not is_mysql and not persistent_file_path:
-         return None, None, "File-based data source requires persistent_file_path"
+         return None, "File-based data source requires persistent_file_path"
     if df is None and not persistent_file_path: # Should not happen with current flow
-         return None, None, "A DataFrame or file path is required"
+         return None, "A DataFrame or file path is required"
+
+    fingerprint = dataset_fingerprint(df_cache_key)
+    # --- 修改：调用 generate_code* 函数时，传递必要的参数 ---
+    # generate_code_from_df/generate_code 现在也需要知道类型以使用正确的占位符
+    # 它们内部不再保存临时文件，而是直接构建 prompt
+    if df is not None: 
+        # 对于文件类型，需要路径来告知LLM如何读取；对于MySQL，路径为空
+        path_to_use_in_prompt = persistent_file_path if not is_mysql else None 
+        print(f"[create_chart] Generating code from DF. Type: {data_source_type}, Path for prompt: {path_to_use_in_prompt}")
+        code, error = generate_code_from_df(df, column_descriptions, path_to_use_in_prompt, fingerprint, use_cache) # Pass path only if file
+    else: # Only file path case
+        print(f"[create_chart] Generating code from file path: {persistent_file_path}")
+        code, error = generate_code(persistent_file_path, column_descriptions, fingerprint, use_cache)
+
+    if error: return None, error
+    if not code: return None, "Failed to generate visualization code"
+    return code, None
+
+def create_chart(user_id: str, session_id: str, column_descriptions, data_source_type: str, df=None, persistent_file_path=None, df_cache_key=None, use_cache=True):
+    """创建图表的函数 (生成代码后在当前线程执行)
 
-    try:
-        code = None
-        error = None
+    Args:
+        # ... (user_id, session_id, column_descriptions, df, persistent_file_path)
+        data_source_type (str): 数据源类型 ('csv', 'excel', 'mysql')
+        df_cache_key (tuple, optional): 进程内DataFrame缓存的键，命中时优先使用共享的数据集
+        use_cache (bool): False 时重新请求模型生成代码，不使用缓存的回复
         
-        # --- 修改：调用 generate_code* 函数时，传递必要的参数 ---
-        # generate_code_from_df/generate_code 现在也需要知道类型以使用正确的占位符
-        # 它们内部不再保存临时文件，而是直接构建 prompt
-        if df is not None: 
-            # 对于文件类型，需要路径来告知LLM如何读取；对于MySQL，路径为空
-            path_to_use_in_prompt = persistent_file_path if not is_mysql else None 
-            print(f"[create_chart] Generating code from DF. Type: {data_source_type}, Path for prompt: {path_to_use_in_prompt}")
-            # TODO: Refactor generate_code_from_df to accept type and path
-            # Assuming generate_code_from_df is updated or implicitly handles this via context passed earlier
-            code, error = generate_code_from_df(df, column_descriptions, persistent_file_path if not is_mysql else None) # Pass path only if file
-        elif persistent_file_path: # Only file path case
-            print(f"[create_chart] Generating code from file path: {persistent_file_path}")
-            code, error = generate_code(persistent_file_path, column_descriptions)
-        else:
-            return None, None, "Cannot determine how to generate code."
+    Returns:
+        tuple: (生成的代码, 图片相对路径, 结果信息)
+    """
+    if not user_id or not session_id:
+         return None, None, "Creating a chart requires user_id and session_id"
 
+    try:
+        code, error = generate_chart_code(column_descriptions, data_source_type, df, persistent_file_path, df_cache_key, use_cache)
         if error: return None, None, error
-        if not code: return None, None, "Failed to generate visualization code"
 
         # --- 修改：调用 execute_code 时传递 data_source_type 和 persistent_file_path --- 
         print(f"[create_chart] Generated code, attempting execution with type: {data_source_type}, path: {persistent_file_path}")
@@ -310,4 +334,4 @@ def create_chart(user_id: str, session_id: str, column_descriptions, data_source
     except Exception as e:
         import traceback
         print(f"Critical error when creating chart: {e}\n{traceback.format_exc()}")
-        return None, None, f"Error creating chart: {str(e)}"
\ No newline at end of file
+        return None, None, f"Error creating chart: {str(e)}"
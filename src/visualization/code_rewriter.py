@@ -0,0 +1,245 @@
+import ast
+import re
+import functools
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+from urllib.parse import quote_plus
+
+# 生成代码中的占位文件名
+CHART_PLACEHOLDERS = ("answer.png", "answer.svg")
+DATA_PLACEHOLDER_PATTERN = re.compile(r"data\.(csv|xls[xmb]?)")
+# savefig 的文件名参数为这些扩展名的字符串时改为目标图表路径
+_IMAGE_FILE_PATTERN = re.compile(r"[^/\\]+\.(png|svg|jpe?g|pdf|webp)", re.IGNORECASE)
+
+# 连接函数参数名 (包括 pymysql/mysql.connector 接受的别名) -> 连接信息字段
+_CONNECT_KEYWORDS = {
+    "host": "host",
+    "port": "port",
+    "user": "user",
+    "password": "password",
+    "passwd": "password",
+    "database": "database",
+    "db": "database",
+    "charset": "charset",
+}
+CONNECTION_FIELDS = ("host", "port", "user", "password", "database", "charset")
+# 位置参数依次对应的连接信息字段 (pymysql/MySQLdb 的参数顺序)
+_CONNECT_POSITIONAL_FIELDS = ("host", "user", "password", "database", "port")
+# 只重写这些 MySQL 连接函数 (按导入解析后的完整名称)，其他库的 connect (例如 sqlite3) 保持原样
+_MYSQL_CONNECT_FUNCTIONS = frozenset({
+    "pymysql.connect", "pymysql.Connect", "pymysql.Connection", "pymysql.connections.Connection",
+    "mysql.connector.connect", "mysql.connector.Connect", "mysql.connector.MySQLConnection",
+    "mysql.connector.connection.MySQLConnection", "mysql.connector.CMySQLConnection",
+})
+
+# 模板中待填入的值以占位字符串表示，渲染时替换为实际值的字面量
+_SLOT_TEMPLATE = "'@@autovis:{}@@'"
+_SLOT_PATTERN = re.compile(r"'@@autovis:([^'@]+)@@'")
+
+def _dotted_name(node: ast.AST) -> Optional[str]:
+    """返回调用对象的点分名称 (例如 mysql.connector.connect)，无法确定时返回 None"""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return ".".join(reversed(parts))
+    return None
+
+def _import_aliases(tree: ast.AST) -> Dict[str, str]:
+    """代码中导入的名字 -> 完整名称 (import pymysql as pm、from mysql.connector import connect 等)"""
+    aliases = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    aliases[alias.asname] = alias.name
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            for alias in node.names:
+                aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+    return aliases
+
+def _is_mysql_url(node: Optional[ast.AST]) -> bool:
+    return isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value.startswith("mysql")
+
+class _EditCollector(ast.NodeVisitor):
+    """找出需要替换的占位文件名、savefig 路径、数据路径和 MySQL 连接参数，记录为对原代码的按字节偏移的修改
+
+    只替换这些参数自身的源码片段 (或在参数列表末尾补上缺少的参数)，其余代码、注释和行号保持不变。
+    """
+
+    def __init__(self, source: bytes, tree: ast.AST, slots: FrozenSet[str]):
+        self.source = source
+        self.slots = slots
+        self.aliases = _import_aliases(tree)
+        self.edits: Dict[Tuple[int, int], str] = {}
+        self.has_chart_placeholder = False
+        self.savefig_candidates = []
+        self._line_starts = [0]
+        for line in source.splitlines(keepends=True):
+            self._line_starts.append(self._line_starts[-1] + len(line))
+
+    def _start(self, node: ast.AST) -> int:
+        return self._line_starts[node.lineno - 1] + node.col_offset
+
+    def _end(self, node: ast.AST) -> int:
+        return self._line_starts[node.end_lineno - 1] + node.end_col_offset
+
+    def _replace(self, node: ast.AST, slot: str) -> None:
+        self.edits[(self._start(node), self._end(node))] = _SLOT_TEMPLATE.format(slot)
+
+    def visit_JoinedStr(self, node: ast.JoinedStr) -> None:
+        # f-string 中的常量片段不是独立的字符串字面量，保持原样
+        return
+
+    def visit_Constant(self, node: ast.Constant) -> None:
+        if not isinstance(node.value, str):
+            return
+        if node.value in CHART_PLACEHOLDERS and "chart_path" in self.slots:
+            self.has_chart_placeholder = True
+            self._replace(node, "chart_path")
+        elif DATA_PLACEHOLDER_PATTERN.fullmatch(node.value) and "data_path" in self.slots:
+            self._replace(node, "data_path")
+
+    def visit_Call(self, node: ast.Call) -> None:
+        self.generic_visit(node)
+        name = _dotted_name(node.func) or ""
+        head, _, rest = name.partition(".")
+        resolved = self.aliases[head] + ("." + rest if rest else "") if head in self.aliases else name
+        function = name.rsplit(".", 1)[-1]
+        if function == "savefig" and "chart_path" in self.slots:
+            self._collect_savefig(node)
+        elif resolved in _MYSQL_CONNECT_FUNCTIONS:
+            self._rebind_connect(node)
+        elif function == "create_engine":
+            self._rebind_url(node, 0, "url")
+        elif function.startswith("read_sql"):
+            self._rebind_url(node, 1, "con")
+
+    def _collect_savefig(self, node: ast.Call) -> None:
+        candidates = node.args[:1] + [kw.value for kw in node.keywords if kw.arg == "fname"]
+        for arg in candidates:
+            if (isinstance(arg, ast.Constant) and isinstance(arg.value, str)
+                    and arg.value not in CHART_PLACEHOLDERS and _IMAGE_FILE_PATTERN.fullmatch(arg.value)):
+                self.savefig_candidates.append(arg)
+
+    def finish(self) -> None:
+        """代码没有使用占位文件名时，只把第一个以图片文件名调用的 savefig 改为目标图表路径"""
+        if not self.has_chart_placeholder and self.savefig_candidates:
+            self._replace(min(self.savefig_candidates, key=self._start), "chart_path")
+
+    def _rebind_url(self, node: ast.Call, position: int, keyword: str) -> None:
+        if not {"host", "user", "database"} <= self.slots:
+            return
+        # 保留原连接串的驱动部分 (例如 mysql+pymysql)
+        if len(node.args) > position and _is_mysql_url(node.args[position]):
+            self._replace(node.args[position], "url:" + node.args[position].value.split("://", 1)[0])
+        for kw in node.keywords:
+            if kw.arg == keyword and _is_mysql_url(kw.value):
+                self._replace(kw.value, "url:" + kw.value.value.split("://", 1)[0])
+
+    def _rebind_connect(self, node: ast.Call) -> None:
+        present = set()
+        for field, arg in zip(_CONNECT_POSITIONAL_FIELDS, node.args):
+            if isinstance(arg, ast.Starred):
+                break
+            present.add(field)
+            if field in self.slots:
+                self._replace(arg, field)
+        for kw in node.keywords:
+            field = _CONNECT_KEYWORDS.get(kw.arg)
+            if field:
+                present.add(field)
+                if field in self.slots:
+                    self._replace(kw.value, field)
+        if any(isinstance(arg, ast.Starred) for arg in node.args) or any(kw.arg is None for kw in node.keywords):
+            # 使用 *args/**config 传参时只替换显式写出的参数，避免重复的参数
+            return
+        missing = [field for field in CONNECTION_FIELDS if field in self.slots and field not in present]
+        if not missing:
+            return
+        arguments = node.args + [kw.value for kw in node.keywords]
+        if arguments:
+            position = max(self._end(arg) for arg in arguments)
+            prefix = ", "
+        else:
+            position = self.source.index(b"(", self._end(node.func)) + 1
+            prefix = ""
+        self.edits[(position, position)] = prefix + ", ".join(f"{field}={_SLOT_TEMPLATE.format(field)}" for field in missing)
+
+@functools.lru_cache(maxsize=256)
+def _build_template(code: str, slots: FrozenSet[str]) -> Optional[str]:
+    """在原代码中把需要替换的参数改为占位槽 (按代码和可用的槽缓存，重复执行同一代码时不再解析)
+
+    Returns:
+        str | None: 模板代码，代码无法解析时返回 None
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    source = code.encode("utf-8")  # AST 的列偏移以 UTF-8 字节计
+    collector = _EditCollector(source, tree, slots)
+    collector.visit(tree)
+    collector.finish()
+    for (start, end), text in sorted(collector.edits.items(), reverse=True):
+        source = source[:start] + text.encode("utf-8") + source[end:]
+    return source.decode("utf-8")
+
+def _mysql_url(scheme: str, connection_info: Dict[str, Any]) -> str:
+    url = f"{scheme}://{quote_plus(str(connection_info['user']))}:{quote_plus(str(connection_info.get('password', '')))}@{connection_info['host']}"
+    if connection_info.get("port"):
+        url += f":{connection_info['port']}"
+    url += f"/{connection_info['database']}"
+    if connection_info.get("charset"):
+        url += f"?charset={connection_info['charset']}"
+    return url
+
+def rewrite_code(code: str, chart_path: Optional[str] = None, data_path: Optional[str] = None,
+                 connection_info: Optional[Dict[str, Any]] = None) -> str:
+    """把生成代码中的占位文件名、图表保存路径、数据路径和数据库连接参数替换为实际值
+
+    一次 AST 遍历找出所有替换位置，只改写这些参数在原代码中的片段 (注释、格式和行号不变):
+        - 'answer.png'/'answer.svg' 字符串 -> chart_path；代码没有占位文件名时，第一个 savefig 的图片文件名参数 -> chart_path
+        - 'data.csv'/'data.xlsx' 等字符串 (包括 read_csv/read_excel 的参数) -> data_path
+        - pymysql/mysql.connector 连接函数的 host/port/user/password/database/charset 参数，
+          包括按位置传入的参数 (缺少的参数以关键字参数补上)
+        - create_engine/read_sql 中的 mysql:// 连接串
+
+    Args:
+        code: 生成的代码
+        chart_path: 图表保存路径 (相对于执行目录)
+        data_path: 数据文件路径 (相对于执行目录)
+        connection_info: MySQL 连接信息
+
+    Returns:
+        str: 替换后的代码；代码有语法错误时原样返回 (执行时报告错误)
+    """
+    values: Dict[str, Any] = {}
+    if chart_path:
+        values["chart_path"] = chart_path
+    if data_path:
+        values["data_path"] = data_path
+    for field in CONNECTION_FIELDS:
+        if connection_info and connection_info.get(field) not in (None, ""):
+            values[field] = int(connection_info[field]) if field == "port" else connection_info[field]
+    if connection_info and "password" in connection_info and "password" not in values:
+        values["password"] = connection_info["password"] or ""
+
+    template = _build_template(code, frozenset(values))
+    if template is None:
+        print("[Code Rewriter] 代码无法解析，跳过参数替换")
+        return code
+
+    def render(match: re.Match) -> str:
+        name = match.group(1)
+        if name.startswith("url:"):
+            return repr(_mysql_url(name[4:], connection_info))
+        return repr(values[name])
+
+    return _SLOT_PATTERN.sub(render, template)
+
+def rewrite_cache_info() -> Tuple[int, int, int]:
+    """返回模板缓存的 (命中数, 未命中数, 条目数)"""
+    info = _build_template.cache_info()
+    return info.hits, info.misses, info.currsize
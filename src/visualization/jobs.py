@@ -0,0 +1,161 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from src.visualization.code_execution import prepare_execution, run_execution_plan
+from src.visualization.scheduler import get_execution_scheduler
+
+# 执行任务的状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+# 后台线程数上限 (线程大部分时间在调度器中排队或等待工作进程，真正的并发由调度器控制)
+JOB_THREADS = int(os.environ.get("AUTOVIS_JOB_THREADS", 32))
+# 已结束的任务保留多久 (秒)，页面在此之前取走结果
+JOB_RETENTION_SECONDS = int(os.environ.get("AUTOVIS_JOB_RETENTION", 3600))
+# 页面上任务片段刷新状态和输出的间隔 (秒)
+JOB_POLL_INTERVAL_SECONDS = float(os.environ.get("AUTOVIS_JOB_POLL_INTERVAL", 0.5))
+
+class ExecutionJob:
+    """一次后台代码执行：状态、陆续收到的输出和最终结果"""
+
+    def __init__(self, job_id: str, user_id: str, session_id: str):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.session_id = session_id
+        self.status = JOB_QUEUED
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[tuple] = None
+        self.cancel_event = threading.Event()
+        self._output: List[str] = []
+        self._lock = threading.Lock()
+
+    def append_output(self, text: str) -> None:
+        with self._lock:
+            self._output.append(text)
+
+    def mark_started(self) -> None:
+        with self._lock:
+            self.status = JOB_RUNNING
+            self.started_at = time.time()
+
+    def finish(self, result: tuple) -> None:
+        with self._lock:
+            self.result = result
+            if result[0]:
+                self.status = JOB_SUCCEEDED
+            else:
+                self.status = JOB_CANCELLED if self.cancel_event.is_set() else JOB_FAILED
+            self.finished_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回任务当前状态的副本 (供页面渲染)"""
+        with self._lock:
+            now = self.finished_at or time.time()
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "output": "".join(self._output),
+                "result": self.result,
+                "queued_seconds": (self.started_at or now) - self.submitted_at,
+                "running_seconds": now - self.started_at if self.started_at else 0.0,
+            }
+
+class JobManager:
+    """在后台线程中执行代码，页面通过任务ID轮询状态，不再阻塞 Streamlit 脚本线程"""
+
+    def __init__(self, max_threads: int = JOB_THREADS, retention_seconds: int = JOB_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="autovis-job")
+        self._jobs: Dict[str, ExecutionJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, code, user_id: str, session_id: str, data_source_type: str, persistent_file_path: str | None = None, image_id=None, use_cache: bool = True) -> str:
+        """提交代码执行，立即返回任务ID
+
+        路径替换等准备工作在调用线程中完成 (需要读取 st.session_state)，命中缓存时任务直接结束。
+        参数与 execute_code 相同。
+
+        Returns:
+            str: 任务ID
+        """
+        job = ExecutionJob(uuid.uuid4().hex, str(user_id), str(session_id))
+        self._purge_finished()
+        with self._lock:
+            self._jobs[job.job_id] = job
+        plan, result = prepare_execution(code, user_id, session_id, data_source_type, persistent_file_path, image_id, use_cache)
+        if plan is None:
+            job.finish(result)
+        else:
+            self._executor.submit(self._run, job, plan)
+        print(f"[Jobs] 提交任务 {job.job_id} (用户 {job.user_id})")
+        return job.job_id
+
+    def _run(self, job: ExecutionJob, plan: Dict[str, Any]) -> None:
+        try:
+            result = run_execution_plan(plan, on_output=job.append_output, on_start=job.mark_started, cancel_event=job.cancel_event)
+        except Exception as e:
+            result = (False, None, f"Critical error during code execution: {e}")
+        job.finish(result)
+        print(f"[Jobs] 任务 {job.job_id} 结束: {job.status}")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态
+
+        Returns:
+            Dict | None: 任务快照 (status, output, result 等)，任务不存在或已过期时返回 None
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        snapshot = job.snapshot()
+        if snapshot["status"] == JOB_QUEUED:
+            snapshot["queue_depth"] = get_execution_scheduler().queue_depth()
+        return snapshot
+
+    def cancel(self, job_id: str) -> bool:
+        """请求取消任务：排队中的任务不再执行，执行中的任务终止工作进程
+
+        Returns:
+            bool: 任务存在且尚未结束时返回 True
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        job.cancel_event.set()
+        print(f"[Jobs] 取消任务 {job_id}")
+        return True
+
+    def discard(self, job_id: str) -> None:
+        """页面取走结果后删除任务"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _purge_finished(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    """获取进程内唯一的任务管理器 (所有 Streamlit 会话共享)"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
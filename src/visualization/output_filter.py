@@ -0,0 +1,106 @@
+import re
+from typing import List
+
+# 需要从执行输出中去掉的行：警告 (包括 UserWarning/FutureWarning 等)、字体查找日志、
+# 警告信息中回显的 pd.read_sql(/plt.tight_layout() 代码行，以及以 plt.savefig( 开头的行
+# 只包含字面量的分支可以让正则引擎按首字符快速跳过，对整块输出只扫描一遍；plt.savefig( 命中后再检查是否在行首
+_FILTERED_LINE_PATTERN = re.compile(r"Warning:|findfont:|pd\.read_sql\(|plt\.tight_layout\(\)|plt\.savefig\(")
+_LINE_START_ONLY = "plt.savefig("
+_BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+# str.splitlines 识别的换行符
+_LINE_BREAKS = frozenset("\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029")
+
+class WarningFilter:
+    """按块过滤执行输出中的警告行，结果与逐行过滤整段输出一致
+
+    输出可以在执行过程中分块送入 (块的边界可以落在一行中间或 \\r\\n 之间)，
+    feed 返回本块中已确定保留的完整行，finish 返回整段过滤后的文本。
+    """
+
+    def __init__(self):
+        self._partial = ""
+        self._kept: List[str] = []
+        self.total_lines = 0
+
+    @property
+    def kept_lines(self) -> int:
+        return len(self._kept)
+
+    def feed(self, chunk: str) -> str:
+        """送入一块输出
+
+        Args:
+            chunk: 新的输出片段
+
+        Returns:
+            str: 本块中保留下来的完整行 (每行以换行结尾)，用于执行过程中的实时显示
+        """
+        if not chunk:
+            return ""
+        data = self._partial + chunk
+        lines = data.splitlines()
+        if data[-1] == "\r":
+            # 可能是 \r\n 的前半部分，等下一块确定换行方式
+            self._partial = lines.pop() + "\r"
+        elif data[-1] not in _LINE_BREAKS:
+            self._partial = lines.pop()
+        else:
+            self._partial = ""
+        return self._filter_lines(lines)
+
+    def _filter_lines(self, lines: List[str]) -> str:
+        self.total_lines += len(lines)
+        if not lines:
+            return ""
+        block = "\n".join(lines)
+        dropped = set()
+        line_number = 0
+        scanned = 0
+        for match in _FILTERED_LINE_PATTERN.finditer(block):
+            start = match.start()
+            line_number += block.count("\n", scanned, start)
+            scanned = start
+            if line_number in dropped:
+                continue
+            if match.group() == _LINE_START_ONLY:
+                line_start = block.rfind("\n", 0, start) + 1
+                if line_start != start and not block[line_start:start].isspace():
+                    continue
+            dropped.add(line_number)
+        kept = lines
+        if dropped:
+            kept = []
+            previous = 0
+            for number in sorted(dropped):
+                kept.extend(lines[previous:number])
+                previous = number + 1
+            kept.extend(lines[previous:])
+        self._kept.extend(kept)
+        return "\n".join(kept) + "\n" if kept else ""
+
+    def finish(self) -> str:
+        """处理剩余的不完整行，返回整段过滤后的文本 (连续空行合并为一个，去掉首尾空白)"""
+        if self._partial:
+            self._filter_lines(self._partial.splitlines())
+            self._partial = ""
+        text = "\n".join(self._kept)
+        if "\n\n\n" in text:
+            text = _BLANK_LINES_PATTERN.sub("\n\n", text)
+        return text.strip()
+
+def filter_warnings(output_text: str) -> str:
+    """过滤掉输出中的警告信息
+
+    Args:
+        output_text (str): 原始输出文本
+
+    Returns:
+        str: 过滤后的文本
+    """
+    if not output_text:
+        return ""
+    warning_filter = WarningFilter()
+    warning_filter.feed(output_text)
+    filtered_text = warning_filter.finish()
+    print(f"[filter_warnings] 过滤完成，原始行数: {warning_filter.total_lines}, 过滤后行数: {warning_filter.kept_lines}")
+    return filtered_text
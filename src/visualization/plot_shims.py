@@ -0,0 +1,240 @@
+"""沙箱中的绘图降采样
+
+生成的代码经常把每一行数据都画出来，百万点的折线/散点图会生成上百MB的SVG。这里替换
+matplotlib Axes 的 plot/scatter/bar 方法，点数超过阈值时:
+    - 折线: LTTB (Largest-Triangle-Three-Buckets) 降采样，保留形状特征
+    - 散点: 改为 hexbin 密度图 (有数值颜色时按格取均值)，非数值数据随机抽样
+    - 数值横轴的柱状图: 按等宽区间分桶取均值
+并在图的右下角注明做了什么缩减。
+"""
+import os
+import re
+import sys
+import functools
+import warnings
+import numpy as np
+
+# 折线点数超过该值时降采样到 LINE_TARGET_POINTS
+LINE_POINT_THRESHOLD = int(os.environ.get("AUTOVIS_PLOT_LINE_POINTS", 10_000))
+LINE_TARGET_POINTS = int(os.environ.get("AUTOVIS_PLOT_LINE_TARGET", 4_000))
+# 散点数超过该值时改为密度图
+SCATTER_POINT_THRESHOLD = int(os.environ.get("AUTOVIS_PLOT_SCATTER_POINTS", 20_000))
+SCATTER_GRIDSIZE = 100
+# 数值横轴的柱子数超过该值时分桶
+BAR_COUNT_THRESHOLD = int(os.environ.get("AUTOVIS_PLOT_BAR_COUNT", 1_000))
+BAR_BUCKETS = 200
+
+# 降采样参数变化后，缓存的执行结果不再复用
+PLOT_SHIM_SETTINGS = f"line{LINE_POINT_THRESHOLD}>{LINE_TARGET_POINTS}/scatter{SCATTER_POINT_THRESHOLD}/bar{BAR_COUNT_THRESHOLD}>{BAR_BUCKETS}"
+
+_NOTE_ATTR = "_autovis_reduction_notes"
+# 查找用户代码的调用行时跳过的模块 (与 matplotlib._api.warn_external 相同，另外跳过沙箱替换模块自身)
+_SKIPPED_FRAME_MODULES = re.compile(r"\A(matplotlib|mpl_toolkits)(\Z|\.)|\Asrc\.visualization\.(plot_shims|chart_format)\Z")
+_SHIM_FILES = frozenset(os.path.join(os.path.dirname(os.path.abspath(__file__)), name) for name in ("plot_shims.py", "chart_format.py"))
+# 重新发出其它位置的警告时使用的去重记录 (代替原位置模块的 __warningregistry__)
+_REEMIT_REGISTRY: dict = {}
+
+def warnings_at_caller(shim):
+    """让替换方法中产生的警告仍然指向用户代码的调用行
+
+    matplotlib 把警告归到第一个不属于 matplotlib 的栈帧，替换后这会是沙箱模块自身，输出中回显的代码行也随之改变
+    (输出过滤按 plt.savefig( 等回显行过滤)。这里把归到沙箱模块的警告改为在调用处重新发出，与替换前一致。
+    """
+    @functools.wraps(shim)
+    def wrapper(*args, **kwargs):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            result = shim(*args, **kwargs)
+        if not caught:
+            return result
+        frame = sys._getframe(1)
+        while frame.f_back is not None and _SKIPPED_FRAME_MODULES.match(frame.f_globals.get("__name__", "")):
+            frame = frame.f_back
+        for warning in caught:
+            if os.path.abspath(warning.filename) in _SHIM_FILES:
+                warnings.warn_explicit(warning.message, warning.category, frame.f_code.co_filename, frame.f_lineno,
+                                       module=frame.f_globals.get("__name__"), registry=frame.f_globals.setdefault("__warningregistry__", {}),
+                                       module_globals=frame.f_globals)
+            else:
+                warnings.warn_explicit(warning.message, warning.category, warning.filename, warning.lineno, registry=_REEMIT_REGISTRY)
+        return result
+    return wrapper
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets 降采样，返回保留的点的下标
+
+    首尾点总是保留；中间的点分为 n_out-2 个桶，每个桶选与上一个选中点和下一个桶均值构成三角形面积最大的点。
+
+    Args:
+        x: 横坐标 (float)
+        y: 纵坐标 (float，可以有 NaN)
+        n_out: 保留的点数
+
+    Returns:
+        np.ndarray: 递增的下标
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        if next_end <= next_start:
+            next_start, next_end = n - 1, n
+        with np.errstate(invalid="ignore"):
+            avg_x = x[next_start:next_end].mean()
+            avg_y = np.nanmean(y[next_start:next_end]) if not np.isnan(y[next_start:next_end]).all() else y[a]
+            area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0))) if end > start else start
+        selected[i + 1] = a
+    return selected
+
+def _as_1d(values):
+    """转为一维 ndarray，无法转换或不是一维时返回 None"""
+    if values is None or isinstance(values, str):
+        return None
+    try:
+        array = np.asarray(values)
+    except Exception:
+        return None
+    return array if array.ndim == 1 else None
+
+def _numeric_positions(array: np.ndarray):
+    """把数值/时间数组转为 float，用于计算；其它类型返回 None"""
+    if np.issubdtype(array.dtype, np.datetime64):
+        return array.astype("datetime64[ns]").astype(np.int64).astype(float)
+    if np.issubdtype(array.dtype, np.number) or array.dtype == bool:
+        return array.astype(float)
+    return None
+
+def _annotate(ax, note: str) -> None:
+    """在图的右下角注明缩减方式 (同一坐标轴的多次缩减合并为一条说明)"""
+    notes = getattr(ax, _NOTE_ATTR, None)
+    if notes is None:
+        notes = []
+        setattr(ax, _NOTE_ATTR, notes)
+        ax._autovis_note_artist = ax.text(0.995, 0.005, "", transform=ax.transAxes, ha="right", va="bottom",
+                                          fontsize=7, color="gray", alpha=0.9, zorder=10)
+    if note not in notes:
+        notes.append(note)
+    ax._autovis_note_artist.set_text("\n".join(notes))
+
+def _shim_plot(original):
+    def plot(self, *args, **kwargs):
+        if "data" in kwargs or not args or len(args) > 3:
+            return original(self, *args, **kwargs)
+        fmt = args[-1] if isinstance(args[-1], str) else None
+        series = args[:-1] if fmt is not None else args
+        if len(series) == 1:
+            x_values, y_values = None, _as_1d(series[0])
+        elif len(series) == 2:
+            x_values, y_values = _as_1d(series[0]), _as_1d(series[1])
+        else:
+            return original(self, *args, **kwargs)
+        if y_values is None or len(y_values) <= LINE_POINT_THRESHOLD:
+            return original(self, *args, **kwargs)
+        if len(series) == 2 and (x_values is None or len(x_values) != len(y_values)):
+            return original(self, *args, **kwargs)
+        y_numeric = _numeric_positions(y_values)
+        if y_numeric is None:
+            return original(self, *args, **kwargs)
+        x_numeric = _numeric_positions(x_values) if x_values is not None else None
+        if x_numeric is None:
+            x_numeric = np.arange(len(y_values), dtype=float)
+        keep = lttb_indices(x_numeric, y_numeric, LINE_TARGET_POINTS)
+        # 只传 y 时横坐标是下标，降采样后需要显式给出原来的下标
+        reduced = (keep, y_values[keep]) if x_values is None else (x_values[keep], y_values[keep])
+        if fmt is not None:
+            reduced += (fmt,)
+        lines = original(self, *reduced, **kwargs)
+        _annotate(self, f"Downsampled: {len(y_values):,} → {len(keep):,} points per line (LTTB)")
+        return lines
+    return plot
+
+def _single_color(c) -> bool:
+    if c is None or isinstance(c, str):
+        return True
+    array = _as_1d(c)
+    return array is not None and len(array) in (3, 4) and np.issubdtype(array.dtype, np.number) and array.max() <= 1
+
+def _shim_scatter(original):
+    def scatter(self, *args, **kwargs):
+        if "data" in kwargs or len(args) < 2 or len(args) > 4:
+            return original(self, *args, **kwargs)
+        x_values, y_values = _as_1d(args[0]), _as_1d(args[1])
+        if x_values is None or y_values is None or len(x_values) != len(y_values) or len(x_values) <= SCATTER_POINT_THRESHOLD:
+            return original(self, *args, **kwargs)
+        n = len(x_values)
+        # 密度图不使用点的大小 (args[2]/s)
+        colors = args[3] if len(args) > 3 else kwargs.get("c", kwargs.get("color"))
+        x_numeric, y_numeric = _numeric_positions(x_values), _numeric_positions(y_values)
+        color_values = None if _single_color(colors) else _as_1d(colors)
+        color_numeric = _numeric_positions(color_values) if color_values is not None else None
+        if (x_numeric is None or y_numeric is None or np.issubdtype(x_values.dtype, np.datetime64)
+                or np.issubdtype(y_values.dtype, np.datetime64) or (color_values is not None and color_numeric is None)):
+            # 分类或时间坐标、按颜色名着色等情况无法做密度图，随机抽样
+            keep = np.sort(np.random.default_rng(0).choice(n, SCATTER_POINT_THRESHOLD, replace=False))
+            reduced_args = [np.asarray(arg)[keep] if _as_1d(arg) is not None and len(_as_1d(arg)) == n else arg for arg in args]
+            reduced_kwargs = {key: (np.asarray(value)[keep] if key in ("s", "c", "color", "edgecolors", "linewidths")
+                                    and _as_1d(value) is not None and len(_as_1d(value)) == n else value)
+                              for key, value in kwargs.items()}
+            collection = original(self, *reduced_args, **reduced_kwargs)
+            _annotate(self, f"Sampled: {SCATTER_POINT_THRESHOLD:,} of {n:,} points shown")
+            return collection
+        hexbin_kwargs = {key: kwargs[key] for key in ("alpha", "label", "norm", "vmin", "vmax", "zorder", "cmap") if key in kwargs}
+        hexbin_kwargs.update(gridsize=SCATTER_GRIDSIZE, mincnt=1)
+        if color_numeric is not None:
+            hexbin_kwargs.update(C=color_numeric, reduce_C_function=np.nanmean)
+            note = f"Binned: {n:,} points shown as hexagon means of color value"
+        else:
+            if "cmap" not in hexbin_kwargs:
+                from matplotlib.colors import LinearSegmentedColormap, to_rgba
+                base = to_rgba(colors if colors is not None else "C0")
+                hexbin_kwargs["cmap"] = LinearSegmentedColormap.from_list("autovis_density", [(1, 1, 1, 1), base])
+            note = f"Binned: {n:,} points shown as density (hexbin)"
+        collection = self.hexbin(x_numeric, y_numeric, **hexbin_kwargs)
+        _annotate(self, note)
+        return collection
+    return scatter
+
+def _shim_bar(original):
+    def bar(self, x, height, *args, **kwargs):
+        if "data" in kwargs or args:
+            return original(self, x, height, *args, **kwargs)
+        x_values, heights = _as_1d(x), _as_1d(height)
+        if (x_values is None or heights is None or len(x_values) != len(heights) or len(x_values) <= BAR_COUNT_THRESHOLD
+                or not np.issubdtype(x_values.dtype, np.number) or _numeric_positions(heights) is None):
+            return original(self, x, height, *args, **kwargs)
+        x_numeric = x_values.astype(float)
+        height_numeric = heights.astype(float)
+        finite = np.isfinite(x_numeric) & np.isfinite(height_numeric)
+        x_numeric, height_numeric = x_numeric[finite], height_numeric[finite]
+        if len(x_numeric) == 0 or x_numeric.min() == x_numeric.max():
+            return original(self, x, height, *args, **kwargs)
+        edges = np.linspace(x_numeric.min(), x_numeric.max(), BAR_BUCKETS + 1)
+        bucket = np.clip(np.searchsorted(edges, x_numeric, side="right") - 1, 0, BAR_BUCKETS - 1)
+        counts = np.bincount(bucket, minlength=BAR_BUCKETS)
+        sums = np.bincount(bucket, weights=height_numeric, minlength=BAR_BUCKETS)
+        non_empty = counts > 0
+        centers = (edges[:-1] + edges[1:]) / 2
+        bar_kwargs = {key: value for key, value in kwargs.items()
+                      if key not in ("width", "bottom", "tick_label", "align") and not (_as_1d(value) is not None and len(_as_1d(value)) == len(x_values))}
+        container = original(self, centers[non_empty], sums[non_empty] / counts[non_empty], width=edges[1] - edges[0], align="center", **bar_kwargs)
+        _annotate(self, f"Bucketed: {len(x_values):,} bars → {int(non_empty.sum()):,} (mean per bucket)")
+        return container
+    return bar
+
+def install_plot_shims() -> None:
+    """替换 matplotlib Axes 的 plot/scatter/bar (重复调用无副作用)"""
+    from matplotlib.axes import Axes
+    if getattr(Axes, "_autovis_shims_installed", False):
+        return
+    Axes.plot = warnings_at_caller(_shim_plot(Axes.plot))
+    Axes.scatter = warnings_at_caller(_shim_scatter(Axes.scatter))
+    Axes.bar = warnings_at_caller(_shim_bar(Axes.bar))
+    Axes._autovis_shims_installed = True
@@ -0,0 +1,185 @@
+import io
+import os
+import ast
+import hashlib
+import threading
+import tokenize
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# 结果缓存的条目数和字节数上限 (字节数按输出文本和图片文件大小计算)
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("AUTOVIS_RESULT_CACHE_ENTRIES", 512))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("AUTOVIS_RESULT_CACHE_BYTES", 256 * 1024 ** 2))
+
+# 使用随机数或当前时间的代码每次执行结果不同，不缓存：
+# 引用了这些名字 (模块、属性或导入的名字) 的代码，例如 np.random.normal、random.choice、from numpy.random import default_rng
+_NONDETERMINISTIC_NAMES = frozenset({"random", "secrets", "default_rng", "RandomState", "Generator"})
+# 调用这些函数或方法的代码，例如 df.sample()、datetime.now()、time.time()、uuid.uuid4()
+_NONDETERMINISTIC_CALLS = frozenset({
+    "rand", "randn", "randint", "choice", "shuffle", "sample", "permutation",
+    "now", "today", "utcnow", "time", "time_ns", "perf_counter", "monotonic",
+    "uuid1", "uuid4", "urandom", "token_hex",
+})
+
+def normalize_code(code: str) -> str:
+    """去掉注释、空行和缩进宽度等不影响执行结果的差异
+
+    Args:
+        code: Python 代码
+
+    Returns:
+        str: 规范化后的代码文本 (仅用于计算哈希)
+    """
+    ignored = {tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER}
+    try:
+        tokens = tokenize.generate_tokens(io.StringIO(code).readline)
+        return "\x00".join(
+            f"{token.type}" if token.type in (tokenize.INDENT, tokenize.DEDENT, tokenize.NEWLINE) else token.string
+            for token in tokens if token.type not in ignored
+        )
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return code.strip()
+
+def code_hash(code: str) -> str:
+    """规范化代码的哈希"""
+    return hashlib.sha256(normalize_code(code).encode("utf-8")).hexdigest()
+
+def _call_name(node: ast.Call) -> Optional[str]:
+    """被调用函数的最后一段名字 (np.random.normal → normal)"""
+    func = node.func
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    if isinstance(func, ast.Name):
+        return func.id
+    return None
+
+def is_cacheable_code(code: str) -> bool:
+    """代码中没有随机数、当前时间等不确定因素时才缓存结果
+
+    遍历语法树：引用 random 等名字 (np.random.*、random.*、default_rng 及其导入) 或调用取当前时间、随机抽样的函数时不缓存。
+    无法解析的代码不缓存。
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in _NONDETERMINISTIC_NAMES:
+            return False
+        if isinstance(node, ast.Attribute) and node.attr in _NONDETERMINISTIC_NAMES:
+            return False
+        if isinstance(node, ast.alias) and _NONDETERMINISTIC_NAMES.intersection(node.name.split(".")):
+            return False
+        if isinstance(node, ast.ImportFrom) and node.module and _NONDETERMINISTIC_NAMES.intersection(node.module.split(".")):
+            return False
+        if isinstance(node, ast.Call) and _call_name(node) in _NONDETERMINISTIC_CALLS:
+            return False
+    return True
+
+class _CachedResult:
+    def __init__(self, image_full_path: Optional[str], output: str, nbytes: int):
+        self.image_full_path = image_full_path
+        self.output = output
+        self.nbytes = nbytes
+
+class ExecutionResultCache:
+    """按 (代码哈希, 数据集内容哈希, 渲染设置) 缓存成功的代码执行结果
+
+    命中时直接返回已生成图片的绝对路径和过滤后的输出，不启动任何执行；调用方把图片链接到请求方自己的会话目录后使用。
+    图片文件已被删除 (例如会话被删除) 的条目视为未命中。
+    超出条目数或字节数上限时按LRU顺序淘汰。
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, _CachedResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Tuple[Optional[str], str]]:
+        """查找缓存的执行结果
+
+        Args:
+            key: make_result_cache_key 生成的键
+
+        Returns:
+            Tuple[str | None, str] | None: (图片绝对路径, 过滤后的输出)，未命中时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.image_full_path and not os.path.exists(entry.image_full_path):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.image_full_path, entry.output
+
+    def put(self, key: Hashable, image_full_path: Optional[str], output: str) -> None:
+        """保存成功的执行结果
+
+        Args:
+            key: 缓存键
+            image_full_path: 图片的绝对路径 (没有生成图片时为 None)，命中时从这里链接，并用于检查文件是否仍然存在
+            output: 过滤后的文本输出
+        """
+        nbytes = len(output.encode("utf-8"))
+        if image_full_path and os.path.exists(image_full_path):
+            nbytes += os.path.getsize(image_full_path)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _CachedResult(image_full_path, output, nbytes)
+            self._total_bytes += nbytes
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        # 调用方需持有 self._lock
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存命中率、占用等指标"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+_cache_instance: Optional[ExecutionResultCache] = None
+_cache_instance_lock = threading.Lock()
+
+def get_result_cache() -> ExecutionResultCache:
+    """获取进程内唯一的执行结果缓存"""
+    global _cache_instance
+    with _cache_instance_lock:
+        if _cache_instance is None:
+            _cache_instance = ExecutionResultCache()
+        return _cache_instance
+
+def make_result_cache_key(code: str, dataset_hash: str, render_settings: str) -> tuple:
+    """构造执行结果缓存键
+
+    Args:
+        code: 未替换路径的原始代码
+        dataset_hash: 数据集内容哈希 (文件内容哈希或MySQL缓存键的哈希)
+        render_settings: 渲染设置的标识 (字体、图片格式等)
+
+    Returns:
+        tuple: 缓存键
+    """
+    return (code_hash(code), dataset_hash, render_settings)
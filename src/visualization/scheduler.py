@@ -0,0 +1,112 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional, TypeVar
+
+from src.visualization.worker_pool import EXECUTOR_MODE, WORKER_POOL_SIZE
+
+T = TypeVar("T")
+
+# 同时执行的代码数上限，默认等于CPU核数；使用工作进程池时不超过池的大小，让等待发生在公平队列中而不是进程池内部
+MAX_CONCURRENT_EXECUTIONS = int(os.environ.get(
+    "AUTOVIS_MAX_CONCURRENT_EXECUTIONS",
+    min(os.cpu_count() or 1, WORKER_POOL_SIZE) if EXECUTOR_MODE == "pool" else (os.cpu_count() or 1),
+))
+# 统计等待时间使用的最近执行数
+WAIT_TIME_WINDOW = 200
+
+class _Ticket:
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.enqueued_at = time.perf_counter()
+        self.ready = threading.Event()
+
+class ExecutionScheduler:
+    """代码执行调度器：全局并发上限 + 按用户轮转的FIFO队列
+
+    每个用户有自己的FIFO队列，有空闲名额时按用户轮流放行队首的请求，
+    一个用户连续提交多次执行不会让其他用户的请求一直排在后面。
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_EXECUTIONS):
+        self.max_concurrent = max(1, max_concurrent)
+        self._lock = threading.Lock()
+        # 用户ID -> 等待中的请求；字典顺序即轮转顺序
+        self._queues: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self._running = 0
+        self._wait_times: Deque[float] = deque(maxlen=WAIT_TIME_WINDOW)
+        self.completed = 0
+
+    def run(self, user_id: str, fn: Callable[[], T]) -> T:
+        """排队等待执行名额，然后调用 fn
+
+        Args:
+            user_id: 提交执行的用户ID，用于公平调度
+            fn: 实际执行代码的函数
+
+        Returns:
+            fn 的返回值
+        """
+        ticket = _Ticket(str(user_id))
+        with self._lock:
+            self._queues.setdefault(ticket.user_id, deque()).append(ticket)
+            self._dispatch()
+        ticket.ready.wait()
+        wait_seconds = time.perf_counter() - ticket.enqueued_at
+        if wait_seconds > 0.1:
+            print(f"[Scheduler] 用户 {ticket.user_id} 排队 {wait_seconds:.2f}s {self.stats()}")
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                self._dispatch()
+
+    def _dispatch(self) -> None:
+        # 调用方需持有 self._lock
+        while self._running < self.max_concurrent and self._queues:
+            user_id, tickets = next(iter(self._queues.items()))
+            ticket = tickets.popleft()
+            # 被放行的用户移到轮转顺序末尾
+            del self._queues[user_id]
+            if tickets:
+                self._queues[user_id] = tickets
+            self._running += 1
+            self._wait_times.append(time.perf_counter() - ticket.enqueued_at)
+            ticket.ready.set()
+
+    def queue_depth(self, user_id: Optional[str] = None) -> int:
+        """等待中的请求数 (指定 user_id 时只统计该用户)"""
+        with self._lock:
+            if user_id is not None:
+                return len(self._queues.get(str(user_id), ()))
+            return sum(len(tickets) for tickets in self._queues.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """返回队列深度、运行数和最近的等待时间"""
+        with self._lock:
+            waits = sorted(self._wait_times)
+            return {
+                "max_concurrent": self.max_concurrent,
+                "running": self._running,
+                "queue_depth": sum(len(tickets) for tickets in self._queues.values()),
+                "waiting_users": len(self._queues),
+                "completed": self.completed,
+                "avg_wait_seconds": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p95_wait_seconds": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+                "max_wait_seconds": round(waits[-1], 3) if waits else 0.0,
+            }
+
+_scheduler: Optional[ExecutionScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_execution_scheduler() -> ExecutionScheduler:
+    """获取进程内唯一的执行调度器 (所有 Streamlit 会话共享)"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ExecutionScheduler()
+            print(f"[Scheduler] 最大并发执行数: {_scheduler.max_concurrent}")
+        return _scheduler
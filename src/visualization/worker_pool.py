@@ -0,0 +1,390 @@
+import io
+import os
+import sys
+import time
+import re
+import queue
+import logging
+import atexit
+import builtins
+import threading
+import traceback
+import contextlib
+import multiprocessing
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# 代码执行方式: "pool" 使用常驻的预热工作进程，"subprocess" 每次启动新的解释器 (autogen LocalCommandLineCodeExecutor)
+EXECUTOR_MODE = os.environ.get("AUTOVIS_EXECUTOR", "pool")
+# 工作进程数量
+WORKER_POOL_SIZE = int(os.environ.get("AUTOVIS_WORKER_POOL_SIZE", 2))
+# 每个工作进程执行多少次后重启，避免用户代码导入的模块、泄漏的内存和全局状态无限累积
+WORKER_MAX_RUNS = int(os.environ.get("AUTOVIS_WORKER_MAX_RUNS", 50))
+# 单次执行超时 (秒)，与 LocalCommandLineCodeExecutor 的设置一致
+EXECUTION_TIMEOUT_SECONDS = int(os.environ.get("AUTOVIS_EXECUTION_TIMEOUT", 20))
+# 超时的退出码，与 LocalCommandLineCodeExecutor 一致
+TIMEOUT_EXIT_CODE = 124
+# 用户取消执行的退出码 (与 Ctrl+C 终止进程的约定一致)
+CANCELLED_EXIT_CODE = 130
+# 等待执行结果时检查取消请求的间隔 (秒)
+CANCEL_POLL_INTERVAL_SECONDS = 0.1
+# 工作进程发送部分输出的最小间隔 (秒)
+OUTPUT_FLUSH_INTERVAL_SECONDS = 0.25
+
+# 生成的代码在执行时可能修改 (例如列式副本读取代码替换 pd.read_csv)，每次执行后恢复这些模块的属性
+_PROTECTED_MODULES = ("pandas", "matplotlib.pyplot")
+
+# 每个工作进程缓存的已加载数据集数量 (见 _load_bound_table)
+WORKER_TABLE_CACHE_SIZE = int(os.environ.get("AUTOVIS_WORKER_TABLE_CACHE", 2))
+# 读取绑定数据集时，这些参数不影响结果，可以直接返回已加载的 DataFrame
+_IGNORABLE_READ_KWARGS = {"encoding", "encoding_errors", "sep", "delimiter", "engine", "low_memory", "sheet_name", "usecols", "nrows"}
+_SELECT_ALL_PATTERN = re.compile(r"^\s*select\s+\*\s+from\s+`?(?P<table>[\w$]+)`?(?:\s+limit\s+(?P<limit>\d+))?\s*;?\s*$", re.IGNORECASE)
+
+CHINESE_FONTS = ['Microsoft YaHei', 'SimHei', 'WenQuanYi Micro Hei', 'WenQuanYi Zen Hei', 'Noto Sans CJK JP']
+
+class ExecutionResult:
+    """代码执行结果 (与 autogen 的 CommandLineCodeResult 字段一致)"""
+
+    def __init__(self, exit_code: int, output: str):
+        self.exit_code = exit_code
+        self.output = output
+
+def _warm_up() -> None:
+    """预先导入常用库并解析字体，之后每次执行都复用"""
+    import numpy  # noqa: F401
+    import pandas
+    # 写时复制：绑定的数据集以浅拷贝交给用户代码，只有被修改的列才真正复制 (见 _bind_dataset)
+    pandas.set_option("mode.copy_on_write", True)
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager
+    try:
+        import seaborn  # noqa: F401
+    except ImportError:
+        pass
+    plt.rcParams['font.sans-serif'] = CHINESE_FONTS
+    plt.rcParams['axes.unicode_minus'] = False
+    plt.rcParams['svg.fonttype'] = 'none'
+    # 点数过多的 plot/scatter/bar 自动降采样，按图表复杂度选择保存格式 (替换的是类的方法，执行之间不需要恢复)
+    from src.visualization.plot_shims import install_plot_shims
+    from src.visualization.chart_format import install_chart_format
+    install_plot_shims()
+    install_chart_format()
+    # 触发字体管理器加载和中文字体查找，结果缓存在进程内 (找不到字体的警告在用户代码执行时才需要显示)
+    font_logger = logging.getLogger('matplotlib.font_manager')
+    level = font_logger.level
+    font_logger.setLevel(logging.ERROR)
+    try:
+        font_manager.findfont(font_manager.FontProperties(family=plt.rcParams['font.sans-serif']), fallback_to_default=True)
+    finally:
+        font_logger.setLevel(level)
+
+class _StreamingOutput(io.TextIOBase):
+    """捕获输出，并由后台线程每隔 OUTPUT_FLUSH_INTERVAL_SECONDS 把新增部分发送给主进程"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._pending: list = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        if conn is not None:
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+            self._thread.start()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self._pending.append(text)
+        return len(text)
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.wait(OUTPUT_FLUSH_INTERVAL_SECONDS):
+            with self._lock:
+                if self._pending and not self._stopped.is_set():
+                    self._conn.send(("output", "".join(self._pending)))
+                    self._pending = []
+
+    def take_pending(self) -> str:
+        """停止后台发送，返回尚未发送的输出"""
+        self._stopped.set()
+        with self._lock:
+            text = "".join(self._pending)
+            self._pending = []
+        if self._thread is not None:
+            self._thread.join()
+        return text
+
+def _snapshot_modules() -> dict:
+    return {name: dict(vars(sys.modules[name])) for name in _PROTECTED_MODULES if name in sys.modules}
+
+def _restore_modules(snapshot: dict) -> None:
+    for name, saved in snapshot.items():
+        module = sys.modules[name]
+        current = vars(module)
+        for key in [key for key in current if key not in saved]:
+            delattr(module, key)
+        for key, value in saved.items():
+            if current.get(key) is not value:
+                setattr(module, key, value)
+
+_bound_tables: "OrderedDict[str, Any]" = OrderedDict()
+
+def _load_bound_table(arrow_path: str):
+    """读取绑定的列式数据 (内存映射)，按路径和修改时间缓存在工作进程中，后续执行不再读取文件"""
+    import pyarrow.feather as feather
+    key = f"{arrow_path}:{os.path.getmtime(arrow_path)}"
+    if key in _bound_tables:
+        _bound_tables.move_to_end(key)
+        return _bound_tables[key]
+    df = feather.read_table(arrow_path, memory_map=True).to_pandas()
+    _bound_tables[key] = df
+    while len(_bound_tables) > WORKER_TABLE_CACHE_SIZE:
+        _bound_tables.popitem(last=False)
+    return df
+
+def _bind_dataset(namespace: Dict[str, Any], binding: Dict[str, Any]) -> None:
+    """把已加载的数据集绑定为 df，并让读取同一数据的 pd.read_csv/read_excel/read_sql 直接返回它的副本
+
+    工作进程开启了 pandas 写时复制，副本都是浅拷贝，不复制数据；用户代码修改某一列时只复制该列，缓存的数据集不受影响。
+
+    Args:
+        namespace: 执行代码的命名空间
+        binding: arrow_path (列式数据路径)、paths (代码中读取数据文件使用的路径)、
+                 sql_table (MySQL 表名) 和 sql_complete (绑定的数据是否为整张表)
+    """
+    import pandas as pd
+    df = _load_bound_table(binding["arrow_path"])
+    namespace["df"] = df.copy(deep=False)
+    bound_paths = {os.path.normpath(path) for path in binding.get("paths") or []}
+
+    def from_bound(kwargs):
+        result = df
+        usecols = kwargs.get("usecols")
+        if usecols is not None:
+            result = result[list(usecols)]
+        nrows = kwargs.get("nrows")
+        if nrows is not None:
+            result = result.head(nrows)
+        return result.copy(deep=False)
+
+    def wrap_file_reader(original):
+        def reader(path, *args, **kwargs):
+            usecols = kwargs.get("usecols")
+            if (not args and isinstance(path, str) and os.path.normpath(path) in bound_paths
+                    and set(kwargs) <= _IGNORABLE_READ_KWARGS and kwargs.get("sheet_name", 0) == 0
+                    and (usecols is None or all(isinstance(col, str) for col in usecols))):
+                return from_bound(kwargs)
+            return original(path, *args, **kwargs)
+        return reader
+
+    def wrap_sql_reader(original):
+        def reader(sql, con=None, *args, **kwargs):
+            match = _SELECT_ALL_PATTERN.match(sql) if isinstance(sql, str) and not args and not kwargs else None
+            if match and match.group("table") == binding.get("sql_table") and binding.get("sql_complete"):
+                limit = match.group("limit")
+                return from_bound({"nrows": int(limit) if limit else None})
+            return original(sql, con, *args, **kwargs)
+        return reader
+
+    if bound_paths:
+        pd.read_csv = wrap_file_reader(pd.read_csv)
+        pd.read_excel = wrap_file_reader(pd.read_excel)
+    if binding.get("sql_table"):
+        pd.read_sql = wrap_sql_reader(pd.read_sql)
+        pd.read_sql_query = wrap_sql_reader(pd.read_sql_query)
+
+def _run_code(code: str, work_dir: str, binding: Optional[Dict[str, Any]] = None, cwd: Optional[str] = None, conn=None) -> ExecutionResult:
+    """在全新的命名空间中执行代码，合并捕获 stdout 和 stderr (cwd 为本次执行的工作目录，默认 work_dir)
+
+    conn 不为 None 时，执行过程中的输出会陆续发送给主进程，返回结果中只包含最后尚未发送的部分。
+    """
+    import matplotlib
+    import matplotlib.pyplot as plt
+    rc_snapshot = dict(matplotlib.rcParams)
+    module_snapshot = _snapshot_modules()
+    output = _StreamingOutput(conn)
+    exit_code = 0
+    namespace = {"__name__": "__main__", "__builtins__": builtins}
+    try:
+        if cwd:
+            os.makedirs(cwd, exist_ok=True)
+            os.chdir(cwd)
+        if binding:
+            try:
+                _bind_dataset(namespace, binding)
+            except Exception as e:
+                # 绑定失败时代码仍按原方式读取数据
+                print(f"[Worker] 绑定数据集失败: {e}", file=sys.stderr)
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            try:
+                exec(compile(code, "<generated_code>", "exec"), namespace)
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except BaseException:
+                exit_code = 1
+                traceback.print_exc()
+    finally:
+        # 清理本次执行留下的状态，下一次执行看到的环境与新进程一致
+        namespace.clear()
+        plt.close('all')
+        matplotlib.rcParams.update(rc_snapshot)
+        _restore_modules(module_snapshot)
+        # 用户代码可能关闭写时复制，恢复后缓存的数据集才能继续以浅拷贝共享
+        import pandas as pd
+        pd.set_option("mode.copy_on_write", True)
+        os.chdir(work_dir)
+    return ExecutionResult(exit_code, output.take_pending())
+
+def _worker_main(conn, work_dir: str) -> None:
+    """工作进程入口：预热后循环接收代码并返回执行结果"""
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+    if work_dir not in sys.path:
+        sys.path.insert(0, work_dir)
+    _warm_up()
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        code, binding, cwd = request
+        result = _run_code(code, work_dir, binding, cwd, conn)
+        conn.send(("done", result.exit_code, result.output))
+
+class _Worker:
+    def __init__(self, context, work_dir: str):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, work_dir), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.conn.close()
+        self.process.join(timeout=1)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1)
+
+class WorkerPool:
+    """常驻的代码执行工作进程池
+
+    工作进程启动时已导入 pandas/numpy/matplotlib (Agg) 并解析好字体，执行代码时省去解释器启动和导入的 1-3 秒。
+    每次执行使用全新的命名空间，执行后关闭所有图形、恢复 rcParams 和被替换的 pandas/pyplot 函数。
+    超时的工作进程会被杀掉并替换，执行 max_runs 次后的工作进程也会被替换。
+    """
+
+    def __init__(self, work_dir: str, size: int = WORKER_POOL_SIZE, max_runs: int = WORKER_MAX_RUNS, timeout: int = EXECUTION_TIMEOUT_SECONDS):
+        self.work_dir = work_dir
+        self.size = size
+        self.max_runs = max_runs
+        self.timeout = timeout
+        # Streamlit 进程是多线程的，fork 不安全，使用 spawn 启动工作进程
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._context, self.work_dir)
+
+    def execute(self, code: str, timeout: Optional[int] = None, binding: Optional[Dict[str, Any]] = None, cwd: Optional[str] = None,
+                on_output: Optional[Callable[[str], None]] = None, cancel_event: Optional[threading.Event] = None) -> ExecutionResult:
+        """在空闲的工作进程中执行代码 (没有空闲进程时等待)
+
+        Args:
+            code: Python 代码
+            timeout: 超时时间 (秒)，默认使用池的设置
+            binding: 预先绑定为 df 的数据集 (见 _bind_dataset)，为 None 时代码自行读取数据
+            cwd: 本次执行的工作目录 (例如会话的临时目录)，默认使用池的 work_dir
+            on_output: 执行过程中收到部分输出时的回调 (在调用线程中执行)
+            cancel_event: 被设置时终止执行 (杀掉并替换工作进程)
+
+        Returns:
+            ExecutionResult: 退出码和合并的输出
+        """
+        timeout = timeout or self.timeout
+        worker = self._idle.get()
+        replace = False
+        chunks = []
+        try:
+            worker.conn.send((code, binding, cwd))
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if not worker.conn.poll(max(min(remaining, CANCEL_POLL_INTERVAL_SECONDS), 0)):
+                    if cancel_event is not None and cancel_event.is_set():
+                        replace = True
+                        worker.kill()
+                        chunks.append("Cancelled: code execution was cancelled by the user")
+                        return ExecutionResult(CANCELLED_EXIT_CODE, "".join(chunks))
+                    if remaining <= 0:
+                        replace = True
+                        worker.kill()
+                        chunks.append(f"Timeout: code execution exceeded {timeout} seconds")
+                        return ExecutionResult(TIMEOUT_EXIT_CODE, "".join(chunks))
+                    continue
+                message = worker.conn.recv()
+                if message[0] == "output":
+                    chunks.append(message[1])
+                    if on_output is not None:
+                        on_output(message[1])
+                    continue
+                _, exit_code, tail = message
+                chunks.append(tail)
+                if on_output is not None and tail:
+                    on_output(tail)
+                worker.runs += 1
+                replace = worker.runs >= self.max_runs
+                return ExecutionResult(exit_code, "".join(chunks))
+        except (EOFError, BrokenPipeError, OSError):
+            # 用户代码导致工作进程崩溃 (例如段错误或 os._exit)
+            replace = True
+            worker.process.join(timeout=1)
+            chunks.append(f"Worker process exited unexpectedly (exit code {worker.process.exitcode})")
+            return ExecutionResult(1, "".join(chunks))
+        finally:
+            if replace:
+                worker.stop()
+                worker = self._spawn()
+            self._idle.put(worker)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+def get_worker_pool(work_dir: str) -> WorkerPool:
+    """获取进程内唯一的工作进程池 (首次调用时启动)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            started = time.perf_counter()
+            _pool = WorkerPool(work_dir)
+            atexit.register(_pool.shutdown)
+            print(f"[Worker Pool] 已启动 {_pool.size} 个工作进程 ({time.perf_counter() - started:.2f}s)")
+        return _pool
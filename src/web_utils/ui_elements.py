@@ -79,13 +79,22 @@ def display_code(code, language="python"):
     """
     st.code(code, language=language)
 
-def display_dataframe_info(df):
+def display_dataframe_info(df, memory_report=None):
     """显示数据框信息
     
     Args:
         df (pandas.DataFrame): 数据框
+        memory_report (dict, optional): compact_dataframe 生成的内存报告，默认读取 df.attrs["memory_report"]
     """
     st.write(f"Shape: {df.shape[0]} rows x {df.shape[1]} columns")
+
+    # 显示内存压缩报告
+    memory_report = memory_report or df.attrs.get("memory_report")
+    if memory_report:
+        st.write(f"Memory: {memory_report['压缩前']} → {memory_report['压缩后']} ({memory_report['压缩比']})")
+        changes = memory_report.get("列类型变化", {})
+        if changes:
+            st.markdown("\n".join(f"- **{col}**: {change}" for col, change in changes.items()))
     
     # 显示列信息
     col_info = ""